@@ -1,6 +1,6 @@
 import os
 import yaml
-from src import parse_excel, enrich_rules , generate_test_cases , add_keys
+from src import parse_excel, enrich_rules , generate_test_cases , add_keys, fingerprints, llm, pipeline, profiler, telemetry
 
 def load_config(config_path="config/settings.yaml"):
     """Loads configuration from a YAML file."""
@@ -21,22 +21,66 @@ def main():
     if config is None:
         exit()
 
+    # Opt-in stage profiling (profiling.enabled in the config, or OAH_PROFILE=1)
+    profiler.start(config)
+    try:
+        run(config)
+    finally:
+        profiler.stop()
+
+
+def run(config):
+    """Runs every stage of the test automation process for a loaded config."""
+    llm.start_run_deadline(config)
+
     # # 1. Parse Excel and Extract Rules
-    rules = parse_excel.parse_excel(config)
-    if rules:
-        parse_excel.save_rules(rules, config.get("processed_rules_file"))
-    else:
-        print("Error: Failed to parse Excel and extract rules.")
+    with profiler.stage("parse"):
+        rules = parse_excel.parse_excel(config)
+        if rules:
+            parse_excel.save_rules(rules, config.get("processed_rules_file"))
+        else:
+            print("Error: Failed to parse Excel and extract rules.")
+            return
+
+    # Incremental mode: only fields whose rule fingerprint changed are regenerated
+    with profiler.stage("plan"):
+        only_fields = fingerprints.plan_incremental_run(rules, config)
+        preserve_fields = None
+        if only_fields is not None:
+            preserve_fields = set(fingerprints.compute_fingerprints(rules, config)) - only_fields
+
+    if config.get("pipeline_mode") == "streaming":
+        # 2-4. Generate and key each field as soon as its previous stage is done. Like
+        # the batch path below, enrichment is skipped: the stored enriched rules are used
+        with profiler.stage("streaming_pipeline"):
+            enriched_rules, test_cases, keyed_test_cases = pipeline.run_streaming_pipeline(
+                config, rules, only_fields=only_fields, preserve_fields=preserve_fields, enrich=False
+            )
+        with profiler.stage("save"):
+            pipeline.save_outputs(config, None, test_cases, keyed_test_cases)
+            fingerprints.save_run_fingerprints(rules, config, generation_rules=enriched_rules)
+        telemetry.export(config)
         return
 
     # 2. Enrich Rules with Constraints
-    # enrich_rules.enrich_rules(config)
+    # enrich_rules.enrich_rules(config, only_fields=only_fields)
 
     # # 3. Generate Test Cases
-    generate_test_cases.main()
+    with profiler.stage("generate"):
+        generate_test_cases.main(config, only_fields=only_fields)
 
     # 4. Add Unique Keys
-    add_keys.add_unique_keys(config["generated_test_cases_file"], config["test_case_keys_file"])
+    with profiler.stage("add_keys"):
+        add_keys.add_unique_keys(config["generated_test_cases_file"], config["test_case_keys_file"],
+                                 preserve_fields=preserve_fields,
+                                 deterministic=config.get("deterministic_keys", False))
+
+    # Generation read the enriched rules from disk, which may predate edits to the workbook
+    fingerprints.save_run_fingerprints(rules, config, generation_rules=enrich_rules.load_existing_enriched_rules(
+        config["constrains_processed_rules_file"]))
+
+    # Per-stage LLM call metrics (telemetry.metrics_file)
+    telemetry.export(config)
 
 if __name__ == "__main__":
     main()
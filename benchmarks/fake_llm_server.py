@@ -0,0 +1,292 @@
+# benchmarks/fake_llm_server.py
+"""
+Local stand-in for the Gemini and Azure OpenAI endpoints used by src/llm.py.
+
+Answers enrichment, single-field, batch and repair prompts with plausible
+responses, with configurable latency, 429 injection, malformed JSON and
+server-side request/token rate limits. Each Azure deployment and each Gemini
+API key has a quota window of its own, like separate provider quotas. Point the pipeline at it with
+`azure_openai_endpoint` + `azure_openai_api_key` or `gemini_api_endpoint`.
+GET /stats returns the request, throttling and injection counters.
+
+    python -m benchmarks.fake_llm_server --port 8765 --latency-ms 800 --p429 0.05
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+AZURE_PATH = re.compile(r"^/openai/deployments/(?P<deployment>[^/]+)/chat/completions")
+GEMINI_PATH = re.compile(r"^/v1beta/models/(?P<model>[^:]+):(?P<method>generateContent|streamGenerateContent)")
+BATCH_FIELD = re.compile(r"^Field: '(?P<name>.+)'$", re.MULTILINE)
+
+
+class FakeLLMSettings:
+    """Behaviour knobs for the fake server."""
+
+    def __init__(self, latency_ms: float = 500.0, latency_distribution: str = "lognormal", latency_sigma: float = 0.5,
+                 p429: float = 0.0, p_malformed: float = 0.0, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None, cases_per_field: int = 6, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.latency_distribution = latency_distribution
+        self.latency_sigma = latency_sigma
+        self.p429 = p429
+        self.p_malformed = p_malformed
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.cases_per_field = cases_per_field
+        self.seed = seed
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+
+class _Window:
+    """Sliding one-minute window of request and token usage, like a provider quota."""
+
+    def __init__(self, requests_per_minute: Optional[float], tokens_per_minute: Optional[float]):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._events = []
+        self._lock = threading.Lock()
+
+    def admit(self, tokens: int) -> Optional[float]:
+        """Record the request and return None, or the seconds to wait if it is over quota."""
+        now = time.monotonic()
+        with self._lock:
+            self._events = [(at, used) for at, used in self._events if now - at < 60.0]
+            over_requests = self.requests_per_minute and len(self._events) + 1 > self.requests_per_minute
+            over_tokens = self.tokens_per_minute and sum(used for _, used in self._events) + tokens > self.tokens_per_minute
+            if over_requests or over_tokens:
+                return max(0.1, 60.0 - (now - self._events[0][0])) if self._events else 1.0
+            self._events.append((now, tokens))
+            return None
+
+
+class FakeLLMServer:
+    """Threaded HTTP server speaking just enough of both APIs for src/llm.py."""
+
+    def __init__(self, settings: FakeLLMSettings, host: str = "127.0.0.1", port: int = 0):
+        self.settings = settings
+        self.random = random.Random(settings.seed)
+        self.windows = {}
+        self.stats = {"requests": 0, "throttled": 0, "injected_429": 0, "malformed": 0}
+        self._stats_lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeLLMServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-llm-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def window(self, bucket: str) -> _Window:
+        """The quota window of one deployment or API key."""
+        with self._stats_lock:
+            if bucket not in self.windows:
+                self.windows[bucket] = _Window(self.settings.requests_per_minute, self.settings.tokens_per_minute)
+            return self.windows[bucket]
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _latency(self) -> float:
+        settings = self.settings
+        mean = settings.latency_ms / 1000.0
+        if settings.latency_distribution == "fixed":
+            return mean
+        if settings.latency_distribution == "uniform":
+            return self.random.uniform(0, 2 * mean)
+        # lognormal with the given median: a long right tail like real LLM latencies
+        return self.random.lognormvariate(0, settings.latency_sigma) * mean
+
+    def respond(self, prompt: str, wrap_test_cases: bool = False) -> str:
+        """Plausible response text for one of the pipeline's prompts."""
+        if "extract the constraints" in prompt:
+            return "Mandatory, No Special Characters, Max Length 50"
+        batch_fields = BATCH_FIELD.findall(prompt) if "for EACH of the following" in prompt else []
+        if batch_fields:
+            body = json.dumps({name: self._test_cases(name) for name in batch_fields}, indent=2)
+        else:
+            match = re.search(r"for the field '(?P<name>[^']+)'", prompt)
+            test_cases = self._test_cases(match.group("name") if match else "field")
+            body = json.dumps({"test_cases": test_cases} if wrap_test_cases else test_cases, indent=2)
+
+        if self.settings.p_malformed and self.random.random() < self.settings.p_malformed:
+            self._count("malformed")
+            # Cut the response off mid-object, like a max_tokens truncation
+            return body[:max(1, int(len(body) * self.random.uniform(0.3, 0.9)))]
+        return body
+
+    def _test_cases(self, field_name: str) -> List[Dict[str, Any]]:
+        # Inputs that pass validation for every data type, so only injected faults cause retries
+        return [
+            {
+                "test_case": f"TC{i + 1:03d}_{field_name.replace(' ', '_')}",
+                "description": f"Synthetic test case {i + 1} for {field_name}",
+                "expected_result": "Pass" if i % 2 == 0 else "Fail",
+                "input": None if i % 2 == 0 else "2024-01-15 10:30:00",
+            }
+            for i in range(self.settings.cases_per_field)
+        ]
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == "/stats":
+                    with server._stats_lock:
+                        return self._send_json(200, dict(server.stats))
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                azure = AZURE_PATH.match(self.path)
+                gemini = GEMINI_PATH.match(self.path)
+                if not (azure or gemini):
+                    return self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                server._count("requests")
+
+                if azure:
+                    prompt = " ".join(message.get("content", "") for message in body.get("messages", []))
+                    max_tokens = body.get("max_tokens") or 1000
+                    stream = body.get("stream", False)
+                    schema_format = (body.get("response_format") or {}).get("type") == "json_schema"
+                    bucket = azure.group("deployment")
+                else:
+                    prompt = " ".join(part.get("text", "") for content in body.get("contents", [])
+                                      for part in content.get("parts", []))
+                    max_tokens = (body.get("generationConfig") or {}).get("maxOutputTokens") or 1000
+                    stream = gemini.group("method") == "streamGenerateContent"
+                    schema_format = False
+                    bucket = self.headers.get("x-goog-api-key") or parse_qs(urlparse(self.path).query).get("key", [""])[0]
+
+                retry_after = server.window(bucket).admit(len(prompt) // 4 + max_tokens)
+                if retry_after is not None:
+                    server._count("throttled")
+                    return self._send_429(retry_after)
+                if server.settings.p429 and server.random.random() < server.settings.p429:
+                    server._count("injected_429")
+                    return self._send_429(round(server.random.uniform(0.5, 2.0), 2))
+
+                time.sleep(server._latency())
+                text = server.respond(prompt, wrap_test_cases=schema_format)
+                if azure:
+                    self._send_azure(text, stream, azure.group("deployment"))
+                else:
+                    self._send_gemini(text, stream)
+
+            def _send_json(self, status, payload, headers=None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_429(self, retry_after):
+                self._send_json(429, {"error": {"code": 429, "message": "Resource has been exhausted (fake quota)",
+                                                "status": "RESOURCE_EXHAUSTED"}},
+                                {"Retry-After": str(retry_after), "retry-after-ms": str(int(retry_after * 1000))})
+
+            def _send_chunked(self, content_type, chunks):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for chunk in chunks:
+                    data = chunk.encode("utf-8")
+                    self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _send_sse(self, events):
+                self._send_chunked("text/event-stream", (f"data: {event}\n\n" for event in events))
+
+            def _send_azure(self, text, stream, deployment):
+                completion_id = f"chatcmpl-fake-{time.monotonic_ns()}"
+                if not stream:
+                    return self._send_json(200, {
+                        "id": completion_id, "object": "chat.completion", "created": int(time.time()),
+                        "model": deployment,
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": text}}],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": len(text) // 4,
+                                  "total_tokens": len(text) // 4},
+                    })
+                pieces = [text[i:i + 64] for i in range(0, len(text), 64)]
+                events = [json.dumps({
+                    "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": deployment,
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                }) for piece in pieces] + ["[DONE]"]
+                self._send_sse(events)
+
+            def _send_gemini(self, text, stream):
+                def candidate(piece, finished):
+                    payload = {"candidates": [{"content": {"role": "model", "parts": [{"text": piece}]},
+                                               "index": 0}]}
+                    if finished:
+                        payload["candidates"][0]["finishReason"] = "STOP"
+                    return payload
+
+                if not stream:
+                    return self._send_json(200, candidate(text, True))
+                # The REST transport streams one JSON array of responses, not SSE
+                pieces = [text[i:i + 64] for i in range(0, len(text), 64)] or [""]
+                events = [json.dumps(candidate(piece, i == len(pieces) - 1)) for i, piece in enumerate(pieces)]
+                self._send_chunked("application/json", ["[" + events[0]] + ["," + event for event in events[1:]] + ["]"])
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the fake Gemini/Azure OpenAI server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=500.0)
+    parser.add_argument("--latency-distribution", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--latency-sigma", type=float, default=0.5,
+                        help="Lognormal sigma; larger values give a longer latency tail")
+    parser.add_argument("--p429", type=float, default=0.0, help="Probability of an injected 429")
+    parser.add_argument("--p-malformed", type=float, default=0.0, help="Probability of a truncated JSON response")
+    parser.add_argument("--requests-per-minute", type=float, help="Quota per deployment or API key")
+    parser.add_argument("--tokens-per-minute", type=float, help="Quota per deployment or API key")
+    args = parser.parse_args(argv)
+
+    settings = FakeLLMSettings(latency_ms=args.latency_ms, latency_distribution=args.latency_distribution,
+                               latency_sigma=args.latency_sigma, p429=args.p429, p_malformed=args.p_malformed,
+                               requests_per_minute=args.requests_per_minute, tokens_per_minute=args.tokens_per_minute)
+    server = FakeLLMServer(settings, args.host, args.port)
+    print(f"Fake LLM server listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
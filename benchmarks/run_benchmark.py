@@ -0,0 +1,270 @@
+# benchmarks/run_benchmark.py
+"""
+Offline end-to-end benchmark of the test case pipeline.
+
+Starts benchmarks/fake_llm_server.py in a subprocess, writes a synthetic
+workbook and a settings.yaml pointed at the fake server into a scratch
+directory, and times one of the entry points against it:
+
+    generate  TestCaseGenerator.generate_test_cases on the parsed rules
+    app       app.main (parse, generate, add keys)
+    flow      perfect_flow.test_automation_flow
+
+Reports fields/sec, p50/p95/p99 per-call latency, limiter retries and 429s,
+the server's counters and peak RSS as one JSON object. With --compare, exits
+non-zero if throughput or p95 latency regressed beyond --tolerance.
+
+    python -m benchmarks.run_benchmark --target generate --rows 1000 --latency-ms 300 --p429 0.02
+"""
+import argparse
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+import yaml
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks import synthetic_workbook  # noqa: E402
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(args, port: int) -> subprocess.Popen:
+    """Run the fake server in its own process so it does not compete for our GIL."""
+    command = [sys.executable, "-m", "benchmarks.fake_llm_server", "--port", str(port),
+               "--latency-ms", str(args.latency_ms), "--latency-distribution", args.latency_distribution,
+               "--latency-sigma", str(args.latency_sigma),
+               "--p429", str(args.p429), "--p-malformed", str(args.p_malformed)]
+    if args.server_rpm:
+        command += ["--requests-per-minute", str(args.server_rpm)]
+    if args.server_tpm:
+        command += ["--tokens-per-minute", str(args.server_tpm)]
+    process = subprocess.Popen(command, cwd=REPO_ROOT, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("Fake LLM server did not start")
+
+
+def server_stats(port: int) -> dict:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats", timeout=5) as response:
+        return json.loads(response.read())
+
+
+def write_settings(args, workdir: str, port: int) -> str:
+    """Copy the repo settings, redirected to the scratch directory and the fake server."""
+    with open(os.path.join(REPO_ROOT, "config", "settings.yaml"), "r") as f:
+        config = yaml.safe_load(f)
+    data_dir = os.path.join(workdir, "data")
+    config.update({
+        "excel_file": os.path.join(data_dir, "workbook.xlsx"),
+        "excel_sheet_name": "BC - Business Rule",
+        "processed_rules_file": os.path.join(data_dir, "processed-rules.json"),
+        "constrains_processed_rules_file": os.path.join(data_dir, "constrains-processed-rules.json"),
+        "generated_test_cases_file": os.path.join(data_dir, "generated-test-cases.json"),
+        "test_case_keys_file": os.path.join(data_dir, "test-case-with-keys.json"),
+        "rule_fingerprints_file": os.path.join(data_dir, "rule-fingerprints.json"),
+        "excel_cache_dir": None,
+        "api_use": args.provider,
+        "max_concurrency": args.concurrency,
+        # Every run measures real (fake) calls, never cached ones
+        "llm_cache": {"enabled": False},
+        "incremental": False,
+        "resume": False,
+        "result_cache": {"enabled": False},
+        "rate_limit": {**(config.get("rate_limit") or {}), "requests_per_minute": args.client_rpm,
+                       "tokens_per_minute": args.client_tpm, "base_delay": args.base_delay},
+    })
+    config.pop("excel_sources", None)
+    config.pop("prefect_concurrency_limit", None)
+    for key, value in args.set or []:
+        config[key] = yaml.safe_load(value)
+    if args.provider == "openai":
+        config["azure_openai_endpoint"] = f"http://127.0.0.1:{port}"
+        config["azure_openai_api_key"] = "fake-key"
+    else:
+        config["gemini_api_endpoint"] = f"http://127.0.0.1:{port}"
+        config["gemini_api_key"] = "fake-key"
+
+    os.makedirs(data_dir, exist_ok=True)
+    os.makedirs(os.path.join(workdir, "config"), exist_ok=True)
+    os.makedirs(os.path.join(workdir, "logs"), exist_ok=True)
+    path = os.path.join(workdir, "config", "settings.yaml")
+    with open(path, "w") as f:
+        yaml.safe_dump(config, f, sort_keys=False)
+    return path
+
+
+class CallRecorder:
+    """Wraps llm._call_llm/_open_stream to time every attempt that returns."""
+
+    def __init__(self):
+        self.latencies = []
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def wrap(self, fn):
+        def timed(*args, **kwargs):
+            started_at = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                with self._lock:
+                    self.failures += 1
+                raise
+            with self._lock:
+                self.latencies.append(time.perf_counter() - started_at)
+            return result
+        return timed
+
+    def percentile(self, q: float):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+
+
+def run_target(args, config_path: str) -> tuple:
+    """Run the chosen entry point; returns (fields with generated test cases, seconds)."""
+    from src import generate_test_cases, llm, parse_excel
+
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+    if args.target in ("generate", "app"):
+        # Stand-in for the enriched rules of an earlier run: app.main's batch path
+        # does not enrich, and generate only reads this file (untimed setup)
+        rules = parse_excel.parse_excel(config)
+        parse_excel.save_rules(rules, config["constrains_processed_rules_file"])
+    if args.target == "generate":
+        generator = generate_test_cases.TestCaseGenerator(config_path)
+        client = llm.initialize_llm(config)
+        started_at = time.perf_counter()
+        generator.generate_test_cases(config["constrains_processed_rules_file"],
+                                      config["generated_test_cases_file"], client)
+    elif args.target == "app":
+        import app
+        started_at = time.perf_counter()
+        app.main()
+    else:
+        import perfect_flow
+        started_at = time.perf_counter()
+        perfect_flow.test_automation_flow(config_path)
+    elapsed = time.perf_counter() - started_at
+
+    with open(config["generated_test_cases_file"], "r") as f:
+        fields = sum(1 for cases in json.load(f).values() if cases)
+    return fields, elapsed
+
+
+def compare(result: dict, baseline_file: str, tolerance: float) -> list:
+    """Regressions of this result against the last result recorded in `baseline_file`."""
+    with open(baseline_file, "r") as f:
+        baseline = [json.loads(line) for line in f if line.strip()][-1]
+    regressions = []
+    if result["fields_per_sec"] < baseline["fields_per_sec"] * (1 - tolerance):
+        regressions.append(f"fields/sec {result['fields_per_sec']} < baseline {baseline['fields_per_sec']}")
+    if baseline.get("latency_ms", {}).get("p95") and result["latency_ms"]["p95"] and \
+            result["latency_ms"]["p95"] > baseline["latency_ms"]["p95"] * (1 + tolerance):
+        regressions.append(f"p95 {result['latency_ms']['p95']}ms > baseline {baseline['latency_ms']['p95']}ms")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline against the fake LLM server.")
+    parser.add_argument("--target", choices=["generate", "app", "flow"], default="generate")
+    parser.add_argument("--rows", type=int, default=100, help="Fields in the synthetic workbook")
+    parser.add_argument("--distinct-ratio", type=float, default=0.5)
+    parser.add_argument("--provider", choices=["openai", "gemini"], default="openai")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--latency-distribution", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--p429", type=float, default=0.0)
+    parser.add_argument("--p-malformed", type=float, default=0.0)
+    parser.add_argument("--server-rpm", type=float, help="Server-side requests/minute quota per deployment or key")
+    parser.add_argument("--server-tpm", type=float, help="Server-side tokens/minute quota per deployment or key")
+    parser.add_argument("--client-rpm", type=float, help="Client rate_limit.requests_per_minute (default: none)")
+    parser.add_argument("--client-tpm", type=float, help="Client rate_limit.tokens_per_minute (default: none)")
+    parser.add_argument("--base-delay", type=float, default=0.2, help="Client backoff base delay in seconds")
+    parser.add_argument("--set", nargs=2, action="append", metavar=("KEY", "VALUE"),
+                        help="Override a top-level config key, e.g. --set batch_size 5")
+    parser.add_argument("--workdir", help="Scratch directory (default: a new temporary one)")
+    parser.add_argument("--output", help="Append the result as a JSON line to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSONL file whose last result is the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="oah-bench-")
+    port = _free_port()
+    config_path = write_settings(args, workdir, port)
+    synthetic_workbook.write_workbook(os.path.join(workdir, "data", "workbook.xlsx"), args.rows,
+                                      distinct_ratio=args.distinct_ratio)
+
+    server = start_server(args, port)
+    try:
+        # The entry points resolve config/settings.yaml and logs/ relative to the working directory
+        os.chdir(workdir)
+        from src import llm, rate_limiter
+        recorder = CallRecorder()
+        llm._call_llm = recorder.wrap(llm._call_llm)
+        llm._open_stream = recorder.wrap(llm._open_stream)
+
+        fields, elapsed = run_target(args, config_path)
+        limiter = rate_limiter.get_limiter()
+        stats = server_stats(port)
+    finally:
+        server.terminate()
+        server.wait()
+
+    result = {
+        "target": args.target,
+        "provider": args.provider,
+        "rows": args.rows,
+        "concurrency": args.concurrency,
+        "fields": fields,
+        "wall_seconds": round(elapsed, 3),
+        "fields_per_sec": round(fields / elapsed, 3) if elapsed else None,
+        "calls": len(recorder.latencies),
+        "failed_calls": recorder.failures,
+        "latency_ms": {"p50": recorder.percentile(0.50), "p95": recorder.percentile(0.95),
+                       "p99": recorder.percentile(0.99)},
+        "retries": limiter.retry_count if limiter else None,
+        "rate_limited": limiter.rate_limited_count if limiter else None,
+        "server": stats,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "workdir": workdir,
+    }
+    print(json.dumps(result, indent=2))
+
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(json.dumps(result) + "\n")
+    if args.compare:
+        regressions = compare(result, args.compare, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+# benchmarks/synthetic_workbook.py
+"""Synthetic business-rule workbooks shaped like data/Book1.xlsx, for benchmarks."""
+import random
+
+import pandas as pd
+
+HEADERS = [
+    "Schema Name", "Attributes Details", "Data Type", "Business Rules", "Mandatory Field",
+    "Required from Source to have data populated ", "Primary Key", "Required for Deployment Validation",
+    "Deployment Validation",
+]
+DATA_TYPES = ["String", "String", "String", "Date", "Integer", "Decimal", "Boolean", "Email"]
+BUSINESS_RULES = [
+    "This field must always be populated(cannot be null or blank).",
+    "Primary Key /Identity used for profile stitching in AEP.",
+    "Maximum length 50 characters, alphabets only.",
+    "Must be a valid date in the past.",
+    "Optional; defaults to blank when not provided by the source.",
+    "Must match the value sent in the registration event.",
+]
+
+
+def build_rows(rows: int, fields_per_schema: int = 25, distinct_ratio: float = 0.5, seed: int = 0):
+    """
+    Rule rows for `rows` fields spread over schemas of `fields_per_schema`.
+
+    Roughly `distinct_ratio` of the attributes get a unique name; the rest
+    reuse names across schemas, like shared attributes in real workbooks.
+    The schema name is only set on a schema's first row, as in the real sheet.
+    """
+    rng = random.Random(seed)
+    shared_names = [f"Shared Attribute {i}" for i in range(max(1, int(fields_per_schema * (1 - distinct_ratio))))]
+    records = []
+    for i in range(rows):
+        schema = i // fields_per_schema
+        if rng.random() < distinct_ratio:
+            attribute = f"Attribute {i}"
+        else:
+            attribute = rng.choice(shared_names)
+        flags = ["Yes" if rng.random() < 0.5 else "No" for _ in range(5)]
+        records.append([
+            f"Schema {schema}" if i % fields_per_schema == 0 else None,
+            attribute,
+            rng.choice(DATA_TYPES),
+            rng.choice(BUSINESS_RULES),
+            *flags,
+        ])
+    return pd.DataFrame(records, columns=HEADERS)
+
+
+def write_workbook(path: str, rows: int, sheet_name: str = "BC - Business Rule", **kwargs) -> str:
+    """Write a synthetic workbook with one rules sheet and return its path."""
+    build_rows(rows, **kwargs).to_excel(path, sheet_name=sheet_name, index=False)
+    return path
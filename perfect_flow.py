@@ -1,14 +1,20 @@
 import prefect
-from prefect import flow, task
+from prefect import flow, task, unmapped
 from prefect.context import get_run_context
+from prefect.concurrency.sync import concurrency
+from prefect.runtime import task_run
+from prefect.task_runners import ThreadPoolTaskRunner
 
-from prefect.artifacts import create_link_artifact
-from src import parse_excel, enrich_rules, generate_test_cases, add_keys  # Adjust import paths
+from prefect.artifacts import create_link_artifact, create_markdown_artifact, create_table_artifact
+from src import parse_excel, enrich_rules, generate_test_cases, add_keys, fingerprints, llm, pipeline, profiler, telemetry  # Adjust import paths
 import logging
 import yaml
 import os
 import json
-import pandas as pd
+import glob
+import hashlib
+import functools
+from datetime import timedelta
 
 # --- Logging Setup ---
 logging.basicConfig(
@@ -29,6 +35,7 @@ def load_config(config_path="config/settings.yaml"):
         logging.error(f"Error parsing config file: {e}")
         return None
 
+@profiler.timed("validate_data")
 def validate_data(rules):
     """
     Performs basic validation on the extracted rules.
@@ -44,7 +51,98 @@ def validate_data(rules):
             if not all(key in field_details for key in ["data_type", "mandatory_field", "from_source", "primary_key", "required_for_deployment", "deployment_validation", "business_rules"]):
                 raise ValueError(f"Missing required keys in field {field_name} of {parent_field}")
 
-@task(name="Parse Excel and Extract Rules", retries=3, retry_delay_seconds=60)
+def _workbook_paths(config):
+    """Workbooks the flow reads, from excel_sources or excel_file."""
+    if config.get("excel_sources"):
+        paths = set()
+        for source in config["excel_sources"]:
+            paths.update(glob.glob(source["file"]) or [source["file"]])
+        return sorted(paths)
+    return [config["excel_file"]] if config.get("excel_file") else []
+
+@functools.lru_cache(maxsize=64)
+def _file_digest(path, mtime_ns, size):
+    """sha256 of a file's bytes; mtime/size are part of the cache key so edits are picked up."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def input_hash(config):
+    """Hash of the workbook bytes and the config, the inputs every stage derives from."""
+    digest = hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode("utf-8"))
+    for path in _workbook_paths(config):
+        if os.path.exists(path):
+            stat = os.stat(path)
+            digest.update(f"{path}:{_file_digest(path, stat.st_mtime_ns, stat.st_size)}".encode("utf-8"))
+        else:
+            digest.update(f"{path}:missing".encode("utf-8"))
+    return digest.hexdigest()
+
+def stage_cache_key(stage, prompt_template_version="", data_parameter=None, include_workbook=True, extra_inputs=None):
+    """Builds a Prefect cache_key_fn for a stage.
+
+    The key is the input hash plus the stage's prompt template version and,
+    if data_parameter is given, a hash of that task parameter (for stages whose
+    input may not come from the workbook, e.g. enriched rules read from disk).
+    extra_inputs(parameters) returns any further inputs the stage reads as a string.
+    Per-batch tasks set include_workbook=False so that editing one field of
+    the workbook doesn't invalidate every other batch.
+    Returns None (no caching) when result_cache.enabled is false.
+    """
+    def cache_key_fn(context, parameters):
+        config = parameters["config"]
+        if not (config.get("result_cache") or {}).get("enabled", True):
+            return None
+        if include_workbook:
+            inputs = input_hash(config)
+        else:
+            inputs = hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        key = f"{stage}-{prompt_template_version}-{inputs}"
+        if data_parameter:
+            data = json.dumps(parameters[data_parameter], sort_keys=True, default=str)
+            key += "-" + hashlib.sha256(data.encode("utf-8")).hexdigest()[:16]
+        if extra_inputs:
+            key += "-" + hashlib.sha256(extra_inputs(parameters).encode("utf-8")).hexdigest()[:16]
+        return key
+    return cache_key_fn
+
+def with_result_cache(task_fn, config):
+    """Applies the result_cache expiration/refresh settings to a cached task."""
+    settings = config.get("result_cache") or {}
+    expiration_days = settings.get("expiration_days")
+    return task_fn.with_options(
+        cache_expiration=timedelta(days=expiration_days) if expiration_days else None,
+        refresh_cache=settings.get("refresh", False),
+    )
+
+def create_file_artifact(key, description, path):
+    """Creates a link artifact to a saved file when running inside Prefect."""
+    run_context = get_run_context()
+    if run_context:
+        create_link_artifact(key=key, description=description, link=os.path.abspath(path))
+    else:
+        logging.warn("Skip creating the link as not running in prefect context")
+
+class PartialResultError(RuntimeError):
+    """A stage left some fields without results (failed LLM calls); `results` holds the rest.
+
+    Raising it (instead of returning) keeps Prefect from caching the partial
+    result, so a rerun retries the failed fields. After the last attempt the
+    flow carries on with `results`.
+    """
+
+    def __init__(self, message, results):
+        super().__init__(message, results)
+        self.results = results
+
+def _retry_unless_deadline_passed(task, task_run, state):
+    # Once run_deadline_seconds is spent every attempt would fail straight away
+    return not llm.run_deadline_passed()
+
+@task(name="Parse Excel and Extract Rules", retries=3, retry_delay_seconds=60,
+      cache_key_fn=stage_cache_key("parse"), persist_result=True)
 def parse_excel_task(config):
     """Parses the Excel file and extracts rules."""
     try:
@@ -68,106 +166,154 @@ def validate_parsed_rules_task(rules):
         logging.error(f"Validation failed: {e}")
         raise
 
-@task(name="Save Parsed Rules", retries=1)
-def save_parsed_rules(rules, config):
-    try:
-        filepath = config.get("processed_rules_file")
-        parse_excel.save_rules(rules, filepath)
-
-        run_context = get_run_context()
-        if run_context:
-            create_link_artifact(
-                key="parsed-rules-file",
-                # Remove the 'name' parameter
-                description="Link to the saved JSON file containing the parsed rules.",
-                link=os.path.abspath(filepath),  # Use 'link' instead of 'target'
-            )
-        else:
-            logging.warn("Skip creating the link as not running in prefect context")
-
-        return True
-    except Exception as e:
-        logging.error(f"Error saving parsed rules: {e}")
-        return False
-
-
-@task(name="Enrich Rules with Constraints", retries=3, retry_delay_seconds=60)
-def enrich_rules_task(config, rules):
+def _enrich_inputs(parameters):
+    """The enrich stage's inputs besides the workbook: only_fields and, when set, the existing output it merges."""
+    only_fields = parameters.get("only_fields")
+    if only_fields is None:
+        return "all"
+    path = parameters["config"]["constrains_processed_rules_file"]
+    existing = "missing"
+    if os.path.exists(path):
+        stat = os.stat(path)
+        existing = _file_digest(path, stat.st_mtime_ns, stat.st_size)
+    return json.dumps(sorted(only_fields)) + existing
+
+@task(name="Enrich Rules with Constraints", retries=3, retry_delay_seconds=60,
+      retry_condition_fn=_retry_unless_deadline_passed,
+      cache_key_fn=stage_cache_key("enrich", enrich_rules.PROMPT_TEMPLATE_VERSION, extra_inputs=_enrich_inputs),
+      persist_result=True)
+def enrich_rules_task(config, rules, only_fields=None):
+    """Enriches the rules with constraints and returns the enriched rules.
+
+    Raises PartialResultError if any field's LLM call failed, so the empty
+    fallback constraints are retried and never cached.
+    """
     try:
-        config["processed_rules_file"] = "data/temp_rules.json"
-        output_file = config.get("constrains_processed_rules_file")
-        with open(output_file, "w") as f:
-            json.dump(rules, f, indent=4)
-        from src import enrich_rules
-        enrich_rules.enrich_rules(config)
-
-        run_context = get_run_context()
-        if run_context:
-            create_link_artifact(
-                key="enriched-rules-file",
-                description="Link to the saved JSON file containing the enriched rules.",
-                link=os.path.abspath(config["constrains_processed_rules_file"]),
-            )
-        else:
-            logging.warn("Skip creating the link as not running in prefect context")
-        return True
+        # Unchanged fields keep the constraints from the previous run's output
+        existing_rules = {}
+        if only_fields is not None:
+            existing_rules = enrich_rules.load_existing_enriched_rules(config["constrains_processed_rules_file"])
+        failed_fields = []
+        enriched_rules = enrich_rules.enrich_loaded_rules(rules, config, only_fields=only_fields,
+                                                          existing_rules=existing_rules, failed_fields=failed_fields)
     except Exception as e:
         logging.error(f"Error enriching rules: {e}")
         raise
-
-@task(name="Generate Test Cases", retries=3, retry_delay_seconds=60)
-def generate_test_cases_task(config):
+    if failed_fields:
+        raise PartialResultError(f"Enrichment failed for {', '.join(failed_fields)}", enriched_rules)
+    return enriched_rules
+
+# Retries for a single generation batch
+GENERATION_RETRIES = 3
+
+def _batch_run_name():
+    batch = task_run.parameters["batch"]
+    suffix = f" (+{len(batch) - 1})" if len(batch) > 1 else ""
+    return f"generate-{batch[0][0]}{suffix}"
+
+@task(name="Generate Test Cases Batch", retries=GENERATION_RETRIES, retry_delay_seconds=60,
+      retry_condition_fn=_retry_unless_deadline_passed, task_run_name=_batch_run_name,
+      cache_key_fn=stage_cache_key("generate", generate_test_cases.PROMPT_TEMPLATE_VERSION, "batch",
+                                   include_workbook=False),
+      persist_result=True)
+def generate_batch_task(config, batch):
+    """Generates test cases for one batch of fields (one field with the default batch_size).
+
+    Raises PartialResultError if any field came back empty, so Prefect retries
+    just this batch and never caches a result with missing fields; after the
+    last attempt the flow takes the partial results from the error.
+    """
+    llm_client = llm.initialize_llm(config)
+    generator = generate_test_cases.TestCaseGenerator(config=config)
+
+    limit_name = config.get("prefect_concurrency_limit")
+    if limit_name:
+        # Global slot shared by every worker/flow run drawing on the same LLM quota
+        with concurrency(limit_name, occupy=1):
+            results = generator.generate_batch_test_cases(batch, llm_client)
+    else:
+        results = generator.generate_batch_test_cases(batch, llm_client)
+
+    failed = [name for name, test_cases in results.items() if not test_cases]
+    if failed:
+        raise PartialResultError(f"No valid test cases for {', '.join(failed)}", results)
+    return results
+
+@task(name="Gather Test Cases")
+def reduce_test_cases_task(config, rules, batch_results, duplicates, only_fields=None):
+    """Merges the per-batch results into {field: test cases} in rules order."""
+    generator = generate_test_cases.TestCaseGenerator(config=config)
+    existing_test_cases = None
+    if only_fields is not None:
+        existing_test_cases = generate_test_cases.load_existing_test_cases(config["generated_test_cases_file"])
+    test_cases = generator.merge_batch_results(rules, batch_results, duplicates, only_fields=only_fields,
+                                               existing_test_cases=existing_test_cases)
+    generator.generate_summary(len(test_cases), sum(len(cases) for cases in test_cases.values()), "(in memory)")
+    return test_cases
+
+
+@task(name="Streaming Pipeline", retries=1, retry_delay_seconds=60)
+def streaming_pipeline_task(config, rules, only_fields=None, preserve_fields=None, enrich=True):
+    """Runs enrich -> generate -> key per field through bounded queues (pipeline_mode: streaming)."""
     try:
-        from src import llm
-        llm_client = llm.initialize_llm(config)
-
-        from src import generate_test_cases
-        # Remove llm_client argument from main() call
-        generate_test_cases.main(config)
-
-        run_context = get_run_context()
-        if run_context:
-            create_link_artifact(
-                key="generated-test-cases-file",
-                description="Link to the saved JSON file containing the generated test cases.",
-                link=os.path.abspath(config["generated_test_cases_file"]),
-            )
-        else:
-            logging.warn("Skip creating the link as not running in prefect context")
-        return True
+        return pipeline.run_streaming_pipeline(config, rules, only_fields=only_fields,
+                                               preserve_fields=preserve_fields, enrich=enrich)
     except Exception as e:
-        logging.error(f"Error generating test cases: {e}")
+        logging.error(f"Error in streaming pipeline: {e}")
         raise
 
-
 @task(name="Add Unique Keys", retries=3, retry_delay_seconds=60)
-def add_keys_task(config):
-    """Adds unique keys to the test cases and creates a link artifact."""
+def add_keys_task(config, test_cases, preserve_fields=None):
+    """Adds unique keys to the test cases and returns the keyed copy."""
     try:
-        from src import add_keys
-        # add_keys.main(config) #Removed and adding config now
-        
-        config = load_config()
-        add_keys.add_unique_keys(config["generated_test_cases_file"], config["test_case_keys_file"])
-
-        run_context = get_run_context() #added run context to get a more precise tracking
-        if run_context:
-            # Create a link artifact to the saved file: this is one of the easy implementation of artifacts, just link to the local files.
-            create_link_artifact(
-                key="test-case-keys-file",
-                description="Link to the saved JSON file containing the test cases with unique keys.",
-                link=os.path.abspath(config["test_case_keys_file"]),
-            )
-        else:
-            logging.warn("Skip creating the link as not running in prefect context")
+        return add_keys.add_keys_to_test_cases(test_cases, previous_output=config["test_case_keys_file"],
+                                               preserve_fields=preserve_fields,
+                                               deterministic=config.get("deterministic_keys", False))
+    except Exception as e:
+        logging.error(f"Error adding unique keys: {e}")
+        raise
 
+@task(name="Save Outputs", retries=1)
+def materialize_outputs_task(config, rules, enriched_rules, test_cases, keyed_test_cases):
+    """Writes every stage's result to its configured file and links them as artifacts."""
+    try:
+        parse_excel.save_rules(rules, config["processed_rules_file"])
+        create_file_artifact("parsed-rules-file", "Link to the saved JSON file containing the parsed rules.",
+                             config["processed_rules_file"])
+
+        if enriched_rules is not None:
+            enrich_rules.save_enriched_rules(enriched_rules, config["constrains_processed_rules_file"])
+            create_file_artifact("enriched-rules-file", "Link to the saved JSON file containing the enriched rules.",
+                                 config["constrains_processed_rules_file"])
+
+        generate_test_cases.save_test_cases(test_cases.items(), config["generated_test_cases_file"])
+        create_file_artifact("generated-test-cases-file",
+                             "Link to the saved JSON file containing the generated test cases.",
+                             config["generated_test_cases_file"])
+
+        add_keys.save_test_cases_with_keys(keyed_test_cases.items(), config["test_case_keys_file"])
+        create_file_artifact("test-case-keys-file",
+                             "Link to the saved JSON file containing the test cases with unique keys.",
+                             config["test_case_keys_file"])
         return True
     except Exception as e:
-        logging.error(f"Error adding unique keys: {e}")
+        logging.error(f"Error saving outputs: {e}")
         raise
 
-def load_rules(config):
-    rules_file = config.get("processed_rules_file")
+@task(name="Publish LLM Metrics")
+def publish_llm_metrics_task(config):
+    """Publishes the run's per-stage LLM call metrics as table and markdown artifacts."""
+    recorder = telemetry.get_recorder()
+    if recorder is None:
+        return None
+    create_table_artifact(key="llm-call-metrics", table=recorder.table(),
+                          description="LLM calls, errors, cache hits, retries, 429s, latency and tokens per stage.")
+    create_markdown_artifact(key="llm-call-histograms", markdown=recorder.to_markdown(),
+                             description="Per-stage LLM call summary and latency histogram.")
+    return telemetry.export(config)
+
+def load_rules(config, rules_key="processed_rules_file"):
+    rules_file = config.get(rules_key)
     try:
         with open(rules_file, "r") as f:
             rules_ = json.load(f)
@@ -176,49 +322,118 @@ def load_rules(config):
         raise
     return rules_
 
-@flow(name="Test Automation Workflow")
-def test_automation_flow(config_path="config/settings.yaml", enrich=True):
-    """Orchestrates the test automation process."""
-    config = load_config(config_path)
-    if not config:
-        return
-
-    # First delete generated_test_cases_file and test_case_keys_file if exists, by checking if the file exists and delete. 
-    if os.path.exists(config["generated_test_cases_file"]):
-        os.remove(config["generated_test_cases_file"])
+def generation_task_runner(config):
+    """Thread pool sized for the mapped generation tasks (max_concurrency)."""
+    return ThreadPoolTaskRunner(max_workers=max(1, int(config.get("max_concurrency", 1))))
 
-    if os.path.exists(config["test_case_keys_file"]):
-        os.remove(config["test_case_keys_file"])
-
-    rules = parse_excel_task(config)
+def run_stages(config, enrich=True):
+    """Runs the flow's stages for a loaded config; called from test_automation_flow."""
+    llm.start_run_deadline(config)
+    with profiler.stage("parse"):
+        rules = with_result_cache(parse_excel_task, config)(config)
     if not rules:
         return
+
+    # Incremental mode: only fields whose rule fingerprint changed are regenerated
+    only_fields = fingerprints.plan_incremental_run(rules, config)
+    preserve_fields = None
+    if only_fields is None:
+        # Full run: delete generated_test_cases_file and test_case_keys_file if exists, by checking if the file exists and delete. 
+        if os.path.exists(config["generated_test_cases_file"]):
+            os.remove(config["generated_test_cases_file"])
+
+        if os.path.exists(config["test_case_keys_file"]):
+            os.remove(config["test_case_keys_file"])
+    else:
+        preserve_fields = set(fingerprints.compute_fingerprints(rules, config)) - only_fields
     
-    validate_result = validate_parsed_rules_task(rules)
+    with profiler.stage("validate"):
+        validate_parsed_rules_task(rules)
+
+    if config.get("pipeline_mode") == "streaming":
+        # Each field moves through enrich -> generate -> key on its own
+        with profiler.stage("streaming_pipeline"):
+            enriched_rules, test_cases, keyed_test_cases = streaming_pipeline_task(
+                config, rules, only_fields, preserve_fields, enrich
+            )
+        with profiler.stage("save"):
+            materialize_outputs_task(config, rules, enriched_rules if enrich else None, test_cases, keyed_test_cases)
+            fingerprints.save_run_fingerprints(rules, config, generation_rules=enriched_rules)
+        publish_llm_metrics_task(config)
+        return
 
-    # Now save rules
-    save_task = save_parsed_rules(rules,config)
+    enriched_rules = None
+    if enrich: # added to not execute if it is not specified
+        with profiler.stage("enrich"):
+            try:
+                enriched_rules = with_result_cache(enrich_rules_task, config)(config, rules, only_fields)
+            except PartialResultError as e:
+                # Fields whose enrichment kept failing are generated without constraints
+                logging.error(str(e.args[0]))
+                enriched_rules = e.results
+        generation_rules = enriched_rules
+    else:
+        print("Skipping enrichments")
+        generation_rules = load_rules(config, "constrains_processed_rules_file")
+
+    # One mapped task per batch; Prefect retries and caches each independently
+    with profiler.stage("generate"):
+        batches, duplicates = generate_test_cases.TestCaseGenerator(config=config).plan_generation(generation_rules, only_fields)
+        batch_futures = with_result_cache(generate_batch_task, config).map(unmapped(config), batches)
+        batch_results = []
+        for batch, future in zip(batches, batch_futures):
+            result = future.result(raise_on_failure=False)
+            if isinstance(result, dict):
+                batch_results.append(result)
+            elif isinstance(result, PartialResultError):
+                # Fields that failed every attempt stay missing (and out of the fingerprints)
+                logging.error(str(result.args[0]))
+                batch_results.append(result.results)
+            else:
+                logging.error(f"Failed to generate test cases for {', '.join(field[0] for field in batch)}: {result}")
+
+        test_cases = reduce_test_cases_task(config, generation_rules, batch_results, duplicates, only_fields)
+    if not test_cases:
+        return
 
-    #Load Rules for `enrich_rules_task`
-    rules_new = load_rules(config)
-    #load the rules
+    with profiler.stage("add_keys"):
+        keyed_test_cases = add_keys_task(config, test_cases, preserve_fields)
 
-    enrichment_result = True # added this line for the test to skip
-    if enrich: # added to not execute if it is not specified
-        #Load Rules for `enrich_rules_task`
-        # rules_new = load_rules(config) This load rule is not required as already present, this also created the issue as rule is loaded but not passed
+    with profiler.stage("save"):
+        materialize_outputs_task(config, rules, enriched_rules, test_cases, keyed_test_cases)
 
-        enrichment_result = enrich_rules_task.submit(config,rules_new) # changing it form .call() to .submit()
-        
+        fingerprints.save_run_fingerprints(rules, config, generation_rules=generation_rules)
 
-    if not enrichment_result:
-        print("Skipping enrichments")
+    publish_llm_metrics_task(config)
 
-    generation_result = generate_test_cases_task(config)
-    if not generation_result:
+# Matches the default max_concurrency; __main__ sizes it from the config
+@flow(name="Test Automation Workflow", task_runner=ThreadPoolTaskRunner(max_workers=4))
+def test_automation_flow(config_path="config/settings.yaml", enrich=True):
+    """Orchestrates the test automation process.
+
+    Stages hand their results to each other in memory; unchanged stages are
+    served from Prefect's result cache (see result_cache in the config), and
+    the output files are written once at the end.
+    """
+    config = load_config(config_path)
+    if not config:
         return
 
-    add_keys_task(config)
+    # Metrics cover this flow run only, even in a long-lived worker process
+    recorder = telemetry.configure(config)
+    if recorder is not None:
+        recorder.reset()
+
+    # Opt-in stage profiling (profiling.enabled in the config, or OAH_PROFILE=1)
+    profiler.start(config)
+    try:
+        run_stages(config, enrich)
+    finally:
+        report = profiler.stop()
+        if report is not None:
+            create_file_artifact("profile-report", "Link to the run's stage profile report.",
+                                 os.path.join(report["output_dir"], "report.json"))
 
 if __name__ == "__main__":
-    test_automation_flow(enrich=False)
\ No newline at end of file
+    config = load_config()
+    test_automation_flow.with_options(task_runner=generation_task_runner(config))(enrich=False)
@@ -2,7 +2,9 @@ import os
 import json
 import uuid
 import logging
+import itertools
 import yaml
+from src import checkpoint, json_stream, profiler
 
 def setup_logging(log_dir="logs", log_file="add_keys.log"):
     """Sets up logging configuration."""
@@ -28,28 +30,136 @@ def load_config(config_path="config/settings.yaml"):
         logging.error(f"Error parsing config file: {e}")
     return None
 
-def add_unique_keys(input_file: str, output_file: str):
-    """Read test cases, add unique keys, and save to a new file."""
+# Namespace for deterministic (uuid5) test case keys
+KEY_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "oah-prefect/test-case-keys")
+
+def _is_jsonl(path: str) -> bool:
+    return path.endswith(".jsonl")
+
+def iter_fields(path: str):
+    """Yield (field name, test cases) one field at a time, from either file format.
+
+    Legacy JSON ({"field": [cases]}) is parsed incrementally; JSONL has one
+    {"field": ..., "case": {...}} record per line, and a field's records must
+    be contiguous (a ValueError is raised when a field reappears). A field
+    without test cases is a single {"field": ...} record with no "case".
+    """
+    with open(path, "r") as f:
+        if not _is_jsonl(path):
+            yield from json_stream.iter_json_object(f)
+            return
+        records = (json.loads(line) for line in f if line.strip())
+        seen = set()
+        for field_name, group in itertools.groupby(records, key=lambda record: record["field"]):
+            if field_name in seen:
+                raise ValueError(f"Records of field {field_name} in {path} are not contiguous")
+            seen.add(field_name)
+            yield field_name, [record["case"] for record in group if "case" in record]
+
+def load_existing_keys(output_file: str, field_names):
+    """Load keys from a previous output for the given fields only."""
     try:
-        # Load JSON file
-        with open(input_file, "r") as f:
-            test_cases = json.load(f)
-        
-        # Process each field and test case
-        for field_name, cases in test_cases.items():
+        return {
+            field_name: [case.get("key") for case in cases]
+            for field_name, cases in iter_fields(output_file)
+            if field_name in field_names
+        }
+    except (IOError, ValueError, KeyError):
+        return {}
+
+def content_key(field_name: str, case: dict, occurrence: int = 0) -> str:
+    """Deterministic key derived from the field name and the case content (any existing key excluded)."""
+    content = json.dumps({k: v for k, v in case.items() if k != "key"}, sort_keys=True, ensure_ascii=False)
+    # Identical cases within a field get distinct keys via their occurrence number
+    return str(uuid.uuid5(KEY_NAMESPACE, f"{field_name}\n{content}\n{occurrence}"))
+
+@profiler.timed("add_keys.assign_keys")
+def assign_keys(field_name: str, cases: list, previous_keys, deterministic: bool) -> list:
+    if previous_keys and len(previous_keys) == len(cases) and all(previous_keys):
+        for case, key in zip(cases, previous_keys):
+            case["key"] = key
+        return cases
+    seen = {}
+    for case in cases:
+        if deterministic:
+            first_key = content_key(field_name, case)
+            occurrence = seen.get(first_key, 0)
+            seen[first_key] = occurrence + 1
+            case["key"] = content_key(field_name, case, occurrence) if occurrence else first_key
+        else:
+            case["key"] = str(uuid.uuid4())  # Assign a unique UUID
+    return cases
+
+def _write_jsonl(output_file: str, fields) -> int:
+    count = 0
+    with open(output_file, "w") as f:
+        for field_name, cases in fields:
             for case in cases:
-                case["key"] = str(uuid.uuid4())  # Assign a unique UUID
-        
-        # Save updated test cases with a backup mechanism
-        if os.path.exists(output_file):
-            backup_file = f"{output_file}.{uuid.uuid4().hex}.bak"
-            os.rename(output_file, backup_file)
-            logging.info(f"Backup created: {backup_file}")
-        
-        with open(output_file, "w") as f:
-            json.dump(test_cases, f, indent=2)
-        
-        logging.info(f"Successfully saved updated test cases to {output_file}")
+                f.write(json.dumps({"field": field_name, "case": case}, ensure_ascii=False) + "\n")
+            if not cases:
+                # Keeps the field, as the JSON format does
+                f.write(json.dumps({"field": field_name}, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+@profiler.timed("io.save_test_cases_with_keys")
+def save_test_cases_with_keys(fields, output_file: str) -> int:
+    """Write (field, keyed cases) pairs as JSON or JSONL, backing up any previous output.
+
+    Returns the number of fields written.
+    """
+    # Write next to the output and swap it in once complete
+    temp_file = f"{output_file}.tmp"
+    if _is_jsonl(output_file):
+        field_count = _write_jsonl(temp_file, fields)
+    else:
+        field_count = checkpoint.write_json_object_streaming(temp_file, fields)
+
+    # Save updated test cases with a backup mechanism
+    if os.path.exists(output_file):
+        backup_file = f"{output_file}.{uuid.uuid4().hex}.bak"
+        os.rename(output_file, backup_file)
+        logging.info(f"Backup created: {backup_file}")
+    os.replace(temp_file, output_file)
+    return field_count
+
+def add_keys_to_test_cases(test_cases: dict, previous_output=None, preserve_fields=None, deterministic: bool = False) -> dict:
+    """In-memory variant of add_unique_keys: returns a keyed copy of a {field: cases} dict.
+
+    Cases are shallow-copied so the input (e.g. a cached flow result) is left
+    unchanged. Preserved fields take their keys from previous_output (a keyed
+    test case file), if given.
+    """
+    existing_keys = {}
+    if preserve_fields and previous_output:
+        existing_keys = load_existing_keys(previous_output, set(preserve_fields))
+    return {
+        field_name: assign_keys(field_name, [dict(case) for case in cases], existing_keys.get(field_name), deterministic)
+        for field_name, cases in test_cases.items()
+    }
+
+def add_unique_keys(input_file: str, output_file: str, preserve_fields=None, deterministic: bool = False):
+    """Read test cases, add unique keys, and save to a new file.
+
+    Fields are streamed one at a time, so memory use is bounded by the largest
+    field rather than the whole file. Either file may be legacy JSON or JSONL
+    (by a .jsonl extension).
+
+    Fields listed in preserve_fields (unchanged since the last run) keep the keys
+    already assigned in output_file, as long as their case count is unchanged.
+    With deterministic=True keys are uuid5 hashes of the field and case content,
+    so reruns reproduce the same keys.
+    """
+    try:
+        existing_keys = load_existing_keys(output_file, set(preserve_fields)) if preserve_fields else {}
+
+        fields = (
+            (field_name, assign_keys(field_name, cases, existing_keys.get(field_name), deterministic))
+            for field_name, cases in iter_fields(input_file)
+        )
+
+        field_count = save_test_cases_with_keys(fields, output_file)
+        logging.info(f"Successfully saved updated test cases for {field_count} fields to {output_file}")
     except Exception as e:
         logging.error(f"Error processing test cases: {str(e)}")
         raise
@@ -63,7 +173,7 @@ def main():
     input_file = config.get("generated_test_cases_file", "data/generated_test_cases.json")
     output_file = config.get("test_case_keys_file", "data/test_case_with_keys.json")
     
-    add_unique_keys(input_file, output_file)
+    add_unique_keys(input_file, output_file, deterministic=config.get("deterministic_keys", False))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,95 @@
+# src/checkpoint.py
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Tuple
+
+
+class CheckpointWriter:
+    """
+    Append-only JSONL checkpoint of completed fields.
+
+    Each line is {"field": ..., "fingerprint": ..., "test_cases": [...]}.
+    Lines are flushed immediately and fsync'd every `fsync_every` records, so
+    a crash loses at most the last few fields.
+    """
+
+    def __init__(self, path: str, fsync_every: int = 10):
+        self.path = path
+        self.fsync_every = max(1, fsync_every)
+        self._pending = 0
+        needs_newline = os.path.exists(path) and os.path.getsize(path) > 0 and not _ends_with_newline(path)
+        self._file = open(path, "a", encoding="utf-8")
+        if needs_newline:
+            # A crash mid-write left a torn line; start the next record on a fresh line
+            self._file.write("\n")
+
+    def append(self, field_name: str, fingerprint: str, test_cases: List[Dict[str, Any]]) -> None:
+        record = {"field": field_name, "fingerprint": fingerprint, "test_cases": test_cases}
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._pending += 1
+        if self._pending >= self.fsync_every:
+            self.sync()
+
+    def sync(self) -> None:
+        if self._pending:
+            os.fsync(self._file.fileno())
+            self._pending = 0
+
+    def close(self) -> None:
+        self.sync()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def index_checkpoint(path: str) -> Dict[str, Tuple[str, int]]:
+    """Map field name -> (fingerprint, byte offset of its latest record) without loading the cases."""
+    index = {}
+    if not os.path.exists(path):
+        return index
+    with open(path, "rb") as f:
+        offset = 0
+        for line in f:
+            try:
+                record = json.loads(line)
+                index[record["field"]] = (record.get("fingerprint"), offset)
+            except (ValueError, KeyError):
+                logging.warning(f"Skipping unreadable checkpoint record at byte {offset} in {path}")
+            offset += len(line)
+    return index
+
+
+def read_record(f, offset: int) -> List[Dict[str, Any]]:
+    """Read the test cases of the record starting at `offset` in an open checkpoint file."""
+    f.seek(offset)
+    return json.loads(f.readline())["test_cases"]
+
+
+def write_json_object_streaming(output_file: str, entries: Iterable[Tuple[str, Any]]) -> int:
+    """
+    Write (key, value) pairs as one JSON object, one entry at a time.
+
+    The result is byte-identical to json.dump(dict(entries), f, indent=2) but
+    only one value is held in memory at once. Returns the number of entries.
+    """
+    count = 0
+    with open(output_file, "w") as f:
+        for key, value in entries:
+            # Render {key: value} and drop the outer braces to get an indented entry
+            entry = json.dumps({key: value}, indent=2)[2:-2]
+            f.write(("{\n" if count == 0 else ",\n") + entry)
+            count += 1
+        f.write("\n}" if count else "{}")
+    return count
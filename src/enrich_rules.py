@@ -1,9 +1,8 @@
 import json
-import os
-import google.generativeai as genai  # If using Gemini
-import pandas as pd
 import yaml
 import logging # Import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src import llm, profiler, telemetry
 
 def load_config(config_path="config/settings.yaml"):
     """Loads configuration from a YAML file."""
@@ -17,7 +16,10 @@ def load_config(config_path="config/settings.yaml"):
         logging.error(f"Error parsing config file: {e}")
         return None
 
-def enrich_constraints(field_name, data_type, business_rules, llm_client, llm_model, max_output_tokens=200):
+# Bump when the enrichment prompt changes, so cached flow results are not reused
+PROMPT_TEMPLATE_VERSION = "2"
+
+def enrich_constraints(field_name, data_type, business_rules, llm_client, max_output_tokens=200):
     """Enriches the rules with more details constraints."""
     prompt = f"""
     Based on the field '{field_name}' of type '{data_type}', and the business rules '{business_rules}', extract the constraints of the following rules, for each column. 
@@ -26,17 +28,9 @@ def enrich_constraints(field_name, data_type, business_rules, llm_client, llm_mo
     Constraints: "Mandatory, No Special Characters, Only Alphabets"
     """
     try:
-        if isinstance(llm_client, genai.GenerativeModel):
-            response = llm_client.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    max_output_tokens=max_output_tokens
-                )
-            )
-            extracted_constraints = response.text
-
-        else:
-            raise ValueError("Unsupported LLM client type.")
+        # Goes through the shared rate limiter in src/llm.py
+        with telemetry.scope("enrich", field_name):
+            extracted_constraints = llm.generate_test_cases_with_llm(llm_client, prompt, max_output_tokens)
 
         return extracted_constraints
 
@@ -44,6 +38,18 @@ def enrich_constraints(field_name, data_type, business_rules, llm_client, llm_mo
         logging.error(f"Error generating test cases: {e}")
         return None
 
+def enrichment_key(field_name, data_type, business_rules):
+    """Normalized key for deduplicating enrichment calls.
+
+    Case and whitespace differences are ignored. The field name is part of the
+    prompt, so only fields with the same name (in any parent) share a key.
+    """
+    return (
+        " ".join(str(data_type).split()).lower(),
+        " ".join(str(business_rules).split()).lower(),
+        " ".join(field_name.split()).lower(),
+    )
+
 def clean_and_split_constraints(constraints_string):
     """Clean and split the comma-separated constraints."""
     if not constraints_string:
@@ -58,16 +64,104 @@ def clean_and_split_constraints(constraints_string):
 
     return constraints_list
 
-def enrich_rules(config):
-    """Enriches the rules with constraints."""
-    # Load LLM
-    if config.get("gemini_api_key"):
-        genai.configure(api_key=config["gemini_api_key"])
-        llm_model = config.get("gemini_model", "gemini-1.5-flash")  # Or use a different model name
-        llm_client = genai.GenerativeModel(llm_model)
+def build_enriched_field(field_details, constraints_list):
+    """The enriched rule entry for a field: its rule details plus the extracted constraints."""
+    return {
+        "data_type": field_details["data_type"],
+        "mandatory_field": field_details["mandatory_field"],
+        "from_source": field_details["from_source"],  # Added to include from_source
+        "primary_key": field_details["primary_key"],  # Added to include primary_key
+        "required_for_deployment": field_details["required_for_deployment"],  # Added to include required_for_deployment
+        "deployment_validation": field_details["deployment_validation"],  # Added to include deployment_validation
+        "business_rules": field_details["business_rules"],  # Added to include business_rules
+        "constraints": list(constraints_list)  # add constraints as a List
+    }
+
+def load_existing_enriched_rules(output_file):
+    """Loads previously enriched rules so unchanged fields can keep their constraints."""
+    try:
+        with open(output_file, "r") as f:
+            return json.load(f)
+    except (IOError, json.JSONDecodeError):
+        return {}
+
+def enrich_loaded_rules(rules, config, only_fields=None, existing_rules=None, llm_client=None, failed_fields=None):
+    """Enriches already-loaded rules with constraints and returns the enriched rules.
+
+    If only_fields (a set of 'parent.field' names) is given, only those fields are
+    sent to the LLM; the rest keep their constraints from existing_rules.
+    Fields whose LLM call failed get empty constraints; pass a list as
+    failed_fields to collect their 'parent.field' names.
+    """
+    if llm_client is None:
+        llm_client = llm.initialize_llm(config)
+    existing_rules = existing_rules or {}
+
+    # Group the fields that need enrichment by their normalized enrichment key, so
+    # fields sharing (data_type, business_rules, field name) cost one LLM call
+    groups = {}
+    enriched_rules = {}
+    for parent_field, details in rules.items():
+        enriched_rules[parent_field] = {"fields": {}}  # Removed description
+        for field_name, field_details in details["fields"].items():
+            existing_field = existing_rules.get(parent_field, {}).get("fields", {}).get(field_name)
+            if only_fields is not None and f"{parent_field}.{field_name}" not in only_fields and existing_field:
+                enriched_rules[parent_field]["fields"][field_name] = existing_field
+                continue
+
+            # Placeholder keeps the output in rules order; filled in after enrichment
+            enriched_rules[parent_field]["fields"][field_name] = None
+            key = enrichment_key(field_name, field_details["data_type"], field_details["business_rules"])
+            groups.setdefault(key, []).append((parent_field, field_name, field_details))
+
+    total_fields = sum(len(members) for members in groups.values())
+    max_concurrency = max(1, int(config.get("max_concurrency", 1)))
+    print(f"Enriching {total_fields} fields with {len(groups)} LLM calls (max_concurrency={max_concurrency})")
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = {}
+        for key, members in groups.items():
+            # Every field of the group has the same prompt; the first one is sent
+            _, field_name, field_details = members[0]
+            futures[executor.submit(
+                enrich_constraints, field_name, field_details["data_type"], field_details["business_rules"],
+                llm_client
+            )] = key
+
+        for future in as_completed(futures):
+            constraints_string = future.result()
+            constraints_list = clean_and_split_constraints(constraints_string)
+            if constraints_string is None and failed_fields is not None:
+                failed_fields.extend(f"{parent_field}.{field_name}"
+                                     for parent_field, field_name, _ in groups[futures[future]])
+
+            # Fan the result back out to every field that shares the key
+            for parent_field, field_name, field_details in groups[futures[future]]:
+                enriched_rules[parent_field]["fields"][field_name] = build_enriched_field(field_details, constraints_list)
+
+    return enriched_rules
+
+@profiler.timed("io.save_enriched_rules")
+def save_enriched_rules(enriched_rules, output_file):
+    """Saves the enriched rules to a JSON file."""
+    try:
+        with open(output_file, "w") as f:
+            json.dump(enriched_rules, f, indent=4)
+        print(f"✅ Rules extracted and saved to {output_file}")
+    except IOError as e:
+        print(f"Error saving rules to {output_file}: {e}")
+
+def enrich_rules(config, only_fields=None):
+    """Enriches the rules in processed_rules_file and saves them to constrains_processed_rules_file.
 
-    else:
-        print("Error: No LLM API key found in config.yaml. Please configure either Gemini or OpenAI.")
+    If only_fields (a set of 'parent.field' names) is given, only those fields are
+    sent to the LLM; the rest keep the constraints already in constrains_processed_rules_file.
+    """
+    # Load LLM
+    try:
+        llm_client = llm.initialize_llm(config)
+    except Exception as e:
+        print(f"Error: Failed to initialize LLM ({e}). Please configure either Gemini or OpenAI.")
         return
 
     # Load processed rules
@@ -86,35 +180,15 @@ def enrich_rules(config):
         print(f"Error decoding JSON from {rules_file}: {e}")
         return
 
-    enriched_rules = {}
-    for parent_field, details in rules.items():
-        enriched_rules[parent_field] = {"fields": {}}  # Removed description
-        for field_name, field_details in details["fields"].items():
-            data_type = field_details["data_type"]
-            business_rules = field_details["business_rules"]  # Added to get business rules
-
-            extracted_constraints = enrich_constraints(field_name, data_type, business_rules, llm_client, llm_model)
-            constraints_list = clean_and_split_constraints(extracted_constraints)
-
-            enriched_rules[parent_field]["fields"][field_name] = {
-                "data_type": data_type,
-                "mandatory_field": field_details["mandatory_field"],
-                "from_source": field_details["from_source"],  # Added to include from_source
-                "primary_key": field_details["primary_key"],  # Added to include primary_key
-                "required_for_deployment": field_details["required_for_deployment"],  # Added to include required_for_deployment
-                "deployment_validation": field_details["deployment_validation"],  # Added to include deployment_validation
-                "business_rules": business_rules,  # Added to include business_rules
-                "constraints": constraints_list  # add constraints as a List
-            }
+    existing_rules = {}
+    if only_fields is not None:
+        existing_rules = load_existing_enriched_rules(config.get("constrains_processed_rules_file"))
+
+    enriched_rules = enrich_loaded_rules(rules, config, only_fields=only_fields,
+                                         existing_rules=existing_rules, llm_client=llm_client)
 
     # Save the enreiched constrains
-    output_file = config.get("constrains_processed_rules_file")
-    try:
-        with open(output_file, "w") as f:
-            json.dump(enriched_rules, f, indent=4)
-        print(f"✅ Rules extracted and saved to {output_file}")
-    except IOError as e:
-        print(f"Error saving rules to {output_file}: {e}")
+    save_enriched_rules(enriched_rules, config.get("constrains_processed_rules_file"))
 
 # def main():
 #     config = load_config()
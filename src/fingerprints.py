@@ -0,0 +1,159 @@
+# src/fingerprints.py
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, Optional, Set
+
+
+def generation_context(config: Optional[dict]) -> str:
+    """
+    Everything besides a field's rules that shapes its test cases: the prompt
+    template versions, the API and the model. Part of every fingerprint, so
+    changing any of them regenerates every field.
+    """
+    if not config:
+        return ""
+    # Imported here: generate_test_cases imports this module
+    from src import enrich_rules, generate_test_cases
+
+    api_use = config.get("api_use", "Gemini").lower()
+    model = config.get("gemini_model", "gemini-1.5-flash") if api_use == "gemini" else config.get("deployment_name")
+    return json.dumps({
+        "generate_prompt": generate_test_cases.PROMPT_TEMPLATE_VERSION,
+        "enrich_prompt": enrich_rules.PROMPT_TEMPLATE_VERSION,
+        "api_use": api_use,
+        "model": model,
+        "structured_output": bool(config.get("structured_output", False)),
+    }, sort_keys=True)
+
+
+def fingerprint_field(field_details: dict, context: str = "") -> str:
+    """Stable hash of a single field's rule dict and the generation context (see generation_context)."""
+    payload = json.dumps(field_details, sort_keys=True, ensure_ascii=False) + context
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def compute_fingerprints(rules: dict, config: Optional[dict] = None) -> Dict[str, str]:
+    """Fingerprint every field in the rules, keyed by 'parent.field'."""
+    context = generation_context(config)
+    fingerprints = {}
+    for parent_field, details in rules.items():
+        for field_name, field_details in details["fields"].items():
+            fingerprints[f"{parent_field}.{field_name}"] = fingerprint_field(field_details, context)
+    return fingerprints
+
+
+def load_fingerprints(path: str) -> Optional[Dict[str, str]]:
+    """Load stored fingerprints, or None if there is no usable fingerprint file."""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (IOError, json.JSONDecodeError) as e:
+        logging.warning(f"Ignoring unreadable fingerprint file {path}: {e}")
+        return None
+
+
+def save_fingerprints(fingerprints: Dict[str, str], path: str) -> None:
+    """Saves fingerprints next to the outputs they describe."""
+    try:
+        with open(path, "w") as f:
+            json.dump(fingerprints, f, indent=2)
+        logging.info(f"Saved rule fingerprints to {path}")
+    except IOError as e:
+        logging.error(f"Error saving fingerprints to {path}: {e}")
+
+
+def changed_fields(old: Dict[str, str], new: Dict[str, str]) -> Set[str]:
+    """Fields that were added or whose rules changed since `old` was recorded."""
+    return {name for name, fingerprint in new.items() if old.get(name) != fingerprint}
+
+
+def filter_rules(rules: dict, full_field_names: Set[str]) -> dict:
+    """Subset of the rules containing only the given 'parent.field' entries."""
+    filtered = {}
+    for parent_field, details in rules.items():
+        fields = {
+            field_name: field_details
+            for field_name, field_details in details["fields"].items()
+            if f"{parent_field}.{field_name}" in full_field_names
+        }
+        if fields:
+            filtered[parent_field] = {**details, "fields": fields}
+    return filtered
+
+
+def plan_incremental_run(rules: dict, config: dict) -> Optional[Set[str]]:
+    """
+    Decide which fields need enrichment and generation on this run.
+
+    Returns the set of added/changed 'parent.field' names, or None when a full
+    run is required (incremental mode off, no previous fingerprints, or the
+    previous outputs are missing).
+    """
+    if not config.get("incremental", False):
+        return None
+
+    previous = load_fingerprints(config.get("rule_fingerprints_file"))
+    if previous is None:
+        logging.info("No previous rule fingerprints found, running full generation")
+        return None
+
+    for output_key in ("constrains_processed_rules_file", "generated_test_cases_file", "test_case_keys_file"):
+        if not os.path.exists(config.get(output_key, "")):
+            logging.info(f"{config.get(output_key)} is missing, running full generation")
+            return None
+
+    current = compute_fingerprints(rules, config)
+    changed = changed_fields(previous, current)
+    removed = set(previous) - set(current)
+    logging.info(f"Incremental run: {len(changed)} added/changed, {len(removed)} removed, "
+                 f"{len(current) - len(changed)} unchanged fields")
+    return changed
+
+
+def stale_fields(rules: dict, generation_rules: dict) -> Set[str]:
+    """
+    Fields whose generation input no longer matches their current rules.
+
+    With enrichment skipped, generation reads the enriched rules of an earlier
+    run, so an edited rule is generated from its old version.
+    """
+    stale = set()
+    for parent_field, details in rules.items():
+        generated_from = generation_rules.get(parent_field, {}).get("fields", {})
+        for field_name, field_details in details["fields"].items():
+            used = generated_from.get(field_name) or {}
+            if any(used.get(key) != value for key, value in field_details.items()):
+                stale.add(f"{parent_field}.{field_name}")
+    return stale
+
+
+def save_run_fingerprints(rules: dict, config: dict, generation_rules: Optional[dict] = None) -> None:
+    """
+    Record fingerprints after a run, for fields that ended up with test cases.
+
+    Fields whose generation failed are left out so the next incremental run
+    picks them up again, and so are fields generated from outdated rules when
+    `generation_rules` (the rules generation actually read) is given.
+    """
+    path = config.get("rule_fingerprints_file")
+    if not path:
+        return
+    try:
+        with open(config["generated_test_cases_file"], "r") as f:
+            generated_fields = set(json.load(f))
+    except (IOError, json.JSONDecodeError) as e:
+        logging.warning(f"Not saving fingerprints, generated test cases unreadable: {e}")
+        return
+    if generation_rules is not None:
+        stale = stale_fields(rules, generation_rules)
+        if stale:
+            logging.warning(f"{len(stale)} fields were generated from outdated rules in "
+                            f"{config.get('constrains_processed_rules_file')}; run enrichment to pick up "
+                            f"their changes: {', '.join(sorted(stale))}")
+            generated_fields -= stale
+    current = compute_fingerprints(rules, config)
+    save_fingerprints({name: fp for name, fp in current.items() if name in generated_fields}, path)
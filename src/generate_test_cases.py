@@ -1,12 +1,13 @@
 import json
 import os
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, Iterable, List, Optional, Any, Set, Tuple
 # import google.generativeai as genai #REMOVE THIS
 import yaml
 from datetime import datetime
 import logging
-import re
-from src import llm #Added IMPORT 
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src import checkpoint, fingerprints, json_stream, llm, llm_cache, profiler, telemetry, validate_test_cases #Added IMPORT 
 
 # Set up logging
 logging.basicConfig(
@@ -18,11 +19,19 @@ logging.basicConfig(
     ]
 )
 
+# Bump when the generation prompts change, so cached flow results are not reused
+PROMPT_TEMPLATE_VERSION = "1"
+
 class TestCaseGenerator:
-    def __init__(self, config_path: str = "config/settings.yaml"):
-        self.config = self._load_config(config_path)
+    def __init__(self, config_path: str = "config/settings.yaml", config: Optional[dict] = None):
+        # An already-loaded config (e.g. the flow's) wins over config_path
+        self.config = config if config is not None else self._load_config(config_path)
         # self.llm_client = self._initialize_llm() #REMOVED THIS
         self.field_specific_rules = self._initialize_field_rules()
+        self.validator = validate_test_cases.TestCaseValidator(
+            date_formats=self.field_specific_rules["Date"]["valid_formats"],
+            custom_rules=self.config.get("validation_rules")
+        )
         
     def _load_config(self, config_path: str) -> dict:
         """Load configuration from YAML file with error handling."""
@@ -50,43 +59,10 @@ class TestCaseGenerator:
         """Initialize specific rules for different field types."""
         return {
             "Date": {
-                "valid_formats": [
-                    "%Y-%m-%d %H:%M:%S",
-                    "%Y/%m/%d %H:%M:%S",
-                    "%m/%d/%Y %H:%M:%S"
-                ],
-                "extra_validation": self._validate_date_format
-            },
-            "String": {
-                "extra_validation": self._validate_string_format
+                "valid_formats": list(validate_test_cases.DEFAULT_DATE_FORMATS)
             }
         }
 
-    def _validate_date_format(self, test_case: Dict[str, Any]) -> Tuple[bool, str]:
-        """Validate date format test cases."""
-        if test_case["input"] is None:
-            return True, ""
-            
-        if isinstance(test_case["input"], str):
-            for date_format in self.field_specific_rules["Date"]["valid_formats"]:
-                try:
-                    datetime.strptime(test_case["input"], date_format)
-                    return True, ""
-                except ValueError:
-                    continue
-            return False, f"Invalid date format. Expected formats: {self.field_specific_rules['Date']['valid_formats']}"
-        return False, "Date input must be a string"
-
-    def _validate_string_format(self, test_case: Dict[str, Any]) -> Tuple[bool, str]:
-        """Validate string format test cases."""
-        if test_case["input"] is None:
-            return True, ""
-            
-        if not isinstance(test_case["input"], (str, type(None))):
-            if test_case["expected_result"] == "Pass":
-                return False, "String field with non-string input should fail"
-        return True, ""
-
     def _generate_prompt(self, field_name: str, data_type: str, mandatory_field: bool, primary_key: bool, business_rules: str) -> str:
         """Generate a more structured and specific prompt for test case generation."""
         field_specific_info = ""
@@ -136,47 +112,41 @@ IMPORTANT: Return ONLY the JSON array. No additional text or explanation."""
 
     def _validate_test_case(self, test_case: Dict[str, Any], data_type: str) -> Tuple[bool, str]:
         """Validate a single test case based on field type and rules."""
-        if not all(field in test_case for field in ["test_case", "description", "expected_result", "input"]):
-            return False, "Missing required fields"
+        return self.validator.validate_case(test_case, data_type)
 
-        if test_case["expected_result"] not in ["Pass", "Fail"]:
-            return False, "Invalid expected_result value"
+    def _clean_response_text(self, response_text: str) -> str:
+        """Strip Markdown fences and fix invalid escape sequences in an LLM response."""
+        # Remove Markdown JSON blocks if present
+        cleaned_text = response_text.replace("```json", "").replace("```", "").strip()
 
-        # Apply field-specific validation
-        if data_type in self.field_specific_rules:
-            return self.field_specific_rules[data_type]["extra_validation"](test_case)
+        # Handle invalid escape sequences
+        return json_stream.fix_invalid_escapes(cleaned_text)
 
-        return True, ""
+    @profiler.timed("generate.validate")
+    def _validate_test_cases(self, test_cases: List[Dict[str, Any]], data_type: str) -> List[Dict[str, Any]]:
+        """Validate a list of test cases in one pass, dropping invalid ones."""
+        validated_cases, errors = self.validator.validate(test_cases, data_type)
+        for idx, _, error_msg in errors:
+            logging.warning(f"Test case {idx} validation failed: {error_msg}")
+        return validated_cases
 
+    @profiler.timed("generate.parse_response")
     def _parse_llm_response(self, response_text: str, data_type: str) -> Optional[List[Dict[str, Any]]]:
         """Parse and validate LLM response with improved error handling."""
         try:
-            # Remove Markdown JSON blocks if present
-            cleaned_text = response_text.replace("```json", "").replace("```", "").strip()
-
-            # Handle invalid escape sequences
-            cleaned_text = re.sub(r'\\([^"\\])', r'\\\\\1', cleaned_text)  
-
             # Parse JSON
-            test_cases = json.loads(cleaned_text)
+            test_cases = json.loads(self._clean_response_text(response_text))
+
+            # Structured-output responses wrap the array as {"test_cases": [...]}
+            if isinstance(test_cases, dict) and isinstance(test_cases.get("test_cases"), list):
+                test_cases = test_cases["test_cases"]
 
             # Validate structure
             if not isinstance(test_cases, list):
                 raise ValueError("Response is not a JSON array")
 
             # Validate and normalize each test case
-            validated_cases = []
-            for idx, case in enumerate(test_cases, 1):
-                is_valid, error_msg = self._validate_test_case(case, data_type)
-                if not is_valid:
-                    logging.warning(f"Test case {idx} validation failed: {error_msg}")
-                    continue
-                
-                # Normalize expected_result to Pass/Fail
-                case["expected_result"] = "Pass" if case["expected_result"].lower() == "pass" else "Fail"
-                validated_cases.append(case)
-
-            return validated_cases
+            return self._validate_test_cases(test_cases, data_type)
 
         except json.JSONDecodeError as e:
             logging.error(f"JSON parsing error: {str(e)} - Raw response: {response_text}")
@@ -185,115 +155,552 @@ IMPORTANT: Return ONLY the JSON array. No additional text or explanation."""
             logging.error(f"Unexpected error parsing response: {str(e)}")
             return None
 
+    @profiler.timed("generate.salvage_response")
+    def _salvage_test_cases(self, response_text: str, data_type: str) -> Tuple[List[Dict[str, Any]], List[Tuple[str, str]]]:
+        """
+        Tolerant alternative to _parse_llm_response: keep every valid test case
+        from a response even if other parts of it are broken.
+
+        Returns (valid_cases, problems), where problems holds (raw case text,
+        reason) for cases that were malformed, cut off, or failed validation.
+        """
+        if not response_text:
+            return [], []
+
+        objects, broken = json_stream.salvage_objects(self._clean_response_text(response_text))
+        problems = [(raw, "Malformed or truncated JSON") for raw in broken]
+        validated_cases, errors = self.validator.validate(objects, data_type)
+        for idx, case, error_msg in errors:
+            logging.warning(f"Test case {idx} validation failed: {error_msg}")
+            problems.append((json.dumps(case), error_msg))
+        if broken:
+            logging.warning(f"Salvaged {len(validated_cases)} test cases from a response with {len(broken)} malformed entries")
+        return validated_cases, problems
+
+    def _generate_repair_prompt(self, field_name: str, field_details: Dict[str, Any], problems: List[Tuple[str, str]]) -> str:
+        """Prompt asking for replacements of only the broken/invalid test cases of a field."""
+        problem_list = "\n".join(f"- {raw[:500]}\n  Problem: {reason}" for raw, reason in problems)
+        date_formats = ""
+        if field_details["data_type"] == "Date":
+            date_formats = "\nFor Date fields, use these formats only: " + \
+                           ", ".join(self.field_specific_rules["Date"]["valid_formats"])
 
-    def generate_test_cases(self, rules_file: str, output_file: str, llm_client) -> None: #added llm client
-        """Main method to generate and save test cases."""
+        return f"""
+The following test cases for the field '{field_name}' (Data Type: {field_details["data_type"]}, Mandatory: {field_details["mandatory_field"]}, Primary Key: {field_details["primary_key"]}, Business Rules: {field_details.get("business_rules", "")}) were invalid or incomplete:
+{problem_list}
+{date_formats}
+Return ONLY a JSON array with one corrected test case for each of them. Each test case must have exactly the fields "test_case", "description", "expected_result" (exactly "Pass" or "Fail") and "input". No additional text or explanation."""
+
+    def _repair_test_cases(self, llm_client, field_name: str, field_details: Dict[str, Any], problems: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """One small follow-up request to replace the broken/invalid cases, instead of regenerating the field."""
+        logging.info(f"Requesting repair of {len(problems)} test cases for {field_name}")
+        max_output_tokens = min(self.config.get("max_output_tokens", 1000), 200 * len(problems))
+        with telemetry.scope("repair"):
+            response_text = llm.generate_test_cases_with_llm(
+                llm_client, self._generate_repair_prompt(field_name, field_details, problems), max_output_tokens,
+                json_mode=self.config.get("structured_output", False)
+            )
+        repaired_cases, _ = self._salvage_test_cases(response_text, field_details["data_type"])
+        # One replacement per broken case; anything beyond that is the model regenerating the field
+        repaired_cases = repaired_cases[:len(problems)]
+        logging.info(f"Repair recovered {len(repaired_cases)} of {len(problems)} test cases for {field_name}")
+        return repaired_cases
+
+    def _stream_test_cases(self, llm_client, prompt: str, data_type: str, use_cache: bool) -> Optional[List[Dict[str, Any]]]:
+        """Stream a response, validating each test case as soon as its object closes.
+
+        A response that is clearly not the expected JSON array is abandoned
+        mid-stream instead of being read to the end.
+        """
+        parser = json_stream.JsonArrayStreamParser()
+        validated_cases = []
+        started_at = time.monotonic()
+        chunks = llm.stream_test_cases_with_llm(
+            llm_client, prompt, self.config.get("max_output_tokens", 1000), use_cache=use_cache,
+            json_mode=self.config.get("structured_output", False)
+        )
         try:
-            # Load rules
-            with open(rules_file, "r") as f:
-                rules = json.load(f)
+            for chunk in chunks:
+                for case in parser.feed(chunk):
+                    is_valid, error_msg = self._validate_test_case(case, data_type)
+                    if not is_valid:
+                        logging.warning(f"Test case {parser.objects_parsed} validation failed: {error_msg}")
+                        continue
+                    if not validated_cases:
+                        logging.debug(f"First valid test case after {time.monotonic() - started_at:.2f}s")
+                    validated_cases.append(case)
+        except json_stream.MalformedStreamError as e:
+            logging.error(f"Aborted malformed response stream after {parser.objects_parsed} test cases: {str(e)}")
+            return None
+        finally:
+            chunks.close()
+
+        if not parser.finished:
+            logging.warning("Response stream ended before the JSON array was closed")
+        return validated_cases
+
+    def generate_field_test_cases(self, full_field_name: str, field_name: str, field_details: Dict[str, Any], llm_client) -> Optional[List[Dict[str, Any]]]:
+        """Generate and validate test cases for a single field, retrying on failure."""
+        with telemetry.scope("generate", full_field_name):
+            return self._generate_field_test_cases_with_retries(full_field_name, field_name, field_details, llm_client)
+
+    def _generate_field_test_cases_with_retries(self, full_field_name: str, field_name: str, field_details: Dict[str, Any], llm_client) -> Optional[List[Dict[str, Any]]]:
+        logging.info(f"Processing field: {full_field_name}")
+        prompt = self._generate_prompt(
+            field_name,
+            field_details["data_type"],
+            field_details["mandatory_field"],
+            field_details["primary_key"],
+            field_details.get("business_rules", "")
+        )
 
-            all_test_cases = {}
-            total_fields = sum(len(details["fields"]) for details in rules.values())
-            processed_fields = 0
+        # Get LLM response with retries
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                # Only the first attempt may be answered from the cache; a cached
+                # response that failed validation must not be replayed.
+                if self.config.get("stream_responses", False):
+                    test_cases = self._stream_test_cases(llm_client, prompt, field_details["data_type"], use_cache=(attempt == 0))
+                else:
+                    response_text = llm.generate_test_cases_with_llm(
+                        llm_client, prompt, self.config.get("max_output_tokens", 1000), use_cache=(attempt == 0),
+                        json_mode=self.config.get("structured_output", False)
+                    )
+                    if self.config.get("repair_responses", False):
+                        # Keep the valid cases and ask only for the broken ones again;
+                        # the whole field is retried only if nothing was usable
+                        test_cases, problems = self._salvage_test_cases(response_text, field_details["data_type"])
+                        if test_cases and problems:
+                            test_cases += self._repair_test_cases(llm_client, field_name, field_details, problems)
+                    else:
+                        test_cases = self._parse_llm_response(response_text, field_details["data_type"])
+
+                if test_cases:
+                    logging.info(f"Successfully generated {len(test_cases)} test cases for {full_field_name}")
+                    return test_cases
+                else:
+                    logging.warning(f"Attempt {attempt + 1}: Failed to generate valid test cases for {full_field_name}")
+            except Exception as e:
+                logging.error(f"Attempt {attempt + 1} failed for {full_field_name}: {str(e)}")
+
+        logging.error(f"Failed to generate test cases for {full_field_name} after {max_retries} attempts")
+        return None
+
+    def _generate_batch_prompt(self, batch: List[Tuple[str, str, Dict[str, Any]]]) -> str:
+        """Generate one prompt covering several fields of the same parent schema."""
+        field_specs = "\n".join(
+            f"""
+Field: '{field_name}'
+- Data Type: {field_details["data_type"]}
+- Mandatory: {field_details["mandatory_field"]}
+- Primary Key: {field_details["primary_key"]}
+- Business Rules: {field_details.get("business_rules", "")}"""
+            for _, field_name, field_details in batch
+        )
+        date_formats = "\n".join(f"     - {fmt}" for fmt in self.field_specific_rules["Date"]["valid_formats"])
 
+        return f"""
+Generate test cases for EACH of the following {len(batch)} fields:
+{field_specs}
 
-            for parent_field, details in rules.items():
-                for field_name, field_details in details["fields"].items():
-                    full_field_name = f"{parent_field}.{field_name}"
-                    logging.info(f"Processing field {processed_fields + 1}/{total_fields}: {full_field_name}")
-                    if full_field_name in all_test_cases:
-                        logging.warning(f"Skipping {full_field_name}, already processed.")
-                        continue
-            # # Process each field
-            # for parent_field, details in rules.items():
-            #     for field_name, field_details in details["fields"].items():
-            #         full_field_name = f"{parent_field}.{field_name}"
-            #         logging.info(f"Processing field {processed_fields + 1}/{total_fields}: {full_field_name}")
-
-                    # Generate prompt
-                    prompt = self._generate_prompt(
-                        field_name,
-                        field_details["data_type"],
-                        field_details["mandatory_field"],
-                        field_details["primary_key"],
-                        field_details.get("business_rules", "")
-                    )
+Requirements:
+1. Include ONLY a JSON object in your response, keyed by the exact field name
+   above, whose values are the JSON arrays of test cases for that field
+2. Each test case must have these exact fields:
+   - "test_case": A clear, unique identifier for the test
+   - "description": Detailed explanation of what the test verifies
+   - "expected_result": MUST be exactly "Pass" or "Fail"
+   - "input": The test input value (can be null, string, number, etc.)
 
-                    # Get LLM response with retries
-                    max_retries = 3
-                    for attempt in range(max_retries):
-                        try:
-                            # response = self.llm_client.generate_content(prompt) #REMOVED THIS
-                            response_text = llm.generate_test_cases_with_llm(llm_client,prompt,self.config.get("max_output_tokens", 1000)) #ADDED THIS
-                            test_cases = self._parse_llm_response(response_text, field_details["data_type"])
-                            
-                            if test_cases:
-                                all_test_cases[full_field_name] = test_cases
-                                logging.info(f"Successfully generated {len(test_cases)} test cases")
-                                break
-                            else:
-                                logging.warning(f"Attempt {attempt + 1}: Failed to generate valid test cases")
-                        except Exception as e:
-                            logging.error(f"Attempt {attempt + 1} failed: {str(e)}")
-                            if attempt == max_retries - 1:
-                                logging.error(f"Failed to generate test cases for {full_field_name} after {max_retries} attempts")
-                    
-                    processed_fields += 1
+3. Include these types of test cases for every field:
+   - Basic valid inputs
+   - Basic invalid inputs
+   - Null/empty handling
+   - Boundary conditions
+   - Edge cases
+   - Type validation
 
-            # Save results
-            self._save_test_cases(all_test_cases, output_file)
-            
-            # Generate summary
-            self._generate_summary(all_test_cases, output_file)
+4. Consider field-specific requirements:
+   - For Date fields: Use only these formats:
+{date_formats}
+   - For String fields: Consider length limits and character restrictions
+   - Handle nullable fields appropriately based on constraints
+
+Return the response in this exact format:
+{{
+    "<field name>": [
+        {{
+            "test_case": "TC001_Valid_Basic",
+            "description": "Basic valid input test",
+            "expected_result": "Pass",
+            "input": "example"
+        }}
+    ]
+}}
+
+IMPORTANT: Return ONLY the JSON object with one entry per field. No additional text or explanation."""
+
+    @profiler.timed("generate.parse_batch_response")
+    def _parse_batch_response(self, response_text: str, batch: List[Tuple[str, str, Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+        """Split a batched response into validated test cases per full field name.
 
+        Fields that are missing from the response, or have no valid cases, are
+        left out of the result so the caller can resubmit them individually.
+        """
+        try:
+            response = json.loads(self._clean_response_text(response_text))
+            if not isinstance(response, dict):
+                raise ValueError("Batched response is not a JSON object")
         except Exception as e:
-            logging.error(f"Failed to generate test cases: {str(e)}")
-            raise
+            logging.error(f"Failed to parse batched response: {str(e)}")
+            return {}
+
+        results = {}
+        for full_field_name, field_name, field_details in batch:
+            test_cases = response.get(field_name)
+            if not isinstance(test_cases, list):
+                logging.warning(f"Batched response has no test cases for {full_field_name}")
+                continue
+            validated_cases = self._validate_test_cases(test_cases, field_details["data_type"])
+            if validated_cases:
+                results[full_field_name] = validated_cases
+        return results
+
+    def generate_batch_test_cases(self, batch: List[Tuple[str, str, Dict[str, Any]]], llm_client) -> Dict[str, Optional[List[Dict[str, Any]]]]:
+        """Generate test cases for a batch of fields with a single LLM call.
+
+        Fields the batched response doesn't cover are resubmitted on their own,
+        with the usual per-field retries.
+        """
+        if len(batch) == 1:
+            full_field_name, field_name, field_details = batch[0]
+            return {full_field_name: self.generate_field_test_cases(full_field_name, field_name, field_details, llm_client)}
+
+        logging.info(f"Processing batch of {len(batch)} fields: {', '.join(field[0] for field in batch)}")
+        max_output_tokens = min(
+            self.config.get("max_output_tokens", 1000) * len(batch),
+            self.config.get("batch_max_output_tokens", 8192)
+        )
+        results = {}
+        try:
+            with telemetry.scope("generate_batch", f"{batch[0][0]} (+{len(batch) - 1})"):
+                response_text = llm.generate_test_cases_with_llm(llm_client, self._generate_batch_prompt(batch), max_output_tokens)
+            if response_text:
+                results = self._parse_batch_response(response_text, batch)
+        except Exception as e:
+            logging.error(f"Batch request failed: {str(e)}")
+
+        for full_field_name, field_name, field_details in batch:
+            if full_field_name in results:
+                logging.info(f"Successfully generated {len(results[full_field_name])} test cases for {full_field_name}")
+            else:
+                results[full_field_name] = self.generate_field_test_cases(full_field_name, field_name, field_details, llm_client)
+        return results
+
+    def field_signature(self, field_name: str, field_details: Dict[str, Any]) -> Tuple:
+        """Canonical signature of everything that goes into a field's prompt."""
+        return (
+            field_name,
+            field_details["data_type"],
+            field_details["mandatory_field"],
+            field_details["primary_key"],
+            field_details.get("business_rules", ""),
+        )
 
-    def _save_test_cases(self, test_cases: Dict[str, List[Dict[str, Any]]], output_file: str) -> None:
-        """Save test cases with backup."""
+    def _plan_unique_fields(self, fields: List[Tuple[str, str, Dict[str, Any]]]) -> Tuple[List[Tuple[str, str, Dict[str, Any]]], Dict[str, List[str]]]:
+        """
+        Collapse fields with identical signatures (e.g. the same attribute under
+        several parent schemas) so each is generated once.
+
+        Returns the representative fields, in rules order, and a mapping from
+        each representative's full name to every full field name it stands for.
+        """
+        if not self.config.get("dedupe_fields", True):
+            return fields, {field[0]: [field[0]] for field in fields}
+
+        representatives = {}
+        duplicates = {}
+        for field in fields:
+            full_field_name, field_name, field_details = field
+            signature = self.field_signature(field_name, field_details)
+            if signature not in representatives:
+                representatives[signature] = field
+                duplicates[full_field_name] = []
+            duplicates[representatives[signature][0]].append(full_field_name)
+        return list(representatives.values()), duplicates
+
+    def _plan_batches(self, fields: List[Tuple[str, str, Dict[str, Any]]]) -> List[List[Tuple[str, str, Dict[str, Any]]]]:
+        """Group fields into batches of up to batch_size fields from the same parent schema.
+
+        Batches are also capped so that max_output_tokens per field fits into
+        batch_max_output_tokens. A batch_size of 1 gives one field per request.
+        """
+        per_field_tokens = self.config.get("max_output_tokens", 1000)
+        batch_size = max(1, min(
+            int(self.config.get("batch_size", 1)),
+            self.config.get("batch_max_output_tokens", 8192) // max(per_field_tokens, 1)
+        ))
+
+        batches = []
+        current_parent = None
+        for field in fields:
+            full_field_name, field_name, _ = field
+            parent_field = full_field_name[:-(len(field_name) + 1)]
+            if batches and parent_field == current_parent and len(batches[-1]) < batch_size:
+                batches[-1].append(field)
+            else:
+                batches.append([field])
+                current_parent = parent_field
+        return batches
+
+    def _flatten_fields(self, rules: dict) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """Flatten rules to (full_field_name, field_name, field_details) in rules order."""
+        return [
+            (f"{parent_field}.{field_name}", field_name, field_details)
+            for parent_field, details in rules.items()
+            for field_name, field_details in details["fields"].items()
+        ]
+
+    def _generate_into_checkpoint(self, fields: List[Tuple[str, str, Dict[str, Any]]], llm_client,
+                                  checkpoint_file: str) -> Tuple[Dict[str, str], Tuple[int, int]]:
+        """
+        Generate test cases for `fields`, appending each completed field to the checkpoint.
+
+        Returns the fingerprints of the requested fields and the dedupe stats
+        (unique field specs, fields generated).
+        """
+        # Completed fields are appended to a JSONL checkpoint as they finish. A
+        # rerun (e.g. a Prefect retry) resumes from it, skipping fields whose
+        # checkpointed record matches the current rule fingerprint.
+        context = fingerprints.generation_context(self.config)
+        field_fingerprints = {name: fingerprints.fingerprint_field(details, context) for name, _, details in fields}
+        if self.config.get("resume", True):
+            completed = {
+                name for name, (fingerprint, _) in checkpoint.index_checkpoint(checkpoint_file).items()
+                if field_fingerprints.get(name) == fingerprint
+            }
+            if completed:
+                logging.info(f"Resuming from {checkpoint_file}: {len(completed)} fields already generated")
+        else:
+            completed = set()
+            if os.path.exists(checkpoint_file):
+                os.remove(checkpoint_file)
+        pending_fields = [field for field in fields if field[0] not in completed]
+        total_fields = len(pending_fields)
+
+        # Fields are independent, so they can be generated in parallel. A
+        # max_concurrency of 1 keeps the original one-at-a-time behaviour.
+        max_concurrency = max(1, int(self.config.get("max_concurrency", 1)))
+        logging.info(f"Generating test cases for {total_fields} fields with max_concurrency={max_concurrency}")
+
+        # Identical field specs under different parents are generated once
+        unique_fields, duplicates = self._plan_unique_fields(pending_fields)
+        if len(unique_fields) < total_fields:
+            logging.info(f"Deduplicated {total_fields} fields to {len(unique_fields)} unique field specs")
+
+        batches = self._plan_batches(unique_fields)
+        if len(batches) < len(unique_fields):
+            logging.info(f"Batching {len(unique_fields)} fields into {len(batches)} requests")
+
+        processed_fields = 0
+        with checkpoint.CheckpointWriter(checkpoint_file, self.config.get("checkpoint_fsync_every", 10)) as writer, \
+                ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            futures = {executor.submit(self.generate_batch_test_cases, batch, llm_client): batch for batch in batches}
+
+            for future in as_completed(futures):
+                try:
+                    batch_results = future.result()
+                except Exception as e:
+                    logging.error(f"Failed to generate test cases for {', '.join(field[0] for field in futures[future])}: {str(e)}")
+                    processed_fields += sum(len(duplicates[field[0]]) for field in futures[future])
+                    continue
+                for representative, _, _ in futures[future]:
+                    test_cases = batch_results.get(representative)
+                    # Copy the validated cases to every field sharing the signature
+                    for full_field_name in duplicates[representative]:
+                        processed_fields += 1
+                        logging.info(f"Processed field {processed_fields}/{total_fields}: {full_field_name}")
+                        if test_cases:
+                            writer.append(full_field_name, field_fingerprints[full_field_name], test_cases)
+
+        return field_fingerprints, (len(unique_fields), total_fields)
+
+    def _iter_results(self, all_fields: List[Tuple[str, str, Dict[str, Any]]], field_fingerprints: Dict[str, str],
+                      existing_test_cases: Dict[str, List[Dict[str, Any]]], checkpoint_file: str):
+        """
+        Yield (field, test cases) in rules order (deterministic regardless of
+        completion order), streaming each generated field's cases from the
+        checkpoint and taking the others from existing_test_cases.
+        """
+        index = checkpoint.index_checkpoint(checkpoint_file)
+        with open(checkpoint_file, "rb") as checkpoint_reader:
+            for full_field_name, _, _ in all_fields:
+                if full_field_name in field_fingerprints:
+                    fingerprint, offset = index.get(full_field_name, (None, None))
+                    if fingerprint == field_fingerprints[full_field_name]:
+                        yield full_field_name, checkpoint.read_record(checkpoint_reader, offset)
+                elif existing_test_cases.get(full_field_name):
+                    yield full_field_name, existing_test_cases[full_field_name]
+
+    def generate_test_cases(self, rules_file: str, output_file: str, llm_client, only_fields: Optional[Set[str]] = None) -> None: #added llm client
+        """
+        Main method to generate and save test cases.
+
+        If `only_fields` is given, only those 'parent.field' entries are sent to
+        the LLM; every other field keeps its test cases from the existing output.
+        """
         try:
-            # Create backup of existing file if it exists
-            if os.path.exists(output_file):
-                backup_file = f"{output_file}.{datetime.now().strftime('%Y%m%d_%H%M%S')}.bak"
-                os.rename(output_file, backup_file)
-                logging.info(f"Created backup: {backup_file}")
+            # Load rules
+            with open(rules_file, "r") as f:
+                rules = json.load(f)
+
+            all_fields = self._flatten_fields(rules)
+            existing_test_cases = {}
+            fields = all_fields
+            if only_fields is not None:
+                existing_test_cases = load_existing_test_cases(output_file)
+                fields = [field for field in all_fields if field[0] in only_fields]
+                logging.info(f"Incremental generation: {len(fields)} of {len(all_fields)} fields need new test cases")
+
+            checkpoint_file = self.config.get("checkpoint_file") or f"{output_file}.checkpoint.jsonl"
+            field_fingerprints, dedupe_stats = self._generate_into_checkpoint(fields, llm_client, checkpoint_file)
 
-            # Save new test cases
-            with open(output_file, "w") as f:
-                json.dump(test_cases, f, indent=2)
-            logging.info(f"Successfully saved test cases to {output_file}")
+            # Save results
+            saved_fields, saved_test_cases = self._save_test_cases(
+                self._iter_results(all_fields, field_fingerprints, existing_test_cases, checkpoint_file), output_file
+            )
+            os.remove(checkpoint_file)
+            
+            # Generate summary
+            self.generate_summary(saved_fields, saved_test_cases, output_file, dedupe_stats=dedupe_stats)
 
         except Exception as e:
-            logging.error(f"Failed to save test cases: {str(e)}")
+            logging.error(f"Failed to generate test cases: {str(e)}")
             raise
 
-    def _generate_summary(self, test_cases: Dict[str, List[Dict[str, Any]]], output_file: str) -> None:
+    def plan_generation(self, rules: dict, only_fields: Optional[Set[str]] = None) -> Tuple[List[List[Tuple[str, str, Dict[str, Any]]]], Dict[str, List[str]]]:
+        """
+        Split the generation work for `rules` into independent batches.
+
+        Returns the batches (each generated by one generate_batch_test_cases
+        call, e.g. one Prefect task) and the dedupe mapping that
+        merge_batch_results needs to fan results back out.
+        """
+        fields = self._flatten_fields(rules)
+        if only_fields is not None:
+            fields = [field for field in fields if field[0] in only_fields]
+        unique_fields, duplicates = self._plan_unique_fields(fields)
+        batches = self._plan_batches(unique_fields)
+        logging.info(f"Planned {len(batches)} generation batches for {len(unique_fields)} unique of {len(fields)} fields")
+        return batches, duplicates
+
+    def merge_batch_results(self, rules: dict, batch_results: Iterable[Dict[str, Optional[List[Dict[str, Any]]]]],
+                            duplicates: Dict[str, List[str]], only_fields: Optional[Set[str]] = None,
+                            existing_test_cases: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Reduce per-batch results into {field: test cases} in rules order.
+
+        Each representative's cases are copied to every field sharing its
+        signature; fields outside `only_fields` come from existing_test_cases.
+        """
+        generated = {}
+        for results in batch_results:
+            for representative, test_cases in results.items():
+                if test_cases:
+                    for full_field_name in duplicates.get(representative, [representative]):
+                        generated[full_field_name] = test_cases
+
+        test_cases = {}
+        existing_test_cases = existing_test_cases or {}
+        for full_field_name, _, _ in self._flatten_fields(rules):
+            if only_fields is None or full_field_name in only_fields:
+                if full_field_name in generated:
+                    test_cases[full_field_name] = generated[full_field_name]
+            elif existing_test_cases.get(full_field_name):
+                test_cases[full_field_name] = existing_test_cases[full_field_name]
+        return test_cases
+
+    def _save_test_cases(self, entries: Iterable[Tuple[str, List[Dict[str, Any]]]], output_file: str) -> Tuple[int, int]:
+        """Save (field, test cases) entries with backup; returns (fields, test cases) written."""
+        return save_test_cases(entries, output_file)
+
+    def generate_summary(self, total_fields: int, total_test_cases: int, output_file: str,
+                         dedupe_stats: Optional[Tuple[int, int]] = None) -> None:
         """Generate a summary of the test case generation."""
-        total_fields = len(test_cases)
-        total_test_cases = sum(len(cases) for cases in test_cases.values())
-        
         summary = (
             f"\nTest Case Generation Summary\n"
             f"{'='*30}\n"
             f"Total fields processed: {total_fields}\n"
             f"Total test cases generated: {total_test_cases}\n"
-            f"Average test cases per field: {total_test_cases/total_fields:.2f}\n"
+            f"Average test cases per field: {total_test_cases/max(total_fields, 1):.2f}\n"
             f"Output file: {output_file}\n"
-            f"{'='*30}"
         )
+        if dedupe_stats and dedupe_stats[1]:
+            unique_fields, generated_fields = dedupe_stats
+            summary += (
+                f"Unique field specs generated: {unique_fields}/{generated_fields} "
+                f"(dedupe ratio {generated_fields/max(unique_fields, 1):.2f}x)\n"
+            )
+        cache = llm_cache.get_cache()
+        if cache is not None:
+            stats = cache.stats()
+            summary += (
+                f"LLM cache: {stats['hits']} hits, {stats['misses']} misses "
+                f"({stats['hit_rate']:.0%} hit rate, {stats['entries']} entries)\n"
+            )
+        summary += f"{'='*30}"
         
         logging.info(summary)
 
-def main(config):
+@profiler.timed("io.save_test_cases")
+def save_test_cases(entries: Iterable[Tuple[str, List[Dict[str, Any]]]], output_file: str) -> Tuple[int, int]:
+    """Save (field, test cases) entries with backup; returns (fields, test cases) written."""
+    try:
+        # Create backup of existing file if it exists
+        if os.path.exists(output_file):
+            backup_file = f"{output_file}.{datetime.now().strftime('%Y%m%d_%H%M%S')}.bak"
+            os.rename(output_file, backup_file)
+            logging.info(f"Created backup: {backup_file}")
+
+        total_test_cases = 0
+
+        def counted(entries):
+            nonlocal total_test_cases
+            for field_name, cases in entries:
+                total_test_cases += len(cases)
+                yield field_name, cases
+
+        # Save new test cases
+        total_fields = checkpoint.write_json_object_streaming(output_file, counted(entries))
+        logging.info(f"Successfully saved test cases to {output_file}")
+        return total_fields, total_test_cases
+
+    except Exception as e:
+        logging.error(f"Failed to save test cases: {str(e)}")
+        raise
+
+def load_existing_test_cases(output_file: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Load previously generated test cases to merge unchanged fields into."""
+    if not os.path.exists(output_file):
+        return {}
+    try:
+        with open(output_file, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        logging.warning(f"Could not load existing test cases from {output_file}: {str(e)}")
+        return {}
+
+def main(config, only_fields=None, llm_client=None):
     try:
-        generator = TestCaseGenerator()
-        llm_client = llm.initialize_llm(config)
+        generator = TestCaseGenerator(config=config)
+        if llm_client is None:
+            llm_client = llm.initialize_llm(config)
         generator.generate_test_cases(
             generator.config["constrains_processed_rules_file"],
             generator.config["generated_test_cases_file"],
-            llm_client
+            llm_client,
+            only_fields=only_fields
         )
     except Exception as e:
         logging.error(f"Application failed: {str(e)}")
@@ -0,0 +1,219 @@
+# src/json_stream.py
+import json
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+class MalformedStreamError(ValueError):
+    """Raised when a streamed response clearly isn't the expected JSON array."""
+
+
+# An escaped backslash, a valid JSON escape, or a stray backslash (last alternative)
+_ESCAPE_PATTERN = re.compile(r'\\\\|\\["/bfnrt]|\\u[0-9a-fA-F]{4}|\\')
+
+
+def fix_invalid_escapes(text: str) -> str:
+    """Double every backslash that doesn't start a valid JSON escape.
+
+    Valid escapes (including escaped backslashes) are left alone, so the fix
+    is safe to apply more than once.
+    """
+    return _ESCAPE_PATTERN.sub(lambda m: m.group(0) if len(m.group(0)) > 1 else "\\\\", text)
+
+
+class JsonArrayStreamParser:
+    """
+    Incrementally extracts the objects of a JSON array as text arrives.
+
+    feed() returns every object whose closing brace arrived in that chunk, so
+    callers can act on each test case without waiting for the whole response.
+    Leading whitespace, a Markdown ```json fence and a {"<wrapper_key>":
+    object wrapper (structured output) are tolerated; anything else before
+    the opening '[' (or a non-object array element) raises
+    MalformedStreamError so the caller can abort the stream early.
+
+    With tolerant=True nothing raises: text before the first '[' (such as a
+    {"test_cases": wrapper) and non-object elements are skipped, and objects
+    that fail to decode are collected in `broken` instead.
+    """
+
+    def __init__(self, tolerant: bool = False, wrapper_key: Optional[str] = "test_cases"):
+        self.tolerant = tolerant
+        self._wrapper = '{"%s":' % wrapper_key if wrapper_key else None
+        self.broken = []
+        self.started = False
+        self.finished = False
+        self.objects_parsed = 0
+        self._prefix = ""
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._current = []
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        completed = []
+        for char in chunk:
+            if self.finished:
+                break
+            if not self.started:
+                self._consume_prefix(char)
+                continue
+
+            if self._depth >= 2 or (self._depth == 1 and char == "{"):
+                self._current.append(char)
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                if self._depth == 1 and not self.tolerant:
+                    raise MalformedStreamError("Array element is not an object")
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 1 and char == "[" and not self.tolerant:
+                    raise MalformedStreamError("Array element is not an object")
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1 and char == "}":
+                    obj = self._decode_current()
+                    if obj is not None:
+                        completed.append(obj)
+                elif self._depth == 1:
+                    # End of a nested array element (tolerant mode only); discard it
+                    self._current = []
+                elif self._depth == 0:
+                    self.finished = True
+            elif self._depth == 1 and not (char.isspace() or char == ",") and not self.tolerant:
+                raise MalformedStreamError(f"Unexpected {char!r} between array elements")
+        return completed
+
+    @property
+    def partial(self) -> str:
+        """Text of an object that was still open when the input ended (e.g. truncated output)."""
+        return "".join(self._current)
+
+    def _consume_prefix(self, char: str) -> None:
+        if char == "[":
+            self.started = True
+            self._depth = 1
+            return
+        if self.tolerant:
+            return
+        self._prefix += char
+        stripped = self._prefix.strip()
+        compact = "".join(stripped.split())
+        if self._wrapper and self._wrapper.startswith(compact):
+            return
+        if stripped and not ("```json".startswith(stripped) or stripped.startswith("```json")
+                             or "```".startswith(stripped)):
+            raise MalformedStreamError(f"Response does not start with a JSON array: {stripped[:40]!r}")
+
+    def _decode_current(self) -> Optional[Dict[str, Any]]:
+        text = "".join(self._current)
+        self._current = []
+        self.objects_parsed += 1
+        try:
+            return json.loads(fix_invalid_escapes(text))
+        except json.JSONDecodeError as e:
+            if not self.tolerant:
+                raise MalformedStreamError(f"Invalid test case object: {e}")
+            self.broken.append(text)
+            return None
+
+
+def salvage_objects(text: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Recover every well-formed object from a possibly broken JSON array.
+
+    Returns (objects, broken) where broken holds the raw text of objects that
+    could not be decoded, plus any object cut off at the end of the text.
+    """
+    parser = JsonArrayStreamParser(tolerant=True)
+    objects = parser.feed(text)
+    broken = list(parser.broken)
+    if not parser.finished and parser.partial.strip():
+        broken.append(parser.partial)
+    return objects, broken
+
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+
+def iter_json_object(f, chunk_size: int = 1 << 20) -> Iterator[Tuple[str, Any]]:
+    """
+    Yield the (key, value) pairs of a top-level JSON object read from a text file.
+
+    Only the value being decoded (plus one read chunk) is held in memory, so a
+    large {"field": [cases], ...} file can be processed one field at a time.
+    """
+    buffer = ""
+    pos = 0
+    eof = False
+
+    def fill(size: int = chunk_size) -> bool:
+        nonlocal buffer, pos, eof
+        chunk = f.read(size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    def skip(allowed: str) -> str:
+        """Skip whitespace and return the next significant character (consumed if in `allowed`)."""
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buffer):
+                char = buffer[pos]
+                if char in allowed:
+                    pos += 1
+                return char
+            if not fill():
+                raise ValueError("Unexpected end of JSON object")
+
+    def decode() -> Any:
+        nonlocal pos
+        # Read ever larger chunks so a big value isn't re-scanned once per chunk
+        size = chunk_size
+        while True:
+            try:
+                value, end = _decoder.raw_decode(buffer, pos)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(buffer) or eof:
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            if not fill(size):
+                value, pos = _decoder.raw_decode(buffer, pos)
+                return value
+            size *= 2
+
+    if skip("{") != "{":
+        raise ValueError("Expected a JSON object")
+    if skip("}") == "}":
+        return
+    while True:
+        skip("")
+        key = decode()
+        if skip(":") != ":":
+            raise ValueError(f"Expected ':' after key {key!r}")
+        skip("")
+        yield key, decode()
+        separator = skip(",}")
+        if separator == "}":
+            return
+        if separator != ",":
+            raise ValueError(f"Expected ',' or '}}' after value of {key!r}")
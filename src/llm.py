@@ -1,91 +1,547 @@
 # src/llm.py
-import google.generativeai as genai
+import contextvars
+import itertools
 import logging
-import openai
-from azure.identity import DefaultAzureCredential
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from src import llm_backends, llm_cache, profiler, rate_limiter, telemetry
+
+# Process-wide client registry: enrichment, generation and every Prefect task
+# in the same process share one backend (and its connection pool) per config.
+_clients = {}
+_clients_lock = threading.Lock()
+
+# time.monotonic() by which the current run must finish; see start_run_deadline()
+_run_deadline = None
+
+# How long HedgedBackend waits for its legs when request_timeout_seconds is not
+# set; the same as the openai SDK's default request timeout
+DEFAULT_REQUEST_TIMEOUT = 600.0
+
+
+class RunDeadlineExceeded(TimeoutError):
+    """The run's run_deadline_seconds budget ran out before an LLM call could finish."""
+
+
+def start_run_deadline(config):
+    """Starts the whole-run deadline (run_deadline_seconds); called at the start of app.run and the flow.
+
+    Once it passes, new LLM attempts fail with RunDeadlineExceeded instead of
+    being sent, so a run stalled on a slow provider ends with partial results.
+    """
+    global _run_deadline
+    seconds = config.get("run_deadline_seconds")
+    _run_deadline = time.monotonic() + seconds if seconds else None
+
+
+def _remaining_deadline():
+    """Seconds left before the run deadline, or None when there is none."""
+    if _run_deadline is None:
+        return None
+    return _run_deadline - time.monotonic()
+
+
+def run_deadline_passed():
+    """True once the run deadline started by start_run_deadline() has passed."""
+    remaining = _remaining_deadline()
+    return remaining is not None and remaining <= 0
+
+
+def _check_deadline():
+    if run_deadline_passed():
+        raise RunDeadlineExceeded("Run deadline exceeded; not sending further LLM requests")
+
+
+class PoolMember:
+    """One deployment, endpoint or key in an llm_pool, with its own rate limiter and health."""
+
+    def __init__(self, name, backend, limiter, weight=1.0):
+        self.name = name
+        self.backend = backend
+        self.limiter = limiter
+        self.weight = weight
+        self.outstanding = 0
+        self.failures = 0
+        self.unhealthy_until = 0.0
+        self.ejected = False
+
+
+class PooledBackend(llm_backends.LLMBackend):
+    """
+    Spreads requests over a pool of backends (llm_pool.members), each with
+    its own quota, so throughput grows with the number of quota buckets.
+
+    Each request goes to the healthy member with the fewest outstanding
+    requests per unit of weight. A 429 or 5xx fails over to the next member
+    instead of retrying the same one; a member that fails unhealthy_after
+    times in a row is left out for readmit_after_seconds and then readmitted
+    on probation (one more failure ejects it again). Only when every member
+    has failed does the error reach the shared limiter, which backs off.
+
+    The pool reports the first member's provider and model, so cached
+    responses are shared by every member.
+    """
+
+    def __init__(self, config, members, unhealthy_after=3, readmit_after_seconds=30.0):
+        super().__init__(config)
+        self.members = members
+        self.unhealthy_after = unhealthy_after
+        self.readmit_after_seconds = readmit_after_seconds
+        self.provider = members[0].backend.provider
+        self.model = members[0].backend.model
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        settings = config["llm_pool"]
+        members = []
+        for index, overrides in enumerate(settings["members"]):
+            overrides = dict(overrides)
+            name = overrides.pop("name", None) or overrides.get("deployment_name") or f"member-{index + 1}"
+            weight = float(overrides.pop("weight", 1.0))
+            # Members inherit the top-level settings; their quotas come only from their own rate_limit
+            member_config = {**config, **overrides, "rate_limit": overrides.get("rate_limit") or {}}
+            member_config.pop("llm_pool", None)
+            limiter = rate_limiter.RateLimiter.from_config(member_config)
+            # Failures fail over to another member (see _call), not retried here
+            limiter.max_retries = 0
+            members.append(PoolMember(name, _get_backend(member_config), limiter, weight))
+        if not members:
+            raise ValueError("llm_pool.members must list at least one deployment or key")
+        return cls(config, members, unhealthy_after=settings.get("unhealthy_after", 3),
+                   readmit_after_seconds=settings.get("readmit_after_seconds", 30.0))
+
+    def _select(self, exclude):
+        """Weighted least-outstanding choice among healthy members not in `exclude`."""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [member for member in self.members if member not in exclude]
+            healthy = [member for member in candidates if member.unhealthy_until <= now]
+            if not healthy:
+                # Everything is resting: use whichever member is readmitted first
+                return min(candidates, key=lambda member: member.unhealthy_until)
+            best = min((member.outstanding + 1) / member.weight for member in healthy)
+            return random.choice([member for member in healthy
+                                  if (member.outstanding + 1) / member.weight == best])
+
+    def _record_failure(self, member, error):
+        now = time.monotonic()
+        with self._lock:
+            member.failures += 1
+            retry_after = rate_limiter.get_retry_after(error)
+            if retry_after:
+                member.unhealthy_until = max(member.unhealthy_until, now + retry_after)
+            if member.failures >= self.unhealthy_after:
+                member.unhealthy_until = max(member.unhealthy_until, now + self.readmit_after_seconds)
+                if not member.ejected:
+                    member.ejected = True
+                    logging.warning(f"LLM pool member {member.name} marked unhealthy after {member.failures} "
+                                    f"failures; readmitting in {self.readmit_after_seconds:.0f}s")
+
+    def _record_success(self, member):
+        with self._lock:
+            member.failures = 0
+            if member.ejected:
+                member.ejected = False
+                logging.info(f"LLM pool member {member.name} is healthy again")
+
+    def _call(self, fn, estimated_tokens):
+        """Run fn(member) on the best member, failing over to the others on 429s and 5xx."""
+        tried = []
+        while True:
+            member = self._select(tried)
+            tried.append(member)
+            with self._lock:
+                member.outstanding += 1
+            try:
+                result = member.limiter.call(lambda: fn(member), estimated_tokens=estimated_tokens)
+            except Exception as e:
+                if not (rate_limiter.is_rate_limit_error(e) or rate_limiter.is_transient_error(e)):
+                    raise
+                self._record_failure(member, e)
+                if len(tried) == len(self.members):
+                    raise
+                logging.info(f"LLM pool member {member.name} failed ({e}); trying another member")
+                continue
+            finally:
+                with self._lock:
+                    member.outstanding -= 1
+            self._record_success(member)
+            return result
+
+    def generate(self, prompt, max_output_tokens, json_mode=False):
+        return self._call(lambda member: member.backend.generate(prompt, max_output_tokens, json_mode),
+                          rate_limiter.estimate_tokens(prompt, max_output_tokens))
+
+    def stream(self, prompt, max_output_tokens, json_mode=False):
+        def open_stream(member):
+            # Fetch the first chunk inside _call, so 429s on opening fail over too
+            iterator = member.backend.stream(prompt, max_output_tokens, json_mode)
+            first_chunk = next(iterator, None)
+            return itertools.chain([first_chunk] if first_chunk else [], iterator)
+
+        yield from self._call(open_stream, rate_limiter.estimate_tokens(prompt, max_output_tokens))
+
+    def stats(self):
+        """Per-member outstanding requests, consecutive failures and health."""
+        now = time.monotonic()
+        with self._lock:
+            return [{"member": member.name, "weight": member.weight, "outstanding": member.outstanding,
+                     "failures": member.failures, "healthy": member.unhealthy_until <= now}
+                    for member in self.members]
+
+
+class HedgePolicy:
+    """
+    Decides when a request is slow enough to hedge.
+
+    Keeps a window of recent primary latencies; a request still running after
+    their `percentile` (at least min_delay seconds) is hedged, as long as
+    hedges stay under max_hedge_ratio of all requests, so the extra cost is
+    bounded by that ratio rather than doubling.
+    """
+
+    def __init__(self, percentile=0.95, min_delay=2.0, min_samples=20, max_hedge_ratio=0.1, window=500):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.max_hedge_ratio = max_hedge_ratio
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.hedges = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, settings):
+        return cls(
+            percentile=settings.get("percentile", 0.95),
+            min_delay=settings.get("min_delay", 2.0),
+            min_samples=settings.get("min_samples", 20),
+            max_hedge_ratio=settings.get("max_hedge_ratio", 0.1),
+        )
+
+    def record(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def delay(self):
+        """Seconds to wait for the primary before hedging, or None while there are too few samples."""
+        with self._lock:
+            self.requests += 1
+            if not self.latencies or len(self.latencies) < self.min_samples:
+                return None
+            ordered = sorted(self.latencies)
+        return max(self.min_delay, ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))])
+
+    def try_hedge(self):
+        """Reserve a hedge if the budget allows it."""
+        with self._lock:
+            if self.hedges + 1 > self.max_hedge_ratio * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+
+class HedgedBackend(llm_backends.LLMBackend):
+    """
+    Wraps a primary backend and sends a hedge request to a secondary backend
+    (another deployment, region or provider; by default the same one) when the
+    primary is slower than HedgePolicy allows. The first non-empty response
+    wins and the other leg is cancelled: a hedge that has not been sent yet is
+    dropped, one in flight is abandoned and bounded by request_timeout_seconds.
+
+    The hedge runs on the limiter slot its parent call already holds, so it
+    never waits for a second one: it only takes request/token quota, and is
+    skipped when none is available right now. The legs run on daemon threads
+    so an abandoned one never holds up interpreter exit.
+
+    The wrapper reports the primary's provider and model, so cache keys do not
+    change with hedging. Streams are not hedged.
+    """
+
+    def __init__(self, config, primary, secondary, policy):
+        super().__init__(config)
+        self.primary = primary
+        self.secondary = secondary
+        self.policy = policy
+        self.provider = primary.provider
+        self.model = primary.model
+
+    def _primary_leg(self, prompt, max_output_tokens, json_mode):
+        started_at = time.perf_counter()
+        response_text = self.primary.generate(prompt, max_output_tokens, json_mode)
+        self.policy.record(time.perf_counter() - started_at)
+        return response_text
+
+    def _hedge_leg(self, prompt, max_output_tokens, json_mode, cancelled):
+        if cancelled.is_set():
+            return None
+        _check_deadline()
+        telemetry.mark_hedged()
+        return self.secondary.generate(prompt, max_output_tokens, json_mode)
+
+    def _submit(self, fn, *args):
+        """Run fn(*args) on a daemon thread, in this call's context so telemetry attributes it to the same call."""
+        future = Future()
+        context = contextvars.copy_context()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(context.run(fn, *args))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name="llm-hedge", daemon=True).start()
+        return future
+
+    def generate(self, prompt, max_output_tokens, json_mode=False):
+        primary = self._submit(self._primary_leg, prompt, max_output_tokens, json_mode)
+        pending = {primary}
+        cancelled = threading.Event()
+        delay = self.policy.delay()
+        # The legs are bounded by the request timeout even if the SDK fails to enforce it
+        timeout_at = time.monotonic() + (self.timeout or DEFAULT_REQUEST_TIMEOUT)
+        try:
+            if delay is not None:
+                done, _ = wait(pending, timeout=self._wait_timeout(timeout_at, delay))
+                if not done and self.policy.try_hedge():
+                    if rate_limiter.get_limiter().try_reserve(rate_limiter.estimate_tokens(prompt, max_output_tokens)):
+                        logging.info(f"Primary LLM request still running after {delay:.1f}s; sending a hedge request")
+                        pending.add(self._submit(self._hedge_leg, prompt, max_output_tokens, json_mode, cancelled))
+                    else:
+                        logging.info("No LLM quota available right now; not hedging the slow request")
+
+            first_error = None
+            response_text = None
+            while pending:
+                done, pending = wait(pending, timeout=self._wait_timeout(timeout_at), return_when=FIRST_COMPLETED)
+                if not done:
+                    remaining = _remaining_deadline()
+                    if remaining is not None and remaining <= 0:
+                        raise RunDeadlineExceeded("Run deadline exceeded while waiting for an LLM response")
+                    raise TimeoutError(f"LLM request did not finish within {self.timeout or DEFAULT_REQUEST_TIMEOUT}s")
+                for future in done:
+                    try:
+                        response_text = future.result()
+                    except Exception as e:
+                        first_error = first_error or e
+                        continue
+                    if response_text:
+                        return response_text
+            if first_error is not None and not response_text:
+                raise first_error
+            return response_text
+        finally:
+            cancelled.set()
+            for future in pending:
+                future.cancel()
+
+    @staticmethod
+    def _wait_timeout(timeout_at, limit=None):
+        """Seconds to wait: up to `limit`, the request timeout and the run deadline, whichever comes first."""
+        timeout = timeout_at - time.monotonic()
+        remaining = _remaining_deadline()
+        if remaining is not None:
+            timeout = min(timeout, remaining)
+        if limit is not None:
+            timeout = min(timeout, limit)
+        return max(0.0, timeout)
+
+    def stream(self, prompt, max_output_tokens, json_mode=False):
+        return self.primary.stream(prompt, max_output_tokens, json_mode)
+
+
+def _client_key(config):
+    """Registry key: the API in use plus every setting that shapes its client."""
+    api_use = config.get("api_use", "Gemini").lower()
+    return (api_use,) + llm_backends.get_backend_class(api_use).client_key(config)
 
 
 def initialize_llm(config):
-    """Initializes the LLM client based on the configuration."""
-    api_use = config.get("api_use", "Gemini")  # Default to Gemini if not specified
+    """Initializes the LLM backend based on the configuration.
+
+    The backend is looked up by `api_use` in the llm_backends registry, and
+    only its provider SDK is imported. Backends are cached per configuration,
+    so repeated calls (e.g. from the Prefect task and then
+    generate_test_cases.main) return the same one. With hedging enabled the
+    backend is wrapped in a HedgedBackend (see HedgePolicy), and with an
+    llm_pool the requests are spread over its members (see PooledBackend).
+    """
+    # Every caller that goes through initialize_llm shares the same limiter
+    rate_limiter.configure(config)
+    llm_cache.configure(config)
+    telemetry.configure(config)
 
     try:
-        if api_use.lower() == "gemini":
-            return _initialize_gemini(config)
-        elif api_use.lower() == "openai":
-            return _initialize_openai(config)
-        else:
-            raise ValueError(f"Unsupported API specified: {api_use}.  Must be 'Gemini' or 'OpenAI'.")
+        client = _get_pool_or_backend(config)
+        hedging = config.get("hedging") or {}
+        if not hedging.get("enabled", False):
+            return client
+
+        # Hedge requests go to the same backend (or pool) unless `secondary` overrides some settings
+        secondary = _get_pool_or_backend({**config, **(hedging.get("secondary") or {})})
+        key = ("hedged", _client_key(config), repr(hedging))
+        with _clients_lock:
+            if key not in _clients:
+                _clients[key] = HedgedBackend(config, client, secondary, HedgePolicy.from_config(hedging))
+            return _clients[key]
     except Exception as e:
         logging.error(f"Failed to initialize LLM: {str(e)}")
         raise
 
 
-def _initialize_gemini(config):
-    """Initializes the Gemini client."""
-    try:
-        if not config.get("gemini_api_key"):
-            raise ValueError("Gemini API key not found in config")
+def _get_backend(config):
+    """The cached backend for `config`, created on first use."""
+    key = _client_key(config)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = llm_backends.get_backend_class(config.get("api_use", "Gemini"))(config)
+        return _clients[key]
+
+
+def _get_pool_or_backend(config):
+    """A PooledBackend when llm_pool lists members, otherwise the single configured backend."""
+    if not (config.get("llm_pool") or {}).get("members"):
+        return _get_backend(config)
+    key = ("pool", _client_key(config), repr(config["llm_pool"]))
+    with _clients_lock:
+        pool = _clients.get(key)
+    if pool is None:
+        # Built outside the lock: the members are registered through _get_backend
+        pool = PooledBackend.from_config(config)
+        with _clients_lock:
+            pool = _clients.setdefault(key, pool)
+    return pool
+
+
+def close_clients():
+    """Closes and forgets every cached backend (e.g. at the end of a run)."""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
 
-        genai.configure(api_key=config["gemini_api_key"])
-        model_name = config.get("gemini_model", "gemini-1.5-flash")
-        return genai.GenerativeModel(model_name)
-    except Exception as e:
-        logging.error(f"Failed to initialize Gemini: {str(e)}")
-        raise
 
+@profiler.timed("llm.request")
+def _call_llm(llm_client, prompt, max_output_tokens, json_mode=False):
+    """Sends a single request to the LLM backend and returns the response text.
+
+    json_mode asks the provider for JSON output: Gemini's JSON MIME type, or an
+    Azure OpenAI response_format (see AzureOpenAIBackend.response_format).
+    """
+    _check_deadline()
+    return llm_client.generate(prompt, max_output_tokens, json_mode)
+
+
+@profiler.timed("llm.open_stream")
+def _open_stream(llm_client, prompt, max_output_tokens, json_mode=False):
+    """Starts a streaming request and returns an iterator over response text chunks.
+
+    The first chunk is fetched before returning so that connection errors and
+    429s surface here, inside the rate limiter's retry loop.
+    """
+    _check_deadline()
+    iterator = llm_client.stream(prompt, max_output_tokens, json_mode)
+    first_chunk = next(iterator, None)
+    return itertools.chain([first_chunk] if first_chunk else [], iterator)
+
+
+def _client_identity(llm_client):
+    """Returns (provider, model) for the backend, used to key cached responses."""
+    return llm_client.provider, llm_client.model
+
+
+def generate_test_cases_with_llm(llm_client, prompt, max_output_tokens=1000, use_cache=True, json_mode=False):
+    """Generates test cases using the appropriate LLM client.
+
+    Responses are served from the on-disk cache when possible. Pass
+    use_cache=False to skip the lookup (e.g. when retrying after a response
+    failed validation); the fresh response still replaces the cached one.
+    Uncached calls go through the shared rate limiter, so 429s are retried
+    with backoff here instead of surfacing to the caller. json_mode requests
+    the provider's JSON/structured output mode (see _call_llm).
+    Every call is recorded by src/telemetry.py under the current scope.
+    """
+    provider, model = _client_identity(llm_client)
+    call = telemetry.LLMCall(provider, model, prompt)
+    cache = llm_cache.get_cache()
+    cache_key = None
+    cache_state = "off"
+    if cache is not None:
+        cache_key = cache.make_key(provider, model, prompt, max_output_tokens,
+                                   {"json_mode": True} if json_mode else None)
+        cache_state = "miss" if use_cache else "skipped"
+        if use_cache:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                call.finish(cached, cache="hit")
+                return cached
 
-def _initialize_openai(config):
-    """Initializes the OpenAI client."""
     try:
-        # Get Azure credentials
-        default_credential = DefaultAzureCredential()
-        access_token = default_credential.get_token("https://cognitiveservices.azure.com/.default")
-
-        if not access_token:
-            raise ValueError("Failed to obtain Azure access token")
-
-        # Initialize OpenAI client with Azure configuration
-        return openai.AzureOpenAI(
-            api_version=config.get("openai_api_version", "2024-06-01"),
-            azure_endpoint=config.get("azure_openai_endpoint",
-                                      "https://prod-1.services.unitedaistudio.uhg.com/aoai-shared-openai-prod-1"),
-            api_key=access_token.token,
-            azure_deployment=config.get("deployment_name", "gpt-4o_2024-05-13"),
-            default_headers={
-                "projectId": config.get("project_id", "0bef8880-4e98-413c-bc0b-41c280fd1b2a")
-            }
+        response_text = rate_limiter.get_limiter().call(
+            call.attempt(lambda: _call_llm(llm_client, prompt, max_output_tokens, json_mode)),
+            estimated_tokens=rate_limiter.estimate_tokens(prompt, max_output_tokens)
         )
     except Exception as e:
-        logging.error(f"Failed to initialize OpenAI client: {str(e)}")
-        raise
+        logging.error(f"Exception in generate_test_cases_with_llm: {e}")
+        call.finish(None, cache=cache_state, error=e)
+        return None
 
+    call.finish(response_text, cache=cache_state)
+    if cache is not None and response_text:
+        cache.put(cache_key, response_text, provider, model)
+    return response_text
 
-def generate_test_cases_with_llm(llm_client, prompt, max_output_tokens=1000):
-    """Generates test cases using the appropriate LLM client."""
-    try:
-        if isinstance(llm_client, genai.GenerativeModel):
-            response = llm_client.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    max_output_tokens=max_output_tokens
-                )
-            )
-            if hasattr(response, 'text'):
-                return response.text
-            else:
-                logging.error(f"Error: LLM Response missing 'text' attribute.")
-                return None
-        elif isinstance(openai.AzureOpenAI):
-            response = llm_client.chat.completions.create(
-                model=llm_client.azure_deployment,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=max_output_tokens,  # Adjust as needed
-            )
-            return response.choices[0].message.content
-        else:
-            raise ValueError("Unsupported LLM client type.")
 
+def stream_test_cases_with_llm(llm_client, prompt, max_output_tokens=1000, use_cache=True, json_mode=False):
+    """Streams the LLM response as text chunks.
+
+    json_mode works as in generate_test_cases_with_llm, and both share cache
+    entries for the same prompt and mode.
+
+    A cache hit yields the whole cached response as one chunk. Only a stream
+    that was read to the end is cached, so a caller that aborts a malformed
+    response (by closing the generator) never stores it. Errors propagate to
+    the caller, unlike generate_test_cases_with_llm.
+    """
+    provider, model = _client_identity(llm_client)
+    call = telemetry.LLMCall(provider, model, prompt, streamed=True)
+    cache = llm_cache.get_cache()
+    cache_key = None
+    cache_state = "off"
+    if cache is not None:
+        cache_key = cache.make_key(provider, model, prompt, max_output_tokens,
+                                   {"json_mode": True} if json_mode else None)
+        cache_state = "miss" if use_cache else "skipped"
+        if use_cache:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                call.finish(cached, cache="hit")
+                yield cached
+                return
+
+    parts = []
+    completed = False
+    try:
+        chunks = rate_limiter.get_limiter().call(
+            call.attempt(lambda: _open_stream(llm_client, prompt, max_output_tokens, json_mode)),
+            estimated_tokens=rate_limiter.estimate_tokens(prompt, max_output_tokens)
+        )
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        completed = True
     except Exception as e:
-        logging.error(f"Exception in generate_test_cases_with_llm: {e}")
-        return None
\ No newline at end of file
+        call.finish("".join(parts), cache=cache_state, error=e)
+        raise
+    finally:
+        # Also reached when the caller abandons the stream (closes the generator)
+        call.finish("".join(parts), cache=cache_state, error=None if completed else "abandoned")
+
+    if cache is not None and parts:
+        cache.put(cache_key, "".join(parts), provider, model)
@@ -0,0 +1,332 @@
+# src/llm_backends.py
+import logging
+import threading
+import time
+from typing import Iterator, Optional
+
+from src import telemetry
+
+AZURE_COGNITIVE_SCOPE = "https://cognitiveservices.azure.com/.default"
+
+# Structured-output schema for Azure OpenAI. Structured outputs need an object
+# at the root, so the test case array is wrapped in {"test_cases": [...]};
+# the generator's parser accepts both shapes.
+TEST_CASES_JSON_SCHEMA = {
+    "name": "test_cases",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "test_cases": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "test_case": {"type": "string"},
+                        "description": {"type": "string"},
+                        "expected_result": {"type": "string", "enum": ["Pass", "Fail"]},
+                        "input": {"anyOf": [
+                            {"type": "string"}, {"type": "number"}, {"type": "boolean"}, {"type": "null"}
+                        ]},
+                    },
+                    "required": ["test_case", "description", "expected_result", "input"],
+                    "additionalProperties": False,
+                },
+            },
+        },
+        "required": ["test_cases"],
+        "additionalProperties": False,
+    },
+}
+
+# First Azure OpenAI API version that supports json_schema response formats
+STRUCTURED_OUTPUT_API_VERSION = "2024-08-01"
+
+# api_use (lower case) -> backend class; see register_backend()
+_backends = {}
+
+
+def register_backend(api_use: str):
+    """Class decorator adding an LLMBackend to the registry under an `api_use` value."""
+    def decorator(cls):
+        _backends[api_use.lower()] = cls
+        return cls
+    return decorator
+
+
+def get_backend_class(api_use: str):
+    """The registered backend class for `api_use`; raises ValueError for unknown APIs."""
+    try:
+        return _backends[api_use.lower()]
+    except KeyError:
+        raise ValueError(f"Unsupported API specified: {api_use}.  Must be one of: "
+                         f"{', '.join(sorted(_backends))}.")
+
+
+def pool_size(config: dict) -> int:
+    """HTTP keep-alive pool size, matched to how many calls can be in flight."""
+    size = config.get("http_pool_size") or max(1, int(config.get("max_concurrency", 1)))
+    if (config.get("hedging") or {}).get("enabled") and not config.get("http_pool_size"):
+        # Hedges, and losing requests still finishing, need connections of their own
+        size *= 2
+    return size
+
+
+class LLMBackend:
+    """
+    One configured LLM client behind the interface src/llm.py calls.
+
+    Subclasses import their provider SDK in __init__, so only the selected
+    provider is ever imported.
+    """
+
+    provider = None
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.model = None
+        # Per-request timeout in seconds; a timed-out request is retried like a 5xx
+        self.timeout = config.get("request_timeout_seconds")
+
+    @staticmethod
+    def client_key(config: dict) -> tuple:
+        """Every setting that shapes the client; equal keys share one client."""
+        raise NotImplementedError
+
+    def generate(self, prompt: str, max_output_tokens: int, json_mode: bool = False) -> Optional[str]:
+        """Send one request and return the response text."""
+        raise NotImplementedError
+
+    def stream(self, prompt: str, max_output_tokens: int, json_mode: bool = False) -> Iterator[str]:
+        """Start a streaming request and return an iterator over the response text chunks."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+@register_backend("gemini")
+class GeminiBackend(LLMBackend):
+    provider = "gemini"
+
+    def __init__(self, config: dict):
+        super().__init__(config)
+        import google.generativeai as genai
+
+        if not config.get("gemini_api_key"):
+            raise ValueError("Gemini API key not found in config")
+
+        self._genai = genai
+        self.client = genai.GenerativeModel(config.get("gemini_model", "gemini-1.5-flash"))
+        self._bind_client(self._make_service_client(config))
+        self.model = self.client.model_name
+
+    @staticmethod
+    def _make_service_client(config: dict):
+        """
+        Builds a GenerativeServiceClient for this backend's key alone.
+
+        genai.configure() would set process-wide defaults, so pooled keys
+        (llm_pool) would overwrite each other; this client is never shared.
+        """
+        from google.ai import generativelanguage as glm
+        from google.api_core import gapic_v1
+        from google.generativeai import version
+
+        client_options = {"api_key": config["gemini_api_key"]}
+        transport_options = {}
+        if config.get("gemini_api_endpoint"):
+            # A proxy or the offline benchmark server; only the REST transport can be redirected
+            client_options["api_endpoint"] = config["gemini_api_endpoint"]
+            transport_options = {"transport": "rest"}
+        return glm.GenerativeServiceClient(
+            client_options=client_options,
+            client_info=gapic_v1.client_info.ClientInfo(user_agent=f"genai-py/{version.__version__}"),
+            **transport_options
+        )
+
+    def _bind_client(self, service_client) -> None:
+        # google-generativeai 0.8.6: GenerativeModel takes no client argument and
+        # lazily falls back to the process-wide default client when _client is
+        # None. Setting it is the only way to give a model its own key; revisit
+        # this when moving off the (deprecated) SDK.
+        self.client._client = service_client
+
+    @staticmethod
+    def client_key(config: dict) -> tuple:
+        return (config.get("gemini_api_key"), config.get("gemini_model", "gemini-1.5-flash"),
+                config.get("gemini_api_endpoint"), config.get("request_timeout_seconds"))
+
+    def _request_options(self) -> dict:
+        return {"request_options": {"timeout": self.timeout}} if self.timeout else {}
+
+    def generate(self, prompt, max_output_tokens, json_mode=False):
+        response = self.client.generate_content(
+            prompt,
+            generation_config=self._genai.types.GenerationConfig(
+                max_output_tokens=max_output_tokens,
+                response_mime_type="application/json" if json_mode else None
+            ),
+            **self._request_options()
+        )
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            telemetry.record_usage(usage.prompt_token_count, usage.candidates_token_count)
+        if hasattr(response, 'text'):
+            return response.text
+        logging.error(f"Error: LLM Response missing 'text' attribute.")
+        return None
+
+    def stream(self, prompt, max_output_tokens, json_mode=False):
+        response = self.client.generate_content(
+            prompt,
+            generation_config=self._genai.types.GenerationConfig(
+                max_output_tokens=max_output_tokens,
+                response_mime_type="application/json" if json_mode else None
+            ),
+            stream=True,
+            **self._request_options()
+        )
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. safety metadata) carry no content
+                continue
+            if text:
+                yield text
+
+
+class AzureTokenProvider:
+    """
+    Caches an Azure AD access token and refreshes it shortly before it expires.
+
+    The Azure OpenAI backend asks it for the token before every request, so long
+    runs never send an expired one and only pay for a fetch near expiry.
+    """
+
+    def __init__(self, credential, scope=AZURE_COGNITIVE_SCOPE, refresh_margin_seconds=300):
+        self.credential = credential
+        self.scope = scope
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self._token = None
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            if self._token is None or self._token.expires_on - time.time() < self.refresh_margin_seconds:
+                self._token = self.credential.get_token(self.scope)
+                if not self._token:
+                    raise ValueError("Failed to obtain Azure access token")
+                logging.info("Fetched Azure access token")
+            return self._token.token
+
+
+_credential = None
+
+
+def _get_credential():
+    """One DefaultAzureCredential per process, so the credential chain is resolved once."""
+    global _credential
+    if _credential is None:
+        from azure.identity import DefaultAzureCredential
+        _credential = DefaultAzureCredential()
+    return _credential
+
+
+@register_backend("openai")
+class AzureOpenAIBackend(LLMBackend):
+    provider = "openai"
+
+    def __init__(self, config: dict):
+        super().__init__(config)
+        import httpx
+        import openai
+
+        # Get Azure credentials; a static key (e.g. for the offline benchmark server) skips Azure AD
+        self.token_provider = None
+        access_token = config.get("azure_openai_api_key")
+        if not access_token:
+            self.token_provider = AzureTokenProvider(_get_credential())
+            access_token = self.token_provider()
+
+        # Keep-alive connection pool sized to the generation concurrency
+        size = pool_size(config)
+        http_client = openai.DefaultHttpxClient(
+            limits=httpx.Limits(max_connections=size, max_keepalive_connections=size)
+        )
+
+        # Initialize OpenAI client with Azure configuration
+        self.api_version = config.get("openai_api_version", "2024-06-01")
+        self.client = openai.AzureOpenAI(
+            api_version=self.api_version,
+            azure_endpoint=config.get("azure_openai_endpoint",
+                                      "https://prod-1.services.unitedaistudio.uhg.com/aoai-shared-openai-prod-1"),
+            api_key=access_token,
+            azure_deployment=config.get("deployment_name", "gpt-4o_2024-05-13"),
+            default_headers={
+                "projectId": config.get("project_id", "0bef8880-4e98-413c-bc0b-41c280fd1b2a")
+            },
+            http_client=http_client,
+            **({"timeout": self.timeout} if self.timeout else {}),
+            # 429s and 5xx are retried by the shared rate limiter, which also pauses every caller
+            max_retries=0
+        )
+        self.model = self.client._azure_deployment
+
+    @staticmethod
+    def client_key(config: dict) -> tuple:
+        return (
+            config.get("azure_openai_endpoint"),
+            config.get("azure_openai_api_key"),
+            config.get("deployment_name"),
+            config.get("openai_api_version"),
+            config.get("project_id"),
+            pool_size(config),
+            config.get("request_timeout_seconds"),
+        )
+
+    def response_format(self) -> dict:
+        """json_schema structured output where the API version supports it, plain JSON mode otherwise."""
+        if self.api_version >= STRUCTURED_OUTPUT_API_VERSION:
+            return {"type": "json_schema", "json_schema": TEST_CASES_JSON_SCHEMA}
+        return {"type": "json_object"}
+
+    def _refresh_token(self) -> None:
+        # Swap in the cached token, refreshed when it is close to expiry
+        if self.token_provider is not None:
+            self.client.api_key = self.token_provider()
+
+    def generate(self, prompt, max_output_tokens, json_mode=False):
+        self._refresh_token()
+        extra_options = {"response_format": self.response_format()} if json_mode else {}
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_output_tokens,  # Adjust as needed
+            **extra_options
+        )
+        if response.usage is not None:
+            telemetry.record_usage(response.usage.prompt_tokens, response.usage.completion_tokens)
+        return response.choices[0].message.content
+
+    def stream(self, prompt, max_output_tokens, json_mode=False):
+        self._refresh_token()
+        extra_options = {"response_format": self.response_format()} if json_mode else {}
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_output_tokens,
+            stream=True,
+            **extra_options
+        )
+        try:
+            for event in stream:
+                # Azure sends an initial event with only prompt filter results
+                if event.choices and event.choices[0].delta.content:
+                    yield event.choices[0].delta.content
+        finally:
+            stream.close()
+
+    def close(self):
+        self.client.close()
@@ -0,0 +1,180 @@
+# src/llm_cache.py
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+class ResponseCache:
+    """
+    Persistent, content-addressed cache of LLM responses backed by SQLite.
+
+    Entries are keyed by a hash of (provider, model, prompt, max_output_tokens),
+    so an unchanged prompt is answered from disk instead of the API. Entries
+    older than `max_age_days` are dropped, and the least recently used entries
+    are evicted once the stored responses exceed `max_size_mb`.
+
+    `bypass` disables reads and writes entirely; `refresh` skips reads but
+    still stores fresh responses, which rebuilds the cache in place.
+    """
+
+    def __init__(self, path: str, max_age_days: Optional[float] = None, max_size_mb: Optional[float] = None,
+                 bypass: bool = False, refresh: bool = False):
+        self.path = path
+        self.max_age_seconds = max_age_days * 86400 if max_age_days else None
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024) if max_size_mb else None
+        self.bypass = bypass
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self._puts_since_evict = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                provider TEXT,
+                model TEXT,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self._conn.commit()
+        self.evict()
+
+    @classmethod
+    def from_config(cls, config: dict) -> "ResponseCache":
+        settings = config.get("llm_cache") or {}
+        return cls(
+            path=settings.get("path", "data/cache/llm-responses.sqlite3"),
+            max_age_days=settings.get("max_age_days"),
+            max_size_mb=settings.get("max_size_mb"),
+            bypass=settings.get("bypass", False),
+            refresh=settings.get("refresh", False),
+        )
+
+    @staticmethod
+    def make_key(provider: str, model: str, prompt: str, max_output_tokens: int, options: Optional[dict] = None) -> str:
+        """Hash of the request. Request options (e.g. JSON mode) are only part of the key when set."""
+        parts = [provider, model, prompt, max_output_tokens]
+        if options:
+            parts.append(options)
+        payload = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for `key`, or None on a miss."""
+        if self.bypass:
+            return None
+        if self.refresh:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.max_age_seconds and now - row[1] > self.max_age_seconds):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str, provider: str = None, model: str = None) -> None:
+        """Store a response; runs eviction every 100 writes."""
+        if self.bypass or response is None:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, provider, model, response, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, model, response, len(response.encode("utf-8")), now, now)
+            )
+            self._conn.commit()
+            self._puts_since_evict += 1
+            evict_now = self._puts_since_evict >= 100
+        if evict_now:
+            self.evict()
+
+    def evict(self) -> None:
+        """Drop expired entries, then least recently used ones until under the size limit."""
+        with self._lock:
+            self._puts_since_evict = 0
+            if self.max_age_seconds:
+                self._conn.execute("DELETE FROM responses WHERE created_at < ?",
+                                   (time.time() - self.max_age_seconds,))
+            if self.max_size_bytes:
+                total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                if total > self.max_size_bytes:
+                    removed = 0
+                    for key, size in self._conn.execute(
+                        "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+                    ).fetchall():
+                        if total - removed <= self.max_size_bytes:
+                            break
+                        self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                        removed += size
+                    logging.info(f"LLM cache evicted {removed} bytes to stay under {self.max_size_bytes} bytes")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "size_bytes": size,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_shared_cache = None
+_shared_settings = None
+_shared_lock = threading.Lock()
+
+
+def configure(config: dict) -> Optional[ResponseCache]:
+    """Open the process-wide cache from config; called by llm.initialize_llm.
+
+    The cache is on by default and can be switched off with `llm_cache.enabled: false`.
+    """
+    global _shared_cache, _shared_settings
+    settings = config.get("llm_cache") or {}
+    with _shared_lock:
+        if repr(settings) == _shared_settings:
+            return _shared_cache
+        if _shared_cache is not None:
+            _shared_cache.close()
+        _shared_cache = ResponseCache.from_config(config) if settings.get("enabled", True) else None
+        _shared_settings = repr(settings)
+    return _shared_cache
+
+
+def get_cache() -> Optional[ResponseCache]:
+    """Return the process-wide cache, or None when caching is disabled or not configured."""
+    return _shared_cache
@@ -1,6 +1,12 @@
 import pandas as pd
+import fnmatch
+import glob
+import hashlib
 import json
+import os
 import yaml
+from concurrent.futures import ProcessPoolExecutor
+from src import profiler
 
 def load_config(config_path="config/settings.yaml"):
     """Loads configuration from a YAML file."""
@@ -15,124 +21,307 @@ def load_config(config_path="config/settings.yaml"):
         return None
 
 
-def preprocess_excel(file_path, sheet_name):
-    """Preprocess the Excel file."""
+# Column keywords, checked in this order against each lower-cased header. The
+# order matters: "required for deployment validation" must be tried before
+# the more general "deployment validation".
+COLUMN_KEYWORDS = [
+    ("schema_name", "schema name"),
+    ("attribute_details", "attributes details"),
+    ("data_type", "data type"),
+    ("business_rules", "business rules"),
+    ("mandatory_field", "mandatory field"),
+    ("from_source", "required from source to have data populated"),
+    ("primary_key", "primary key"),
+    ("required_for_deployment", "required for deployment validation"),
+    ("deployment_validation", "deployment validation"),
+]
+
+# Yes/No columns, in the order they appear in each field's rules
+FLAG_COLUMNS = ["mandatory_field", "from_source", "primary_key", "required_for_deployment", "deployment_validation"]
+
+
+def detect_columns(df):
+    """Detect the index of every required column; returns {column: index}."""
+    columns = {}
+    for i, col in enumerate(df.columns):
+        col_lower = col.lower()
+        for name, keyword in COLUMN_KEYWORDS:
+            if keyword in col_lower:
+                columns[name] = i
+                break
+
+    missing = [name for name, _ in COLUMN_KEYWORDS if name not in columns]
+    if missing:
+        raise ValueError("Could not automatically detect required columns.  "
+                         "Please ensure all required columns exist in the Excel sheet.")
+    return columns
+
+
+def _is_required_column(column_name):
+    """usecols filter: only read the columns that detect_columns looks for."""
+    col_lower = str(column_name).strip().lower()
+    return any(keyword in col_lower for _, keyword in COLUMN_KEYWORDS)
+
+
+def _resolve_engine(engine="auto"):
+    """Pick the fastest available Excel engine for "auto".
+
+    calamine (Rust, needs python-calamine) is several times faster than
+    openpyxl; pandas already opens openpyxl workbooks in read-only mode.
+    """
+    if engine and engine != "auto":
+        return engine
     try:
-        df = pd.read_excel(file_path, sheet_name=sheet_name)
+        import python_calamine  # noqa: F401
+        return "calamine"
+    except ImportError:
+        return "openpyxl"
+
+
+def read_excel_sheet(file_path, sheet_name, engine="auto"):
+    """Reads only the required columns of a sheet with the selected engine."""
+    return pd.read_excel(file_path, sheet_name=sheet_name, engine=_resolve_engine(engine),
+                         usecols=_is_required_column)
+
+
+def _sheet_cache_path(cache_dir, file_path, sheet_name):
+    """Cache file for a sheet, keyed on the workbook's path, mtime, size and sheet name."""
+    stat = os.stat(file_path)
+    source_key = hashlib.sha256(f"{os.path.abspath(file_path)}|{sheet_name}".encode("utf-8")).hexdigest()[:16]
+    version_key = hashlib.sha256(f"{stat.st_mtime_ns}|{stat.st_size}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{source_key}-{version_key}.pkl")
+
+
+def load_sheet(file_path, sheet_name, engine="auto", cache_dir=None):
+    """Reads a sheet, reusing the parsed copy in cache_dir if the workbook is unchanged."""
+    if not cache_dir:
+        return read_excel_sheet(file_path, sheet_name, engine)
+
+    cache_path = _sheet_cache_path(cache_dir, file_path, sheet_name)
+    if os.path.exists(cache_path):
+        try:
+            return pd.read_pickle(cache_path)
+        except Exception as e:
+            print(f"Ignoring unreadable sheet cache {cache_path}: {e}")
+
+    df = read_excel_sheet(file_path, sheet_name, engine)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # Drop cached copies of older versions of this workbook/sheet
+    source_prefix = os.path.basename(cache_path).split("-")[0]
+    for stale_path in glob.glob(os.path.join(cache_dir, f"{source_prefix}-*.pkl")):
+        os.remove(stale_path)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    df.to_pickle(tmp_path)
+    os.replace(tmp_path, cache_path)
+    return df
+
+
+def preprocess_excel(file_path, sheet_name, engine="auto", cache_dir=None):
+    """Preprocess the Excel file.
+
+    The detected column mapping is stored in df.attrs["columns"] so that
+    extract_rules_from_dataframe doesn't have to detect it again.
+    """
+    try:
+        df = load_sheet(file_path, sheet_name, engine, cache_dir)
 
         # Rename columns to remove leading/trailing spaces
         df.columns = df.columns.str.strip()
 
         # Detect column indices dynamically
-        rx_bc_col = None
-        attribute_details_col = None
-        data_type_col = None
-        business_rules_col = None
-        mandatory_field_col = None
-        from_source_col = None
-        primary_key_col = None
-        required_for_deployment_col = None
-        deployment_validation_col = None
-
-        for i, col in enumerate(df.columns):
-            col_lower = col.lower()
-            if "schema name" in col_lower:
-                rx_bc_col = i
-            elif "attributes details" in col_lower:
-                attribute_details_col = i
-            elif "data type" in col_lower:
-                data_type_col = i
-            elif "business rules" in col_lower:
-                business_rules_col = i
-            elif "mandatory field" in col_lower:
-                mandatory_field_col = i
-            elif "required from source to have data populated" in col_lower:
-                from_source_col = i
-            elif "primary key" in col_lower:
-                primary_key_col = i
-            elif "required for deployment validation" in col_lower:
-                required_for_deployment_col = i
-            elif "deployment validation" in col_lower:
-                deployment_validation_col = i
-
-        if rx_bc_col is None or attribute_details_col is None or data_type_col is None or business_rules_col is None or mandatory_field_col is None or from_source_col is None or primary_key_col is None or required_for_deployment_col is None or deployment_validation_col is None:
-            raise ValueError("Could not automatically detect required columns.  "
-                             "Please ensure all required columns exist in the Excel sheet.")
+        columns = detect_columns(df)
 
         # Step 1: Fill down the "Schema Name" category
+        rx_bc_col = columns["schema_name"]
         df.iloc[:, rx_bc_col] = df.iloc[:, rx_bc_col].ffill()
 
+        df.attrs["columns"] = columns
         return df
 
     except Exception as e:
         print(f"Error preprocessing Excel file: {e}")
         return None
 
-def extract_rules_from_dataframe(df):
-    """Extract rules from the cleaned dataframe."""
-    extracted_rules = {}
-    rx_bc_col = None
-    attribute_details_col = None
-    data_type_col = None
-    business_rules_col = None
-    mandatory_field_col = None
-    from_source_col = None
-    primary_key_col = None
-    required_for_deployment_col = None
-    deployment_validation_col = None
+def _as_text(series):
+    """Element-wise str(value).strip(), matching what the row-by-row code did."""
+    return series.astype(object).map(str).str.strip()
 
-    for i, col in enumerate(df.columns):
-        col_lower = col.lower()
-        if "schema name" in col_lower:
-            rx_bc_col = i
-        elif "attributes details" in col_lower:
-            attribute_details_col = i
-        elif "data type" in col_lower:
-            data_type_col = i
-        elif "business rules" in col_lower:
-            business_rules_col = i
-        elif "mandatory field" in col_lower:
-            mandatory_field_col = i
-        elif "required from source to have data populated" in col_lower:
-            from_source_col = i
-        elif "primary key" in col_lower:
-            primary_key_col = i
-        elif "required for deployment validation" in col_lower:
-            required_for_deployment_col = i
-        elif "deployment validation" in col_lower:
-            deployment_validation_col = i
+def extract_rules_from_dataframe(df, columns=None):
+    """Extract rules from the cleaned dataframe.
+
+    Works column-wise: the text and Yes/No columns are normalized with
+    vectorized string ops, then the nested rules dict is built per schema with
+    a groupby. Parents and fields keep the order of their first row; a field
+    repeated within a parent takes the values of its last row.
+    """
     try:
+        if columns is None:
+            columns = df.attrs.get("columns") or detect_columns(df)
+
+        parent_fields = _as_text(df.iloc[:, columns["schema_name"]])
+        field_names = _as_text(df.iloc[:, columns["attribute_details"]])
+
+        data_type_col = df.iloc[:, columns["data_type"]]
+        data_types = _as_text(data_type_col).where(data_type_col.notna(), "String")
+
+        business_rules_col = df.iloc[:, columns["business_rules"]]
+        business_rules = _as_text(business_rules_col).where(business_rules_col.notna(), "")
+
+        flags = {
+            name: _as_text(df.iloc[:, columns[name]]).str.lower().eq("yes")
+            for name in FLAG_COLUMNS
+        }
+
+        normalized = pd.DataFrame({
+            "parent_field": parent_fields,
+            "field_name": field_names,
+            "data_type": data_types,
+            **flags,
+            "business_rules": business_rules,
+        })
+
+        # Materialize each column once as a plain list; the groupby only supplies
+        # the row positions of each schema, in order of first appearance
+        values = {name: normalized[name].tolist() for name in normalized.columns if name != "parent_field"}
+        rule_keys = [name for name in values if name != "field_name"]
+
         extracted_rules = {}
-        for _, row in df.iterrows():
-            parent_field = str(row.iloc[rx_bc_col]).strip()
-            field_name = str(row.iloc[attribute_details_col]).strip()
-            data_type = str(row.iloc[data_type_col]).strip() if pd.notna(row.iloc[data_type_col]) else "String"
-            business_rules = str(row.iloc[business_rules_col]).strip() if pd.notna(row.iloc[business_rules_col]) else ""
-            mandatory_field = str(row.iloc[mandatory_field_col]).strip().lower() == "yes"
-            from_source = str(row.iloc[from_source_col]).strip().lower() == "yes"
-            primary_key = str(row.iloc[primary_key_col]).strip().lower() == "yes"
-            required_for_deployment = str(row.iloc[required_for_deployment_col]).strip().lower() == "yes"
-            deployment_validation = str(row.iloc[deployment_validation_col]).strip().lower() == "yes"
-
-            if parent_field not in extracted_rules:
-                extracted_rules[parent_field] = {"fields": {}}
-
-            extracted_rules[parent_field]["fields"][field_name] = {
-                "data_type": data_type,
-                "mandatory_field": mandatory_field,
-                "from_source": from_source,
-                "primary_key": primary_key,
-                "required_for_deployment": required_for_deployment,
-                "deployment_validation": deployment_validation,
-                "business_rules": business_rules
-            }
+        for parent_field, positions in normalized.groupby("parent_field", sort=False).indices.items():
+            fields = {}
+            for i in positions:
+                fields[values["field_name"][i]] = {key: values[key][i] for key in rule_keys}
+            extracted_rules[parent_field] = {"fields": fields}
         return extracted_rules
     except Exception as e:
         print(f"Error extracting rules: {e}")
         return {}
 
+def expand_sources(sources, engine="auto"):
+    """
+    Expands excel_sources entries into a list of (workbook, sheet) pairs.
+
+    Each entry has a "file" (path or glob) and "sheets" (a list of names or
+    fnmatch patterns such as "BC - Business Rule*"). Order follows the config,
+    then sorted file names, then the workbook's sheet order.
+    """
+    pairs = []
+    for source in sources:
+        files = sorted(glob.glob(source["file"])) or [source["file"]]
+        sheet_patterns = source.get("sheets") or ["*"]
+        if isinstance(sheet_patterns, str):
+            sheet_patterns = [sheet_patterns]
+        for file_path in files:
+            if not any(glob.has_magic(pattern) for pattern in sheet_patterns):
+                pairs.extend((file_path, sheet) for sheet in sheet_patterns)
+                continue
+            try:
+                with pd.ExcelFile(file_path, engine=_resolve_engine(engine)) as workbook:
+                    sheet_names = workbook.sheet_names
+            except Exception as e:
+                print(f"Error listing sheets in {file_path}: {e}")
+                continue
+            pairs.extend(
+                (file_path, sheet) for sheet in sheet_names
+                if any(fnmatch.fnmatchcase(sheet, pattern) for pattern in sheet_patterns)
+            )
+    return pairs
+
+
+def _parse_source(file_path, sheet_name, engine, cache_dir):
+    """Worker for parse_excel_batch: parses one sheet in a separate process."""
+    df = preprocess_excel(file_path, sheet_name, engine=engine, cache_dir=cache_dir)
+    if df is None:
+        return None
+    return extract_rules_from_dataframe(df)
+
+
+def merge_rules(results, conflict_policy="first"):
+    """
+    Merges per-sheet rules into one document.
+
+    results is a list of ((workbook, sheet), rules) in source order. A conflict
+    is the same parent/field appearing in several sources with different
+    details; conflict_policy decides whether the "first" or "last" source wins,
+    or whether to raise ("error"). Returns (merged_rules, conflicts).
+    """
+    merged = {}
+    origins = {}
+    conflicts = []
+    for source, rules in results:
+        for parent_field, details in rules.items():
+            merged_fields = merged.setdefault(parent_field, {"fields": {}})["fields"]
+            for field_name, field_details in details["fields"].items():
+                if field_name not in merged_fields:
+                    merged_fields[field_name] = field_details
+                    origins[(parent_field, field_name)] = source
+                    continue
+                if merged_fields[field_name] == field_details:
+                    continue
+
+                previous_source = origins[(parent_field, field_name)]
+                conflicts.append({
+                    "field": f"{parent_field}.{field_name}",
+                    "sources": [f"{previous_source[0]}[{previous_source[1]}]", f"{source[0]}[{source[1]}]"],
+                })
+                if conflict_policy == "error":
+                    raise ValueError(f"Conflicting rules for {parent_field}.{field_name} in "
+                                     f"{previous_source} and {source}")
+                if conflict_policy == "last":
+                    merged_fields[field_name] = field_details
+                    origins[(parent_field, field_name)] = source
+    return merged, conflicts
+
+
+def parse_excel_batch(config):
+    """
+    Parses every workbook/sheet in config["excel_sources"] on a process pool
+    and merges the results. Excel XML parsing is CPU-bound, so this scales with
+    parse_workers (defaults to the number of cores).
+    """
+    engine = config.get("excel_engine", "auto")
+    cache_dir = config.get("excel_cache_dir")
+    pairs = expand_sources(config["excel_sources"], engine)
+    if not pairs:
+        print("Error: excel_sources matched no workbook sheets.")
+        return None
+
+    max_workers = config.get("parse_workers") or os.cpu_count()
+    print(f"Parsing {len(pairs)} sheets with {min(max_workers, len(pairs))} worker processes")
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(pairs))) as executor:
+        parsed = list(executor.map(
+            _parse_source,
+            [file_path for file_path, _ in pairs],
+            [sheet for _, sheet in pairs],
+            [engine] * len(pairs),
+            [cache_dir] * len(pairs),
+        ))
+
+    results = []
+    for source, rules in zip(pairs, parsed):
+        if not rules:
+            print(f"Warning: no rules extracted from {source[0]} [{source[1]}]")
+            continue
+        results.append((source, rules))
+    if not results:
+        return None
+
+    merged, conflicts = merge_rules(results, config.get("parse_conflict_policy", "first"))
+    for conflict in conflicts:
+        print(f"Warning: conflicting rules for {conflict['field']} in {' and '.join(conflict['sources'])}")
+    return merged
+
+
+@profiler.timed("parse_excel.parse_excel")
 def parse_excel(config):
-    """Parses the Excel file and extracts the rules."""
+    """Parses the Excel file and extracts the rules.
+
+    If excel_sources is configured, all listed workbooks/sheets are parsed in
+    parallel instead of the single excel_file/excel_sheet_name.
+    """
+    if config.get("excel_sources"):
+        return parse_excel_batch(config)
+
     excel_file = config.get("excel_file")
     excel_sheet_name = config.get("excel_sheet_name")
 
@@ -140,7 +329,9 @@ def parse_excel(config):
         print("Error: excel_file or excel_sheet_name not found in config.")
         return None
 
-    df = preprocess_excel(excel_file, excel_sheet_name)
+    df = preprocess_excel(excel_file, excel_sheet_name,
+                          engine=config.get("excel_engine", "auto"),
+                          cache_dir=config.get("excel_cache_dir"))
 
     if df is not None:
         rules = extract_rules_from_dataframe(df)
@@ -148,6 +339,7 @@ def parse_excel(config):
     else:
         return None
 
+@profiler.timed("io.save_rules")
 def save_rules(rules, output_file):
     """Saves the extracted rules to a JSON file."""
     try:
@@ -0,0 +1,204 @@
+# src/pipeline.py
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable, Optional, Set, Tuple
+
+from src import add_keys, enrich_rules, generate_test_cases, llm
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+class _SharedResults:
+    """Computes each key once; concurrent callers with the same key wait for the first."""
+
+    def __init__(self):
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+        if owner:
+            try:
+                future.set_result(compute())
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+
+
+class _Stage:
+    """
+    A pool of worker threads moving items from one bounded queue to the next.
+
+    `fn` maps an item to its output item, or None to drop it. Once the
+    input is exhausted and every worker has finished, _DONE is passed on.
+    """
+
+    def __init__(self, name: str, fn: Callable[[Any], Any], inbox: queue.Queue, outbox: Optional[queue.Queue], workers: int):
+        self.name = name
+        self.fn = fn
+        self.inbox = inbox
+        self.outbox = outbox
+        self._running = max(1, workers)
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True)
+                         for i in range(self._running)]
+
+    def start(self) -> "_Stage":
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def join(self) -> None:
+        for thread in self._threads:
+            thread.join()
+
+    def _work(self) -> None:
+        while True:
+            item = self.inbox.get()
+            if item is _DONE:
+                # Leave the marker for the other workers of this stage
+                self.inbox.put(_DONE)
+                break
+            try:
+                result = self.fn(item)
+            except Exception as e:
+                logging.error(f"{self.name} failed for {item[0]}: {str(e)}")
+                result = None
+            if result is not None and self.outbox is not None:
+                self.outbox.put(result)
+
+        with self._lock:
+            self._running -= 1
+            last = self._running == 0
+        if last and self.outbox is not None:
+            self.outbox.put(_DONE)
+
+
+def run_streaming_pipeline(config: dict, rules: dict, llm_client=None, only_fields: Optional[Set[str]] = None,
+                           preserve_fields: Optional[Set[str]] = None, enrich: bool = True) -> Tuple[dict, dict, dict]:
+    """
+    Move every field through enrich -> generate -> key independently.
+
+    Stages are connected by bounded queues (pipeline_queue_size), so a field
+    is generated as soon as its constraints come back and keyed as soon as its
+    cases validate, instead of each stage waiting for the whole previous one.
+    Enrichment and generation calls are deduplicated like the batch path.
+
+    Fields outside `only_fields` reuse the enriched rules and test cases of the
+    previous run's outputs; keys of `preserve_fields` are kept.
+
+    Returns (enriched_rules, test_cases, keyed_test_cases), in rules order.
+    """
+    if llm_client is None:
+        llm_client = llm.initialize_llm(config)
+    generator = generate_test_cases.TestCaseGenerator(config=config)
+    if int(config.get("batch_size", 1)) > 1:
+        logging.warning("pipeline_mode: streaming generates one field per request; batch_size is ignored")
+    workers = max(1, int(config.get("max_concurrency", 1)))
+    queue_size = max(1, int(config.get("pipeline_queue_size", 100)))
+    deterministic = config.get("deterministic_keys", False)
+
+    existing_enriched, existing_test_cases, existing_keys = {}, {}, {}
+    if only_fields is not None or not enrich:
+        existing_enriched = enrich_rules.load_existing_enriched_rules(config["constrains_processed_rules_file"])
+    if only_fields is not None:
+        existing_test_cases = generate_test_cases.load_existing_test_cases(config["generated_test_cases_file"])
+    if preserve_fields:
+        existing_keys = add_keys.load_existing_keys(config["test_case_keys_file"], set(preserve_fields))
+
+    def changed(full_field_name: str) -> bool:
+        return only_fields is None or full_field_name in only_fields
+
+    constraints_results = _SharedResults()
+    generation_results = _SharedResults()
+
+    enriched_fields, test_cases, keyed_test_cases = {}, {}, {}
+
+    def enrich_field(item):
+        full_field_name, parent_field, field_name, field_details = item
+        existing_field = existing_enriched.get(parent_field, {}).get("fields", {}).get(field_name)
+        if not changed(full_field_name) and existing_field:
+            enriched_field = existing_field
+        elif enrich:
+            key = enrich_rules.enrichment_key(field_name, field_details["data_type"], field_details["business_rules"])
+            constraints = constraints_results.get(key, lambda: enrich_rules.enrich_constraints(
+                field_name, field_details["data_type"], field_details["business_rules"], llm_client
+            ))
+            enriched_field = enrich_rules.build_enriched_field(
+                field_details, enrich_rules.clean_and_split_constraints(constraints)
+            )
+        else:
+            # Enrichment off: use the previous constraints where there are any
+            enriched_field = existing_field or field_details
+        enriched_fields[full_field_name] = enriched_field
+        return full_field_name, parent_field, field_name, enriched_field
+
+    def generate_field(item):
+        full_field_name, parent_field, field_name, field_details = item
+        if not changed(full_field_name) and existing_test_cases.get(full_field_name):
+            return item + (existing_test_cases[full_field_name],)
+        key = full_field_name
+        if config.get("dedupe_fields", True):
+            key = generator.field_signature(field_name, field_details)
+        test_cases = generation_results.get(key, lambda: generator.generate_field_test_cases(
+            full_field_name, field_name, field_details, llm_client
+        ))
+        return item + (test_cases,) if test_cases else None
+
+    def key_field(item):
+        full_field_name, _, _, _, cases = item
+        test_cases[full_field_name] = cases
+        # Copies, so the unkeyed cases (possibly shared by deduplicated fields) stay as generated
+        keyed_test_cases[full_field_name] = add_keys.assign_keys(
+            full_field_name, [dict(case) for case in cases], existing_keys.get(full_field_name), deterministic
+        )
+        logging.info(f"Pipeline completed field {len(keyed_test_cases)}: {full_field_name}")
+        return None
+
+    parsed, enriched, generated = (queue.Queue(maxsize=queue_size) for _ in range(3))
+    stages = [
+        _Stage("enrich", enrich_field, parsed, enriched, workers).start(),
+        _Stage("generate", generate_field, enriched, generated, workers).start(),
+        # A single keying worker, so the result dicts need no locking
+        _Stage("key", key_field, generated, None, 1).start(),
+    ]
+
+    started_at = time.monotonic()
+    all_fields = [
+        (f"{parent_field}.{field_name}", parent_field, field_name, field_details)
+        for parent_field, details in rules.items()
+        for field_name, field_details in details["fields"].items()
+    ]
+    for item in all_fields:
+        parsed.put(item)  # Blocks while the enrichment queue is full
+    parsed.put(_DONE)
+    for stage in stages:
+        stage.join()
+    logging.info(f"Streaming pipeline finished {len(keyed_test_cases)}/{len(all_fields)} fields "
+                 f"in {time.monotonic() - started_at:.1f}s")
+
+    # Reassemble in rules order, independent of completion order
+    enriched_rules = {parent_field: {"fields": {}} for parent_field in rules}
+    ordered_cases, ordered_keyed = {}, {}
+    for full_field_name, parent_field, field_name, field_details in all_fields:
+        enriched_rules[parent_field]["fields"][field_name] = enriched_fields.get(full_field_name, field_details)
+        if full_field_name in keyed_test_cases:
+            ordered_cases[full_field_name] = test_cases[full_field_name]
+            ordered_keyed[full_field_name] = keyed_test_cases[full_field_name]
+    return enriched_rules, ordered_cases, ordered_keyed
+
+
+def save_outputs(config: dict, enriched_rules: Optional[dict], test_cases: dict, keyed_test_cases: dict) -> None:
+    """Write the pipeline results to the configured output files."""
+    if enriched_rules is not None:
+        enrich_rules.save_enriched_rules(enriched_rules, config["constrains_processed_rules_file"])
+    generate_test_cases.save_test_cases(test_cases.items(), config["generated_test_cases_file"])
+    add_keys.save_test_cases_with_keys(keyed_test_cases.items(), config["test_case_keys_file"])
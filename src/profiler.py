@@ -0,0 +1,244 @@
+# src/profiler.py
+import cProfile
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Dict, Optional
+
+# OAH_PROFILE=1 turns profiling on without editing the config; a comma-separated
+# list (e.g. "cprofile,tracemalloc") also enables those captures
+PROFILE_ENV_VAR = "OAH_PROFILE"
+
+
+class Profiler:
+    """
+    Opt-in per-run profiler for app.py and perfect_flow.
+
+    stage() blocks record wall time, process CPU time and memory; timed()
+    functions record call counts and total time. A sampling thread collects
+    the stacks of every thread (LLM waits included) in the collapsed format
+    read by flamegraph.pl and speedscope. cProfile and tracemalloc are
+    optional because they slow the run down noticeably.
+    """
+
+    def __init__(self, output_dir: str = "logs/profiles", sample_interval_ms: float = 10.0,
+                 use_cprofile: bool = False, use_tracemalloc: bool = False):
+        self.output_dir = os.path.join(output_dir, time.strftime("%Y%m%d-%H%M%S"))
+        self.sample_interval = sample_interval_ms / 1000.0
+        self.use_cprofile = use_cprofile
+        self.use_tracemalloc = use_tracemalloc
+        self.stages = []
+        self.functions = {}
+        self.stacks = Counter()
+        self._open_stages = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sampler = None
+        self._profiles = []
+        self._started_at = None
+        self._cpu_started_at = None
+
+    @classmethod
+    def from_config(cls, config: dict) -> Optional["Profiler"]:
+        """A profiler when profiling.enabled or OAH_PROFILE is set, otherwise None."""
+        settings = dict(config.get("profiling") or {})
+        env = os.environ.get(PROFILE_ENV_VAR, "").strip().lower()
+        if env and env not in ("0", "false", "no"):
+            settings["enabled"] = True
+            options = {option.strip() for option in env.split(",")}
+            settings["cprofile"] = settings.get("cprofile", False) or "cprofile" in options
+            settings["tracemalloc"] = settings.get("tracemalloc", False) or "tracemalloc" in options
+        if not settings.get("enabled", False):
+            return None
+        return cls(
+            output_dir=settings.get("output_dir", "logs/profiles"),
+            sample_interval_ms=settings.get("sample_interval_ms", 10.0),
+            use_cprofile=settings.get("cprofile", False),
+            use_tracemalloc=settings.get("tracemalloc", False),
+        )
+
+    def start(self) -> "Profiler":
+        self._started_at = time.perf_counter()
+        self._cpu_started_at = time.process_time()
+        if self.use_tracemalloc:
+            tracemalloc.start()
+        if self.use_cprofile:
+            self._profile_thread()
+            # Worker threads started from now on get a profile of their own
+            threading.setprofile(self._profile_thread)
+        self._sampler = threading.Thread(target=self._sample, name="profiler-sampler", daemon=True)
+        self._sampler.start()
+        return self
+
+    def _profile_thread(self, *args) -> None:
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+: profiling is process-wide and the first profile already covers this thread
+            return
+        with self._lock:
+            self._profiles.append(profile)
+
+    def _sample(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stopped.wait(self.sample_interval):
+            with self._lock:
+                prefix = self._open_stages[-1] if self._open_stages else "run"
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self.stacks[";".join([prefix] + frames[::-1])] += 1
+
+    @contextmanager
+    def stage(self, name: str):
+        with self._lock:
+            path = "/".join(self._open_stages[-1:] + [name])
+            self._open_stages.append(path)
+        if self.use_tracemalloc:
+            traced_at_start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        started_at, cpu_started_at = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            entry = {
+                "stage": path,
+                "wall_s": round(time.perf_counter() - started_at, 4),
+                # Process-wide: includes every thread working while the stage ran
+                "cpu_s": round(time.process_time() - cpu_started_at, 4),
+                "max_rss_mb": _max_rss_mb(),
+            }
+            if self.use_tracemalloc:
+                entry["peak_alloc_mb"] = round((tracemalloc.get_traced_memory()[1] - traced_at_start) / 2 ** 20, 2)
+            with self._lock:
+                self._open_stages.remove(path)
+                self.stages.append(entry)
+
+    def record_call(self, name: str, seconds: float) -> None:
+        with self._lock:
+            calls, total = self.functions.get(name, (0, 0.0))
+            self.functions[name] = (calls + 1, total + seconds)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            functions = sorted(self.functions.items(), key=lambda item: item[1][1], reverse=True)
+            return {
+                "wall_s": round(time.perf_counter() - self._started_at, 4),
+                "cpu_s": round(time.process_time() - self._cpu_started_at, 4),
+                "max_rss_mb": _max_rss_mb(),
+                "stages": list(self.stages),
+                "functions": [{"function": name, "calls": calls, "total_s": round(total, 4),
+                               "mean_ms": round(total / calls * 1000, 3)}
+                              for name, (calls, total) in functions],
+            }
+
+    def stop(self) -> Dict[str, Any]:
+        """Stop sampling and write report.json, stacks.folded and (if enabled) cprofile.pstats."""
+        self._stopped.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        report = self.report()
+        report["output_dir"] = self.output_dir
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        if self.use_cprofile:
+            threading.setprofile(None)
+            stats = None
+            for profile in self._profiles:
+                profile.disable()
+                stats = pstats.Stats(profile) if stats is None else stats.add(profile)
+            if stats is not None:
+                stats.dump_stats(os.path.join(self.output_dir, "cprofile.pstats"))
+        if self.use_tracemalloc:
+            report["top_allocations"] = [
+                {"location": str(stat.traceback), "size_mb": round(stat.size / 2 ** 20, 3), "count": stat.count}
+                for stat in tracemalloc.take_snapshot().statistics("lineno")[:20]
+            ]
+            tracemalloc.stop()
+
+        with open(os.path.join(self.output_dir, "stacks.folded"), "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(os.path.join(self.output_dir, "report.json"), "w") as f:
+            json.dump(report, f, indent=2)
+
+        max_rss = f", max RSS {report['max_rss_mb']} MB" if report["max_rss_mb"] is not None else ""
+        logging.info(f"Profile written to {self.output_dir} (wall {report['wall_s']:.1f}s, "
+                     f"cpu {report['cpu_s']:.1f}s{max_rss})")
+        for entry in report["stages"]:
+            logging.info(f"  stage {entry['stage']}: wall {entry['wall_s']:.2f}s, cpu {entry['cpu_s']:.2f}s")
+        for entry in report["functions"][:10]:
+            logging.info(f"  {entry['function']}: {entry['calls']} calls, {entry['total_s']:.2f}s")
+        return report
+
+
+def _max_rss_mb() -> Optional[float]:
+    """Peak resident memory of the process, or None where it is not available (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(max_rss / 2 ** 20 if sys.platform == "darwin" else max_rss / 1024, 1)
+
+
+_active = None
+
+
+def start(config: dict) -> Optional[Profiler]:
+    """Start the run's profiler when profiling is enabled; returns None otherwise."""
+    global _active
+    profiler = Profiler.from_config(config)
+    if profiler is not None:
+        _active = profiler.start()
+    return profiler
+
+
+def stop() -> Optional[Dict[str, Any]]:
+    """Stop the active profiler and write its report."""
+    global _active
+    profiler, _active = _active, None
+    return profiler.stop() if profiler is not None else None
+
+
+@contextmanager
+def stage(name: str):
+    """Time a pipeline stage; a no-op unless a profiler is running."""
+    if _active is None:
+        yield
+        return
+    with _active.stage(name):
+        yield
+
+
+def timed(name: str):
+    """Decorator counting calls and time of a hot function while a profiler is running."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            profiler = _active
+            if profiler is None:
+                return fn(*args, **kwargs)
+            started_at = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profiler.record_call(name, time.perf_counter() - started_at)
+        return wrapper
+    return decorator
@@ -0,0 +1,253 @@
+# src/rate_limiter.py
+import email.utils
+import logging
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional
+
+
+# Quota errors recognised by their message, for exceptions without a status code.
+# A bare "429" is not enough: token counts and request IDs contain it too.
+RATE_LIMIT_MESSAGE = re.compile(r"\b429\b.*(too many|rate)|resource has been exhausted", re.IGNORECASE)
+
+
+class TokenBucket:
+    """A token bucket refilled continuously at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute: Optional[float]):
+        self.rate_per_minute = rate_per_minute
+        self.capacity = float(rate_per_minute) if rate_per_minute else 0.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return not self.rate_per_minute
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.capacity / 60.0)
+        self.updated_at = now
+
+    def time_until(self, amount: float, now: float) -> float:
+        """Seconds until `amount` tokens are available (0 if available now)."""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60.0 / self.capacity
+
+    def take(self, amount: float) -> None:
+        if not self.unlimited:
+            self.tokens -= min(amount, self.capacity)
+
+
+def is_rate_limit_error(exc: Exception) -> bool:
+    """True for quota errors from either SDK (Gemini ResourceExhausted, OpenAI RateLimitError)."""
+    for attr in ("status_code", "code"):
+        if getattr(exc, attr, None) == 429:
+            return True
+    if type(exc).__name__ in ("RateLimitError", "ResourceExhausted", "TooManyRequests"):
+        return True
+    return RATE_LIMIT_MESSAGE.search(str(exc)) is not None
+
+
+def is_transient_error(exc: Exception) -> bool:
+    """True for server-side errors that are worth retrying after a backoff."""
+    for attr in ("status_code", "code"):
+        status = getattr(exc, attr, None)
+        if isinstance(status, int) and status >= 500:
+            return True
+    return type(exc).__name__ in ("ServiceUnavailable", "InternalServerError", "APITimeoutError", "APIConnectionError",
+                                  "DeadlineExceeded", "ReadTimeout", "ConnectTimeout")
+
+
+def get_retry_after(exc: Exception) -> Optional[float]:
+    """Extract a Retry-After delay (seconds) from an SDK exception, if the server sent one."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms:
+            return float(retry_after_ms) / 1000.0
+        retry_after = headers.get("retry-after")
+        if not retry_after:
+            return None
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            retry_at = email.utils.parsedate_to_datetime(retry_after)
+            return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except Exception:
+        return None
+
+
+class RateLimiter:
+    """
+    Shared rate limiter for LLM calls.
+
+    Combines a requests/min and a tokens/min token bucket with an adaptive
+    concurrency limit: every 429 halves the number of calls allowed in flight,
+    and each successful call grows it back additively up to `max_concurrency`.
+    Rate-limited calls are retried with jittered exponential backoff (honouring
+    Retry-After) so callers are delayed rather than failed.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 max_concurrency: Optional[int] = None, max_retries: int = 8,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._lock = threading.Lock()
+        self._slot_available = threading.Condition(self._lock)
+        self._in_flight = 0
+        self._concurrency_limit = float(max_concurrency) if max_concurrency else None
+        self._paused_until = 0.0
+        self.rate_limited_count = 0
+        self.retry_count = 0
+
+    @classmethod
+    def from_config(cls, config: dict) -> "RateLimiter":
+        settings = config.get("rate_limit") or {}
+        return cls(
+            requests_per_minute=settings.get("requests_per_minute"),
+            tokens_per_minute=settings.get("tokens_per_minute"),
+            max_concurrency=settings.get("max_concurrency", config.get("max_concurrency")),
+            max_retries=settings.get("max_retries", 8),
+            base_delay=settings.get("base_delay", 1.0),
+            max_delay=settings.get("max_delay", 60.0),
+        )
+
+    @property
+    def concurrency_limit(self) -> Optional[int]:
+        return int(self._concurrency_limit) if self._concurrency_limit else None
+
+    def _acquire(self, estimated_tokens: float) -> None:
+        # Wait for a concurrency slot
+        with self._slot_available:
+            while self._concurrency_limit and self._in_flight >= int(self._concurrency_limit):
+                self._slot_available.wait()
+            self._in_flight += 1
+
+        # Then wait for quota in both buckets
+        try:
+            while True:
+                with self._lock:
+                    now = time.monotonic()
+                    wait = max(
+                        self._paused_until - now,
+                        self.requests.time_until(1, now),
+                        self.tokens.time_until(estimated_tokens, now),
+                    )
+                    if wait <= 0:
+                        self.requests.take(1)
+                        self.tokens.take(estimated_tokens)
+                        return
+                time.sleep(wait)
+        except BaseException:
+            self._release(rate_limited=False)
+            raise
+
+    def try_reserve(self, estimated_tokens: float) -> bool:
+        """Take request and token quota only if it is available right now, without a concurrency slot.
+
+        For extra work done on a slot the caller already holds (e.g. a hedge
+        request); returns False instead of waiting when the quota is spent or
+        the limiter is paused after a 429.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if (self._paused_until > now or self.requests.time_until(1, now) > 0
+                    or self.tokens.time_until(estimated_tokens, now) > 0):
+                return False
+            self.requests.take(1)
+            self.tokens.take(estimated_tokens)
+            return True
+
+    def _release(self, rate_limited: bool) -> None:
+        with self._slot_available:
+            self._in_flight -= 1
+            if self._concurrency_limit:
+                if rate_limited:
+                    self._concurrency_limit = max(1.0, self._concurrency_limit / 2)
+                    logging.warning(f"Rate limited, reducing LLM concurrency to {int(self._concurrency_limit)}")
+                else:
+                    self._concurrency_limit = min(float(self.max_concurrency),
+                                                  self._concurrency_limit + 1.0 / self._concurrency_limit)
+            self._slot_available.notify_all()
+
+    def _backoff_delay(self, attempt: int, retry_after: Optional[float]) -> float:
+        # Full jitter keeps concurrent callers from retrying in lockstep
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, self.base_delay)
+        return delay
+
+    def call(self, fn: Callable[[], Any], estimated_tokens: float = 0) -> Any:
+        """Run `fn` once quota is available, retrying rate-limited and transient failures."""
+        for attempt in range(self.max_retries + 1):
+            self._acquire(estimated_tokens)
+            try:
+                result = fn()
+            except Exception as e:
+                rate_limited = is_rate_limit_error(e)
+                self._release(rate_limited=rate_limited)
+                if not (rate_limited or is_transient_error(e)) or attempt == self.max_retries:
+                    raise
+
+                delay = self._backoff_delay(attempt, get_retry_after(e))
+                self.retry_count += 1
+                if rate_limited:
+                    self.rate_limited_count += 1
+                    # Hold back every caller, not just this one, until the quota window recovers
+                    with self._lock:
+                        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                logging.warning(f"LLM call failed ({e}); retrying in {delay:.1f}s "
+                                f"(attempt {attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+                continue
+
+            self._release(rate_limited=False)
+            return result
+
+
+_shared_limiter = RateLimiter()
+_shared_settings = None
+_shared_lock = threading.Lock()
+
+
+def configure(config: dict) -> RateLimiter:
+    """Build the process-wide limiter from config; called by llm.initialize_llm.
+
+    Re-initialising with unchanged settings keeps the existing limiter so its
+    buckets and learned concurrency survive repeated initialize_llm calls.
+    """
+    global _shared_limiter, _shared_settings
+    settings = (repr(config.get("rate_limit")), config.get("max_concurrency"))
+    with _shared_lock:
+        if settings != _shared_settings:
+            _shared_limiter = RateLimiter.from_config(config)
+            _shared_settings = settings
+    return _shared_limiter
+
+
+def get_limiter() -> RateLimiter:
+    """Return the process-wide limiter shared by every LLM caller."""
+    return _shared_limiter
+
+
+def estimate_tokens(prompt: str, max_output_tokens: int) -> int:
+    """Rough token estimate (~4 characters per token) plus the output allowance."""
+    return len(prompt) // 4 + max_output_tokens
@@ -0,0 +1,356 @@
+# src/telemetry.py
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from src import rate_limiter
+
+# Upper bounds (seconds) of the per-stage latency histogram buckets
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Latencies kept per stage for percentiles; exact up to this many API calls, sampled beyond
+LATENCY_RESERVOIR_SIZE = 1024
+
+# (stage, field) of the LLM calls made in the current context; see scope()
+_scope = contextvars.ContextVar("llm_scope", default=("llm", None))
+# The call whose attempt is running in this context, for record_usage(). A
+# context variable, so hedged requests on other threads can carry it along.
+_active_call = contextvars.ContextVar("llm_active_call", default=None)
+
+
+@contextmanager
+def scope(stage: str, field: Optional[str] = None):
+    """Attribute the LLM calls made inside the block to `stage` (and `field`, else the enclosing one)."""
+    token = _scope.set((stage, field if field is not None else _scope.get()[1]))
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+class StageMetrics:
+    """Running aggregates of one stage's LLM calls."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.attempts = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.hedged = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency_seconds = 0.0
+        self.service_seconds = 0.0
+        self.api_calls = 0
+        # Uniform sample of at most LATENCY_RESERVOIR_SIZE latencies (reservoir sampling)
+        self.latencies = []
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def add(self, event: Dict[str, Any]) -> None:
+        self.calls += 1
+        self.errors += 0 if event["success"] else 1
+        self.attempts += event["attempts"]
+        self.retries += max(0, event["attempts"] - 1)
+        self.rate_limited += event["rate_limited"]
+        self.hedged += event["hedged"]
+        if event["cache"] == "hit":
+            # Served from disk: no tokens spent, no API latency
+            self.cache_hits += 1
+            return
+        self.prompt_tokens += event["prompt_tokens"] or 0
+        self.completion_tokens += event["completion_tokens"] or 0
+        self.latency_seconds += event["latency_s"]
+        self.service_seconds += event["service_s"]
+        self.api_calls += 1
+        if len(self.latencies) < LATENCY_RESERVOIR_SIZE:
+            self.latencies.append(event["latency_s"])
+        else:
+            slot = random.randrange(self.api_calls)
+            if slot < LATENCY_RESERVOIR_SIZE:
+                self.latencies[slot] = event["latency_s"]
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if event["latency_s"] <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "cache_hits": self.cache_hits,
+            "cache_hit_rate": self.cache_hits / self.calls if self.calls else 0.0,
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "hedged": self.hedged,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "latency_p50_s": self.percentile(0.50),
+            "latency_p95_s": self.percentile(0.95),
+            "latency_p99_s": self.percentile(0.99),
+            "latency_mean_s": self.latency_seconds / self.api_calls if self.api_calls else None,
+            # Share of call time spent waiting for quota, concurrency slots and backoff
+            "wait_share": 1 - self.service_seconds / self.latency_seconds if self.latency_seconds else 0.0,
+            "histogram": dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"], self.buckets)),
+        }
+
+
+class Recorder:
+    """
+    Collects one structured event per LLM call and aggregates them per stage.
+
+    Events are appended to `events_file` (JSON lines) as they happen when it
+    is set; only the per-stage aggregates are kept in memory.
+    """
+
+    def __init__(self, events_file: Optional[str] = None):
+        self.events_file = events_file
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._events = None
+        if events_file:
+            if os.path.dirname(events_file):
+                os.makedirs(os.path.dirname(events_file), exist_ok=True)
+            self._events = open(events_file, "a", encoding="utf-8")
+
+    def record(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            self.stages.setdefault(event["stage"], StageMetrics()).add(event)
+            if self._events is not None:
+                self._events.write(json.dumps(event, default=str) + "\n")
+                self._events.flush()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stages = {}
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {stage: metrics.to_dict() for stage, metrics in self.stages.items()}
+
+    def table(self) -> List[Dict[str, Any]]:
+        """One row per stage, for a Prefect table artifact."""
+        rows = []
+        for stage, metrics in self.summary().items():
+            row = {"stage": stage}
+            row.update({key: value for key, value in metrics.items() if key != "histogram"})
+            rows.append(row)
+        return rows
+
+    def to_markdown(self) -> str:
+        summary = self.summary()
+        if not summary:
+            return "No LLM calls were made in this run."
+
+        def ms(seconds):
+            return "-" if seconds is None else f"{seconds * 1000:.0f}"
+
+        lines = [
+            "## LLM calls per stage", "",
+            "| Stage | Calls | Errors | Cache hits | Retries | 429s | Hedged | p50 ms | p95 ms | p99 ms "
+            "| Prompt tokens | Completion tokens | Wait share |",
+            "|---|---|---|---|---|---|---|---|---|---|---|---|---|",
+        ]
+        for stage, m in summary.items():
+            lines.append(
+                f"| {stage} | {m['calls']} | {m['errors']} | {m['cache_hits']} | {m['retries']} "
+                f"| {m['rate_limited']} | {m['hedged']} | {ms(m['latency_p50_s'])} | {ms(m['latency_p95_s'])} "
+                f"| {ms(m['latency_p99_s'])} | {m['prompt_tokens']} | {m['completion_tokens']} "
+                f"| {m['wait_share']:.0%} |"
+            )
+        bounds = [f"≤{bound:g}s" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]:g}s"]
+        lines += ["", "## Call latency histogram (API calls)", "",
+                  "| Stage | " + " | ".join(bounds) + " |", "|---" * (len(bounds) + 1) + "|"]
+        for stage, m in summary.items():
+            lines.append(f"| {stage} | " + " | ".join(str(count) for count in m["histogram"].values()) + " |")
+        return "\n".join(lines)
+
+    def to_prometheus(self) -> str:
+        """The aggregates in the Prometheus text format (for node_exporter's textfile collector)."""
+        summary = self.summary()
+        counters = [
+            ("oah_llm_calls_total", "LLM calls", "calls"),
+            ("oah_llm_call_errors_total", "LLM calls that returned no response", "errors"),
+            ("oah_llm_cache_hits_total", "LLM calls answered from the response cache", "cache_hits"),
+            ("oah_llm_retries_total", "Retried LLM requests", "retries"),
+            ("oah_llm_rate_limited_total", "LLM requests rejected with 429", "rate_limited"),
+            ("oah_llm_hedged_total", "LLM calls that sent a hedged second request", "hedged"),
+        ]
+        lines = []
+        for name, help_text, key in counters:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            lines += [f'{name}{{stage="{stage}"}} {m[key]}' for stage, m in summary.items()]
+        lines += ["# HELP oah_llm_tokens_total LLM tokens used", "# TYPE oah_llm_tokens_total counter"]
+        for stage, m in summary.items():
+            lines.append(f'oah_llm_tokens_total{{stage="{stage}",kind="prompt"}} {m["prompt_tokens"]}')
+            lines.append(f'oah_llm_tokens_total{{stage="{stage}",kind="completion"}} {m["completion_tokens"]}')
+
+        name = "oah_llm_call_duration_seconds"
+        lines += [f"# HELP {name} LLM call latency including quota waits and retries",
+                  f"# TYPE {name} histogram"]
+        with self._lock:
+            stages = list(self.stages.items())
+        for stage, metrics in stages:
+            cumulative = 0
+            for bound, count in zip([f"{bound:g}" for bound in LATENCY_BUCKETS] + ["+Inf"], metrics.buckets):
+                cumulative += count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {metrics.latency_seconds:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {metrics.api_calls}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """Write the metrics to `path`: Prometheus text for .prom files, JSON otherwise."""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        content = self.to_prometheus() if path.endswith(".prom") else json.dumps(self.summary(), indent=2)
+        # Written to a temporary file first, so a scraper never reads half a file
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(path + ".tmp", path)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._events is not None:
+                self._events.close()
+                self._events = None
+
+
+class LLMCall:
+    """
+    Measures one LLM call made by llm.py and records it when finished.
+
+    Wrap each request attempt with attempt() so retries, 429s and the time
+    spent in the API (as opposed to waiting for quota) are counted. Does
+    nothing when telemetry is disabled.
+    """
+
+    def __init__(self, provider: Optional[str], model: Optional[str], prompt: str, streamed: bool = False):
+        self.recorder = _shared_recorder
+        self.prompt = prompt
+        stage, field = _scope.get()
+        self.event = {
+            "timestamp": time.time(), "stage": stage, "field": field, "provider": provider, "model": model,
+            "streamed": streamed, "cache": "off", "attempts": 0, "rate_limited": 0,
+            "latency_s": 0.0, "service_s": 0.0, "prompt_tokens": None, "completion_tokens": None,
+            "tokens_estimated": False, "hedged": False, "success": False, "error": None,
+        }
+        self._started_at = time.perf_counter()
+        self._attempt_ended_at = None
+        self._finished = False
+
+    def attempt(self, fn):
+        if self.recorder is None:
+            return fn
+
+        def timed():
+            self.event["attempts"] += 1
+            token = _active_call.set(self)
+            started_at = time.perf_counter()
+            try:
+                return fn()
+            except Exception as e:
+                if rate_limiter.is_rate_limit_error(e):
+                    self.event["rate_limited"] += 1
+                raise
+            finally:
+                self._attempt_ended_at = time.perf_counter()
+                self.event["service_s"] += self._attempt_ended_at - started_at
+                _active_call.reset(token)
+        return timed
+
+    def finish(self, response_text: Optional[str], cache: str = "off", error: Any = None) -> None:
+        if self.recorder is None or self._finished:
+            return
+        self._finished = True
+        event = self.event
+        finished_at = time.perf_counter()
+        event["latency_s"] = finished_at - self._started_at
+        if event["streamed"] and self._attempt_ended_at is not None:
+            # The attempt only opened the stream; reading the rest is API time too
+            event["service_s"] += finished_at - self._attempt_ended_at
+        event["cache"] = cache
+        event["success"] = error is None and bool(response_text)
+        if error is not None:
+            event["error"] = error if isinstance(error, str) else type(error).__name__
+        if not event["prompt_tokens"]:
+            # No usage reported (cache hit, stream or a proxy without usage): ~4 characters per token
+            event["prompt_tokens"] = len(self.prompt) // 4
+            event["completion_tokens"] = len(response_text or "") // 4
+            event["tokens_estimated"] = True
+        self.recorder.record(event)
+
+
+def mark_hedged() -> None:
+    """Flag the call whose attempt is running in this context as hedged (see llm.HedgedBackend)."""
+    call = _active_call.get()
+    if call is not None:
+        call.event["hedged"] = True
+
+
+def record_usage(prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> None:
+    """Attach the provider-reported token usage to the call whose attempt is running on this thread."""
+    call = _active_call.get()
+    if call is not None and prompt_tokens:
+        call.event["prompt_tokens"] = prompt_tokens
+        call.event["completion_tokens"] = completion_tokens or 0
+
+
+_shared_recorder = None
+_shared_settings = None
+_shared_lock = threading.Lock()
+
+
+def configure(config: dict) -> Optional[Recorder]:
+    """Set up the process-wide recorder from config; called by llm.initialize_llm.
+
+    Telemetry is on by default and can be switched off with `telemetry.enabled: false`.
+    """
+    global _shared_recorder, _shared_settings
+    settings = config.get("telemetry") or {}
+    with _shared_lock:
+        if repr(settings) == _shared_settings:
+            return _shared_recorder
+        if _shared_recorder is not None:
+            _shared_recorder.close()
+        _shared_recorder = Recorder(settings.get("events_file")) if settings.get("enabled", True) else None
+        _shared_settings = repr(settings)
+    return _shared_recorder
+
+
+def get_recorder() -> Optional[Recorder]:
+    """Return the process-wide recorder, or None when telemetry is disabled or not configured."""
+    return _shared_recorder
+
+
+def export(config: dict) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Log the per-stage summary and write telemetry.metrics_file; returns the summary."""
+    recorder = get_recorder()
+    if recorder is None:
+        return None
+    summary = recorder.summary()
+    for stage, m in summary.items():
+        p95 = f"{m['latency_p95_s']:.2f}s" if m["latency_p95_s"] is not None else "-"
+        logging.info(f"LLM {stage}: {m['calls']} calls, {m['errors']} errors, {m['cache_hits']} cache hits, "
+                     f"{m['retries']} retries, {m['rate_limited']} rate limited, {m['hedged']} hedged, p95 {p95}, "
+                     f"{m['prompt_tokens'] + m['completion_tokens']} tokens")
+    metrics_file = (config.get("telemetry") or {}).get("metrics_file")
+    if metrics_file:
+        recorder.write(metrics_file)
+        logging.info(f"LLM metrics written to {metrics_file}")
+    return summary
@@ -0,0 +1,263 @@
+# src/validate_test_cases.py
+import argparse
+import calendar
+import json
+import logging
+import re
+import sys
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import yaml
+
+REQUIRED_KEYS = ("test_case", "description", "expected_result", "input")
+EXPECTED_RESULTS = ("Pass", "Fail")
+DEFAULT_DATE_FORMATS = [
+    "%Y-%m-%d %H:%M:%S",
+    "%Y/%m/%d %H:%M:%S",
+    "%m/%d/%Y %H:%M:%S"
+]
+
+# strptime directives that can be matched with a regex, accepting exactly what
+# _strptime accepts (e.g. a space-padded %d). The named groups let the
+# calendar check reject dates like Feb 30 that the pattern alone accepts.
+_DIRECTIVE_PATTERNS = {
+    "Y": r"(?P<year>\d{4})",
+    "m": r"(?P<month>0?[1-9]|1[0-2])",
+    "d": r"(?P<day>0?[1-9]|[12]\d|3[01]| [1-9])",
+    "H": r"(?:[01]?\d|2[0-3])",
+    "I": r"(?:0?[1-9]|1[0-2])",
+    "M": r"[0-5]?\d",
+    "S": r"[0-5]?\d",
+    "f": r"[0-9]{1,6}",
+    "p": r"(?:AM|PM)",
+    "%": "%",
+}
+
+
+def compile_date_format(date_format: str) -> Optional["re.Pattern"]:
+    """Translate a strptime format into an equivalent regex, or None if it uses unsupported directives."""
+    parts = []
+    i = 0
+    while i < len(date_format):
+        char = date_format[i]
+        if char == "%":
+            directive = date_format[i + 1:i + 2]
+            if directive not in _DIRECTIVE_PATTERNS:
+                return None
+            parts.append(_DIRECTIVE_PATTERNS[directive])
+            i += 2
+        elif char.isspace():
+            # Like strptime, a run of whitespace matches any run of whitespace
+            parts.append(r"\s+")
+            while i < len(date_format) and date_format[i].isspace():
+                i += 1
+        else:
+            parts.append(re.escape(char))
+            i += 1
+    return re.compile("".join(parts), re.IGNORECASE)
+
+
+def _valid_calendar_date(match: "re.Match") -> bool:
+    groups = match.groupdict()
+    if groups.get("year") and int(groups["year"]) < 1:
+        return False
+    if groups.get("day") and groups.get("month") and groups.get("year"):
+        return int(groups["day"]) <= calendar.monthrange(int(groups["year"]), int(groups["month"]))[1]
+    return True
+
+
+class DataTypeRule:
+    """
+    Precompiled checks for one data type.
+
+    An input is accepted if it is an instance of `python_types` or a string
+    that fully matches one of `patterns`. With strict=True every other input
+    makes the test case invalid; otherwise it is only invalid when the case
+    claims the input should "Pass".
+    """
+
+    def __init__(self, name: str, python_types: Tuple[type, ...] = (), patterns: Sequence[str] = (),
+                 strict: bool = False, message: Optional[str] = None, date_formats: Sequence[str] = ()):
+        self.name = name
+        self.python_types = tuple(python_types)
+        self.patterns = [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+        self.strict = strict
+        self.message = message or (f"{name} input does not match the expected format" if strict
+                                   else f"{name} field with invalid input should fail")
+        self.date_patterns = []
+        self.strptime_formats = []
+        for date_format in date_formats:
+            compiled = compile_date_format(date_format)
+            if compiled is None:
+                self.strptime_formats.append(date_format)
+            else:
+                self.date_patterns.append(compiled)
+
+    def accepts(self, value: Any) -> bool:
+        if isinstance(value, self.python_types) and (bool in self.python_types or not isinstance(value, bool)):
+            return True
+        if not isinstance(value, str):
+            return False
+        if any(pattern.fullmatch(value) for pattern in self.patterns):
+            return True
+        for pattern in self.date_patterns:
+            match = pattern.fullmatch(value)
+            if match and _valid_calendar_date(match):
+                return True
+        for date_format in self.strptime_formats:
+            try:
+                datetime.strptime(value, date_format)
+                return True
+            except ValueError:
+                continue
+        return False
+
+    def check(self, test_case: Dict[str, Any]) -> Tuple[bool, str]:
+        value = test_case["input"]
+        if value is None or self.accepts(value):
+            return True, ""
+        if self.strict:
+            if not isinstance(value, str) and not self.python_types:
+                return False, f"{self.name} input must be a string"
+            return False, self.message
+        if test_case["expected_result"] == "Pass":
+            return False, self.message
+        return True, ""
+
+
+def build_rules(date_formats: Optional[Sequence[str]] = None,
+                custom_rules: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, DataTypeRule]:
+    """
+    Compile the rule set for every known data type.
+
+    `custom_rules` (the `validation_rules` config section) adds or overrides
+    types without code changes, e.g. {"Phone": {"patterns": ["[0-9]{10}"]}}.
+    """
+    date_formats = list(date_formats or DEFAULT_DATE_FORMATS)
+    rules = {
+        "Date": DataTypeRule("Date", date_formats=date_formats, strict=True,
+                             message=f"Invalid date format. Expected formats: {date_formats}"),
+        "String": DataTypeRule("String", python_types=(str,),
+                               message="String field with non-string input should fail"),
+        "Integer": DataTypeRule("Integer", python_types=(int,), patterns=[r"[+-]?\d+"]),
+        "Decimal": DataTypeRule("Decimal", python_types=(int, float), patterns=[r"[+-]?(?:\d+\.?\d*|\.\d+)"]),
+        "Boolean": DataTypeRule("Boolean", python_types=(bool,), patterns=[r"true|false"]),
+        "Email": DataTypeRule("Email", patterns=[r"[^@\s]+@[^@\s]+\.[^@\s]+"]),
+    }
+    for name, spec in (custom_rules or {}).items():
+        rules[name] = DataTypeRule(
+            name,
+            patterns=spec.get("patterns", []),
+            strict=spec.get("strict", False),
+            message=spec.get("message"),
+            date_formats=spec.get("date_formats", []),
+        )
+    return rules
+
+
+class TestCaseValidator:
+    """Validates test cases in bulk against rules compiled once per data type."""
+
+    def __init__(self, date_formats: Optional[Sequence[str]] = None,
+                 custom_rules: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.rules = build_rules(date_formats, custom_rules)
+
+    @classmethod
+    def from_config(cls, config: dict) -> "TestCaseValidator":
+        return cls(custom_rules=config.get("validation_rules"))
+
+    def validate_case(self, test_case: Any, data_type: Optional[str]) -> Tuple[bool, str]:
+        """Validate a single test case based on field type and rules."""
+        return self._check(test_case, self.rules.get(data_type))
+
+    def validate(self, test_cases: Iterable[Any], data_type: Optional[str]) -> Tuple[List[Dict[str, Any]], List[Tuple[int, Any, str]]]:
+        """
+        Validate a field's whole list in one pass, looking its rule up once.
+
+        Returns (valid_cases, errors) where errors holds (1-based index, case,
+        reason) for every rejected case.
+        """
+        rule = self.rules.get(data_type)
+        valid_cases = []
+        errors = []
+        for idx, case in enumerate(test_cases, 1):
+            is_valid, error_msg = self._check(case, rule)
+            if is_valid:
+                valid_cases.append(case)
+            else:
+                errors.append((idx, case, error_msg))
+        return valid_cases, errors
+
+    @staticmethod
+    def _check(test_case: Any, rule: Optional[DataTypeRule]) -> Tuple[bool, str]:
+        if not isinstance(test_case, dict) or not all(key in test_case for key in REQUIRED_KEYS):
+            return False, "Missing required fields"
+        if test_case["expected_result"] not in EXPECTED_RESULTS:
+            return False, "Invalid expected_result value"
+        return rule.check(test_case) if rule else (True, "")
+
+    def validate_file(self, test_cases_file: str, rules_file: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Re-validate a generated test cases file against the rules it was generated from.
+
+        Returns a report per field: data type, total and valid case counts, and
+        the errors of rejected cases.
+        """
+        with open(rules_file, "r") as f:
+            rules = json.load(f)
+        data_types = {
+            f"{parent_field}.{field_name}": field_details.get("data_type")
+            for parent_field, details in rules.items()
+            for field_name, field_details in details["fields"].items()
+        }
+        with open(test_cases_file, "r") as f:
+            generated = json.load(f)
+
+        report = {}
+        for full_field_name, test_cases in generated.items():
+            data_type = data_types.get(full_field_name)
+            valid_cases, errors = self.validate(test_cases, data_type)
+            report[full_field_name] = {
+                "data_type": data_type,
+                "total": len(test_cases),
+                "valid": len(valid_cases),
+                "errors": [{"index": idx, "test_case": case.get("test_case") if isinstance(case, dict) else None,
+                            "error": error} for idx, case, error in errors],
+            }
+        return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Re-validate an existing generated test cases file; exits non-zero if any case is invalid."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Re-validate generated test cases against the processed rules.")
+    parser.add_argument("--config", default="config/settings.yaml")
+    parser.add_argument("--test-cases", help="Defaults to generated_test_cases_file from the config")
+    parser.add_argument("--rules", help="Defaults to constrains_processed_rules_file from the config")
+    parser.add_argument("--report", help="Write the full per-field report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    with open(args.config, "r") as f:
+        config = yaml.safe_load(f)
+    test_cases_file = args.test_cases or config["generated_test_cases_file"]
+    rules_file = args.rules or config["constrains_processed_rules_file"]
+
+    report = TestCaseValidator.from_config(config).validate_file(test_cases_file, rules_file)
+    total = sum(entry["total"] for entry in report.values())
+    valid = sum(entry["valid"] for entry in report.values())
+    for full_field_name, entry in report.items():
+        for error in entry["errors"]:
+            logging.warning(f"{full_field_name} case {error['index']} ({error['test_case']}): {error['error']}")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+        logging.info(f"Validation report written to {args.report}")
+
+    print(f"\nValidation Summary:\nFields: {len(report)}\nTest cases: {total}\nInvalid: {total - valid}")
+    return 1 if valid < total else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+# tests/test_add_keys.py
+import json
+
+import pytest
+
+from src import add_keys
+
+
+def _write_records(path, records):
+    path.write_text("".join(json.dumps(record) + "\n" for record in records))
+
+
+def test_jsonl_round_trip_keeps_fields_without_test_cases(tmp_path):
+    output = tmp_path / "keys.jsonl"
+    fields = [("Customer.Name", [{"test_case": "TC1", "key": "k1"}]), ("Customer.Age", [])]
+
+    assert add_keys.save_test_cases_with_keys(iter(fields), str(output)) == 2
+    assert list(add_keys.iter_fields(str(output))) == fields
+
+
+def test_json_and_jsonl_outputs_list_the_same_fields(tmp_path):
+    fields = {"Customer.Name": [{"test_case": "TC1"}], "Customer.Age": []}
+    add_keys.save_test_cases_with_keys(fields.items(), str(tmp_path / "keys.json"))
+    add_keys.save_test_cases_with_keys(fields.items(), str(tmp_path / "keys.jsonl"))
+
+    assert dict(add_keys.iter_fields(str(tmp_path / "keys.json"))) == \
+        dict(add_keys.iter_fields(str(tmp_path / "keys.jsonl")))
+
+
+def test_non_contiguous_field_records_are_rejected(tmp_path):
+    path = tmp_path / "keys.jsonl"
+    _write_records(path, [
+        {"field": "Customer.Name", "case": {"test_case": "TC1"}},
+        {"field": "Customer.Age", "case": {"test_case": "TC2"}},
+        {"field": "Customer.Name", "case": {"test_case": "TC3"}},
+    ])
+
+    with pytest.raises(ValueError, match="not contiguous"):
+        list(add_keys.iter_fields(str(path)))
+    # Previous keys that cannot be read reliably are not reused
+    assert add_keys.load_existing_keys(str(path), {"Customer.Name"}) == {}
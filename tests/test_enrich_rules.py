@@ -0,0 +1,46 @@
+# tests/test_enrich_rules.py
+import re
+import threading
+
+from src import enrich_rules, llm
+
+
+def _field(business_rules="Max 50"):
+    return {"data_type": "String", "mandatory_field": True, "from_source": False, "primary_key": False,
+            "required_for_deployment": False, "deployment_validation": False, "business_rules": business_rules}
+
+
+def _fake_llm(monkeypatch):
+    prompts = []
+    lock = threading.Lock()
+
+    def generate(llm_client, prompt, max_output_tokens=1000, **kwargs):
+        with lock:
+            prompts.append(prompt)
+        return "Constraints for " + re.search(r"field '([^']*)'", prompt).group(1)
+    monkeypatch.setattr(llm, "generate_test_cases_with_llm", generate)
+    return prompts
+
+
+def test_fields_are_only_enriched_with_their_own_name(monkeypatch):
+    prompts = _fake_llm(monkeypatch)
+    rules = {
+        "Customer": {"fields": {"Address Line 1": _field(), "Address Line 2": _field()}},
+        "Supplier": {"fields": {"address  line 1": _field()}},
+    }
+
+    enriched = enrich_rules.enrich_loaded_rules(rules, {"max_concurrency": 2}, llm_client=object())
+
+    # Numbered variants get their own call; the same name in another parent shares one
+    assert len(prompts) == 2
+    assert enriched["Customer"]["fields"]["Address Line 2"]["constraints"] == ["Constraints for Address Line 2"]
+    assert enriched["Supplier"]["fields"]["address  line 1"]["constraints"] == ["Constraints for Address Line 1"]
+
+
+def test_different_business_rules_are_enriched_separately(monkeypatch):
+    prompts = _fake_llm(monkeypatch)
+    rules = {"Customer": {"fields": {"Name": _field("Max 50")}}, "Supplier": {"fields": {"Name": _field("Max 80")}}}
+
+    enrich_rules.enrich_loaded_rules(rules, {}, llm_client=object())
+
+    assert len(prompts) == 2
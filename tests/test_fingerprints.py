@@ -0,0 +1,51 @@
+# tests/test_fingerprints.py
+import json
+
+from src import fingerprints, generate_test_cases
+
+RULES = {"Customer": {"fields": {"Name": {"data_type": "String", "business_rules": "Max 50"}}}}
+CONFIG = {"api_use": "Gemini", "gemini_model": "gemini-1.5-flash"}
+
+
+def test_fingerprints_follow_the_rules():
+    changed = {"Customer": {"fields": {"Name": {"data_type": "String", "business_rules": "Max 60"}}}}
+    assert fingerprints.compute_fingerprints(RULES, CONFIG) == fingerprints.compute_fingerprints(RULES, dict(CONFIG))
+    assert fingerprints.changed_fields(fingerprints.compute_fingerprints(RULES, CONFIG),
+                                       fingerprints.compute_fingerprints(changed, CONFIG)) == {"Customer.Name"}
+
+
+def test_model_change_invalidates_every_field():
+    old = fingerprints.compute_fingerprints(RULES, CONFIG)
+    new = fingerprints.compute_fingerprints(RULES, {**CONFIG, "gemini_model": "gemini-1.5-pro"})
+    assert fingerprints.changed_fields(old, new) == {"Customer.Name"}
+
+
+def test_prompt_version_change_invalidates_every_field(monkeypatch):
+    old = fingerprints.compute_fingerprints(RULES, CONFIG)
+    monkeypatch.setattr(generate_test_cases, "PROMPT_TEMPLATE_VERSION", "next")
+    assert fingerprints.changed_fields(old, fingerprints.compute_fingerprints(RULES, CONFIG)) == {"Customer.Name"}
+
+
+def _run_config(tmp_path):
+    config = {**CONFIG, "incremental": True, "rule_fingerprints_file": str(tmp_path / "fingerprints.json")}
+    for key in ("constrains_processed_rules_file", "generated_test_cases_file", "test_case_keys_file"):
+        config[key] = str(tmp_path / f"{key}.json")
+        (tmp_path / f"{key}.json").write_text(json.dumps({"Customer.Name": [{"test_case": "TC1"}]}))
+    return config
+
+
+def test_rule_edited_with_enrichment_off_is_picked_up_next_run(tmp_path):
+    config = _run_config(tmp_path)
+    enriched = {"Customer": {"fields": {"Name": {**RULES["Customer"]["fields"]["Name"], "constraints": ["Max 50"]}}}}
+    fingerprints.save_run_fingerprints(RULES, config, generation_rules=enriched)
+    assert fingerprints.plan_incremental_run(RULES, config) == set()
+
+    edited = {"Customer": {"fields": {"Name": {"data_type": "String", "business_rules": "Max 60"}}}}
+    assert fingerprints.plan_incremental_run(edited, config) == {"Customer.Name"}
+    # Enrichment is skipped, so generation reads the enriched rules of the first run
+    fingerprints.save_run_fingerprints(edited, config, generation_rules=enriched)
+    assert fingerprints.plan_incremental_run(edited, config) == {"Customer.Name"}
+
+    # Once generation sees the edited rule, the field is up to date
+    fingerprints.save_run_fingerprints(edited, config, generation_rules=edited)
+    assert fingerprints.plan_incremental_run(edited, config) == set()
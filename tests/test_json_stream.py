@@ -0,0 +1,67 @@
+# tests/test_json_stream.py
+import io
+import json
+
+import pytest
+
+from src import json_stream
+
+CASES = [
+    {"test_case": "TC001", "description": "Valid", "expected_result": "Pass", "input": "a"},
+    {"test_case": "TC002", "description": "Brace } in \"text\"", "expected_result": "Fail", "input": None},
+]
+
+
+def _feed(parser, text, chunk_size):
+    objects = []
+    for i in range(0, len(text), chunk_size):
+        objects += parser.feed(text[i:i + chunk_size])
+    return objects
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1000])
+def test_objects_are_emitted_as_they_close(chunk_size):
+    parser = json_stream.JsonArrayStreamParser()
+    assert _feed(parser, json.dumps(CASES, indent=2), chunk_size) == CASES
+    assert parser.finished
+
+
+@pytest.mark.parametrize("prefix", ["```json\n", '{"test_cases": ', '{ "test_cases" :\n'])
+def test_fence_and_structured_output_wrapper_are_accepted(prefix):
+    parser = json_stream.JsonArrayStreamParser()
+    assert _feed(parser, prefix + json.dumps(CASES) + "}", 3) == CASES
+
+
+def test_truncated_input_keeps_closed_objects():
+    text = json.dumps(CASES)
+    cut = text[:text.index("TC002") + 10]
+    parser = json_stream.JsonArrayStreamParser()
+    assert parser.feed(cut) == CASES[:1]
+    assert not parser.finished
+    assert parser.partial.startswith('{"test_case": "TC002"')
+
+
+@pytest.mark.parametrize("text", ["Sure! Here are the test cases: [", '["TC001"]', "[1, ", '{"other": ['])
+def test_malformed_stream_is_rejected_early(text):
+    parser = json_stream.JsonArrayStreamParser()
+    with pytest.raises(json_stream.MalformedStreamError):
+        parser.feed(text + json.dumps(CASES))
+
+
+def test_salvage_keeps_valid_objects_and_reports_broken_ones():
+    text = "[" + json.dumps(CASES[0]) + ', {"test_case": "TC002", "input": x}, ' + json.dumps(CASES[1])[:20]
+    objects, broken = json_stream.salvage_objects(text)
+    assert objects == CASES[:1]
+    assert len(broken) == 2
+
+
+def test_fix_invalid_escapes_is_idempotent():
+    fixed = json_stream.fix_invalid_escapes(r'{"input": "C:\path\n"}')
+    assert json.loads(fixed)["input"] == "C:\\path\n"
+    assert json_stream.fix_invalid_escapes(fixed) == fixed
+
+
+def test_iter_json_object_reads_field_by_field():
+    data = {"Parent.A": CASES, "Parent.B": [], "Parent.C": {"nested": "}"}}
+    pairs = list(json_stream.iter_json_object(io.StringIO(json.dumps(data, indent=2)), chunk_size=5))
+    assert pairs == list(data.items())
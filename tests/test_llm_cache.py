@@ -0,0 +1,75 @@
+# tests/test_llm_cache.py
+import time
+
+import pytest
+
+from src import llm_cache
+
+
+@pytest.fixture
+def make_cache(tmp_path):
+    caches = []
+
+    def make(**settings):
+        cache = llm_cache.ResponseCache(str(tmp_path / "responses.sqlite3"), **settings)
+        caches.append(cache)
+        return cache
+    yield make
+    for cache in caches:
+        cache.close()
+
+
+def _age(cache, key, seconds, column="created_at"):
+    cache._conn.execute(f"UPDATE responses SET {column} = ? WHERE key = ?", (time.time() - seconds, key))
+    cache._conn.commit()
+
+
+def test_requests_are_keyed_by_content_and_options():
+    key = llm_cache.ResponseCache.make_key("openai", "gpt-4o", "prompt", 100)
+
+    assert key == llm_cache.ResponseCache.make_key("openai", "gpt-4o", "prompt", 100, None)
+    assert key != llm_cache.ResponseCache.make_key("openai", "gpt-4o", "prompt", 200)
+    assert key != llm_cache.ResponseCache.make_key("openai", "gpt-4o", "prompt", 100, {"json_mode": True})
+
+
+def test_expired_entries_are_misses_and_evicted(make_cache):
+    cache = make_cache(max_age_days=1)
+    cache.put("old", "[1]")
+    cache.put("new", "[2]")
+    _age(cache, "old", 2 * 86400)
+
+    assert cache.get("old") is None
+    assert cache.get("new") == "[2]"
+    cache.evict()
+    assert cache.stats()["entries"] == 1
+
+
+def test_least_recently_used_entries_are_evicted_over_the_size_limit(make_cache):
+    cache = make_cache(max_size_mb=1000 / (1024 * 1024))
+    for index, key in enumerate(["a", "b", "c"]):
+        cache.put(key, "x" * 400)
+        _age(cache, key, 100 - index, column="accessed_at")
+    # Reading "a" makes "b" the least recently used entry
+    assert cache.get("a") is not None
+
+    cache.evict()
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["size_bytes"] == 800
+
+
+def test_refresh_skips_reads_but_still_writes(make_cache):
+    make_cache().put("key", "[1]")
+    cache = make_cache(refresh=True)
+
+    assert cache.get("key") is None
+    cache.put("key", "[2]")
+    assert make_cache().get("key") == "[2]"
+
+
+def test_bypass_neither_reads_nor_writes(make_cache):
+    cache = make_cache(bypass=True)
+    cache.put("key", "[1]")
+
+    assert cache.get("key") is None
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,108 @@
+# tests/test_llm_hedging.py
+import time
+
+import pytest
+
+from src import llm, llm_backends, rate_limiter
+
+
+class ServiceUnavailable(Exception):
+    code = 503
+
+
+class FakeBackend(llm_backends.LLMBackend):
+    provider = "fake"
+
+    def __init__(self, delay=0.0, response="[]", error=None):
+        super().__init__({})
+        self.model = "fake-model"
+        self.delay = delay
+        self.response = response
+        self.error = error
+        self.calls = 0
+
+    def generate(self, prompt, max_output_tokens, json_mode=False):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.response
+
+
+@pytest.fixture(autouse=True)
+def no_run_deadline():
+    llm.start_run_deadline({})
+    yield
+    llm.start_run_deadline({})
+
+
+def _policy():
+    policy = llm.HedgePolicy(percentile=0.5, min_delay=0.05, min_samples=1, max_hedge_ratio=1.0)
+    policy.record(0.01)
+    return policy
+
+
+def _limiter(**rate_limit):
+    return rate_limiter.configure({"max_concurrency": 1, "rate_limit": {"max_retries": 0, **rate_limit}})
+
+
+def test_hedge_runs_on_the_slot_the_parent_holds():
+    limiter = _limiter()
+    primary, secondary = FakeBackend(delay=2.0, response="slow"), FakeBackend(response="fast")
+    hedged = llm.HedgedBackend({"request_timeout_seconds": 5}, primary, secondary, _policy())
+
+    started_at = time.monotonic()
+    # The only concurrency slot is held by this call while the hedge is sent
+    assert limiter.call(lambda: hedged.generate("prompt", 100)) == "fast"
+    assert time.monotonic() - started_at < 1.0
+    assert secondary.calls == 1
+
+
+def test_failing_legs_raise_instead_of_hanging():
+    limiter = _limiter()
+    primary = FakeBackend(delay=0.2, error=ServiceUnavailable("primary down"))
+    secondary = FakeBackend(delay=0.1, error=ServiceUnavailable("secondary down"))
+    hedged = llm.HedgedBackend({"request_timeout_seconds": 5}, primary, secondary, _policy())
+
+    started_at = time.monotonic()
+    with pytest.raises(ServiceUnavailable):
+        limiter.call(lambda: hedged.generate("prompt", 100))
+    assert time.monotonic() - started_at < 2.0
+
+
+def test_legs_are_bounded_by_the_request_timeout():
+    _limiter()
+    primary, secondary = FakeBackend(delay=5.0), FakeBackend(delay=5.0)
+    hedged = llm.HedgedBackend({"request_timeout_seconds": 0.3}, primary, secondary, _policy())
+
+    started_at = time.monotonic()
+    with pytest.raises(TimeoutError):
+        hedged.generate("prompt", 100)
+    assert time.monotonic() - started_at < 1.0
+
+
+def test_no_hedge_without_quota():
+    limiter = _limiter(requests_per_minute=1)
+    primary, secondary = FakeBackend(delay=0.3, response="primary"), FakeBackend(response="hedge")
+    hedged = llm.HedgedBackend({}, primary, secondary, _policy())
+
+    # The parent call takes the only request in the bucket
+    assert limiter.call(lambda: hedged.generate("prompt", 100)) == "primary"
+    assert secondary.calls == 0
+
+
+def test_policy_waits_for_samples():
+    assert llm.HedgePolicy(min_samples=0).delay() is None
+    policy = llm.HedgePolicy(percentile=0.5, min_delay=0.1, min_samples=2)
+    policy.record(1.0)
+    assert policy.delay() is None
+    policy.record(3.0)
+    assert policy.delay() == 3.0
+
+
+def test_policy_caps_the_hedge_ratio():
+    policy = llm.HedgePolicy(max_hedge_ratio=0.1)
+    for _ in range(10):
+        policy.delay()
+    assert policy.try_hedge()
+    assert not policy.try_hedge()
@@ -0,0 +1,105 @@
+# tests/test_llm_pool.py
+import time
+
+import pytest
+
+from src import llm, llm_backends, rate_limiter
+
+
+class TooManyRequests(Exception):
+    code = 429
+
+
+class BadRequest(Exception):
+    code = 400
+
+
+class FakeBackend(llm_backends.LLMBackend):
+    provider = "fake"
+
+    def __init__(self, response="[]", errors=()):
+        super().__init__({})
+        self.model = "fake-model"
+        self.response = response
+        self.errors = list(errors)
+        self.calls = 0
+
+    def generate(self, prompt, max_output_tokens, json_mode=False):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.response
+
+
+def _pool(*backends, weights=None, unhealthy_after=2, readmit_after_seconds=30.0):
+    members = []
+    for index, backend in enumerate(backends):
+        limiter = rate_limiter.RateLimiter(max_retries=0)
+        weight = weights[index] if weights else 1.0
+        members.append(llm.PoolMember(f"member-{index + 1}", backend, limiter, weight))
+    return llm.PooledBackend({}, members, unhealthy_after=unhealthy_after,
+                             readmit_after_seconds=readmit_after_seconds)
+
+
+def test_rate_limited_member_fails_over_to_another():
+    throttled, healthy = FakeBackend(errors=[TooManyRequests("429")]), FakeBackend(response="ok")
+    pool = _pool(throttled, healthy)
+    # Make the throttled member the first choice
+    pool.members[1].outstanding = 1
+
+    assert pool.generate("prompt", 100) == "ok"
+    assert (throttled.calls, healthy.calls) == (1, 1)
+    assert pool.members[0].failures == 1
+
+
+def test_error_reaches_the_caller_once_every_member_failed():
+    pool = _pool(FakeBackend(errors=[TooManyRequests("429")]), FakeBackend(errors=[TooManyRequests("429")]))
+
+    with pytest.raises(TooManyRequests):
+        pool.generate("prompt", 100)
+
+
+def test_non_retryable_errors_do_not_fail_over():
+    failing, healthy = FakeBackend(errors=[BadRequest("bad prompt")]), FakeBackend()
+    pool = _pool(failing, healthy)
+    pool.members[1].outstanding = 1
+
+    with pytest.raises(BadRequest):
+        pool.generate("prompt", 100)
+    assert healthy.calls == 0
+
+
+def test_selection_prefers_fewest_outstanding_per_weight():
+    pool = _pool(FakeBackend(), FakeBackend(), weights=[1.0, 3.0])
+    pool.members[0].outstanding = 1
+    pool.members[1].outstanding = 2
+
+    # (1 + 1) / 1 = 2 against (2 + 1) / 3 = 1
+    assert pool._select([]) is pool.members[1]
+    assert pool._select([pool.members[1]]) is pool.members[0]
+
+
+def test_member_is_ejected_and_readmitted():
+    pool = _pool(FakeBackend(), FakeBackend(), unhealthy_after=2, readmit_after_seconds=0.2)
+    member = pool.members[0]
+
+    for _ in range(2):
+        pool._record_failure(member, TooManyRequests("429"))
+    assert member.ejected
+    assert pool._select([]) is pool.members[1]
+    assert pool.stats()[0]["healthy"] is False
+
+    time.sleep(0.25)
+    pool.members[1].outstanding = 1
+    assert pool._select([]) is member
+    pool._record_success(member)
+    assert not member.ejected and member.failures == 0
+
+
+def test_resting_members_are_still_used_when_none_is_healthy():
+    pool = _pool(FakeBackend(), FakeBackend(response="ok"), unhealthy_after=1, readmit_after_seconds=60.0)
+    now = time.monotonic()
+    pool.members[0].unhealthy_until = now + 60
+    pool.members[1].unhealthy_until = now + 30
+
+    assert pool.generate("prompt", 100) == "ok"
@@ -0,0 +1,39 @@
+# tests/test_parse_excel.py
+import pytest
+
+from src import parse_excel
+
+A = ("a.xlsx", "Sheet1")
+B = ("b.xlsx", "Sheet1")
+
+
+def _rules(**fields):
+    return {"Customer": {"fields": {name: {"data_type": data_type} for name, data_type in fields.items()}}}
+
+
+def test_identical_fields_are_not_conflicts():
+    merged, conflicts = parse_excel.merge_rules([(A, _rules(Name="String")), (B, _rules(Name="String", Age="Integer"))])
+    assert merged == _rules(Name="String", Age="Integer")
+    assert conflicts == []
+
+
+@pytest.mark.parametrize("policy, winner", [("first", "String"), ("last", "Integer")])
+def test_conflict_policy_picks_the_source(policy, winner):
+    merged, conflicts = parse_excel.merge_rules([(A, _rules(Name="String")), (B, _rules(Name="Integer"))],
+                                                conflict_policy=policy)
+    assert merged["Customer"]["fields"]["Name"]["data_type"] == winner
+    assert conflicts == [{"field": "Customer.Name", "sources": ["a.xlsx[Sheet1]", "b.xlsx[Sheet1]"]}]
+
+
+def test_conflict_policy_error_raises():
+    with pytest.raises(ValueError, match="Customer.Name"):
+        parse_excel.merge_rules([(A, _rules(Name="String")), (B, _rules(Name="Integer"))], conflict_policy="error")
+
+
+def test_expand_sources_lists_matching_sheets(tmp_path):
+    workbook = tmp_path / "rules.xlsx"
+    with parse_excel.pd.ExcelWriter(workbook) as writer:
+        for sheet in ("BC - Business Rule", "BC - Business Rule 2", "Notes"):
+            parse_excel.pd.DataFrame({"a": [1]}).to_excel(writer, sheet_name=sheet, index=False)
+    pairs = parse_excel.expand_sources([{"file": str(workbook), "sheets": "BC - Business Rule*"}], "auto")
+    assert pairs == [(str(workbook), "BC - Business Rule"), (str(workbook), "BC - Business Rule 2")]
@@ -0,0 +1,24 @@
+# tests/test_profiler.py
+import sys
+
+from src import profiler
+
+
+def test_profile_without_rss_support(tmp_path, monkeypatch):
+    # As on Windows, where the resource module does not exist
+    monkeypatch.setitem(sys.modules, "resource", None)
+    run = profiler.Profiler(output_dir=str(tmp_path)).start()
+    with run.stage("parse"):
+        pass
+    report = run.stop()
+
+    assert report["max_rss_mb"] is None
+    assert report["stages"][0]["stage"] == "parse"
+    assert report["stages"][0]["max_rss_mb"] is None
+
+
+def test_profile_reports_rss_where_available(tmp_path):
+    run = profiler.Profiler(output_dir=str(tmp_path)).start()
+    report = run.stop()
+
+    assert report["max_rss_mb"] > 0
@@ -0,0 +1,121 @@
+# tests/test_rate_limiter.py
+import time
+
+import pytest
+
+from src import rate_limiter
+
+
+class TooManyRequests(Exception):
+    code = 429
+
+    def __init__(self, message="429", headers=None):
+        super().__init__(message)
+        self.response = type("Response", (), {"headers": headers or {}})()
+
+
+class BadRequest(Exception):
+    code = 400
+
+
+def _flaky(errors, result="ok"):
+    errors = list(errors)
+    calls = []
+
+    def fn():
+        calls.append(time.monotonic())
+        if errors:
+            raise errors.pop(0)
+        return result
+    return fn, calls
+
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = rate_limiter.TokenBucket(60)
+    now = time.monotonic()
+    bucket.take(60)
+
+    assert bucket.time_until(1, now) == pytest.approx(1.0, abs=0.01)
+    assert bucket.time_until(1, now + 1.0) == pytest.approx(0.0, abs=0.01)
+    # Requests larger than the bucket wait for a full bucket, not forever
+    assert bucket.time_until(600, now + 60.0) == 0.0
+    assert rate_limiter.TokenBucket(None).time_until(10 ** 9, now) == 0.0
+
+
+def test_rate_limit_and_transient_errors_are_recognised():
+    assert rate_limiter.is_rate_limit_error(TooManyRequests())
+    assert rate_limiter.is_rate_limit_error(Exception("429 Resource has been exhausted"))
+    assert rate_limiter.is_rate_limit_error(Exception("Error code: 429 - Too Many Requests"))
+    assert rate_limiter.is_rate_limit_error(Exception("HTTP 429: rate limit reached for requests"))
+    # "429" alone appears in token counts and request IDs
+    assert not rate_limiter.is_rate_limit_error(Exception("max_tokens 4290 exceeds the model limit"))
+    assert not rate_limiter.is_rate_limit_error(Exception("Invalid request req_8f429a1c: bad prompt"))
+    assert not rate_limiter.is_rate_limit_error(Exception("prompt has 429 tokens, too long"))
+    assert not rate_limiter.is_rate_limit_error(BadRequest("bad prompt"))
+
+    class ServiceUnavailable(Exception):
+        pass
+
+    assert rate_limiter.is_transient_error(ServiceUnavailable())
+    assert not rate_limiter.is_transient_error(BadRequest())
+
+
+def test_retry_after_headers():
+    assert rate_limiter.get_retry_after(TooManyRequests(headers={"retry-after-ms": "250"})) == 0.25
+    assert rate_limiter.get_retry_after(TooManyRequests(headers={"retry-after": "3"})) == 3.0
+    assert rate_limiter.get_retry_after(TooManyRequests(headers={"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0.0
+    assert rate_limiter.get_retry_after(TooManyRequests()) is None
+
+
+def test_rate_limited_calls_are_retried_after_retry_after():
+    limiter = rate_limiter.RateLimiter(max_retries=2, base_delay=0.01)
+    fn, calls = _flaky([TooManyRequests(headers={"retry-after-ms": "200"})])
+
+    assert limiter.call(fn) == "ok"
+    assert calls[1] - calls[0] >= 0.2
+    assert (limiter.retry_count, limiter.rate_limited_count) == (1, 1)
+
+
+def test_errors_surface_once_retries_run_out():
+    limiter = rate_limiter.RateLimiter(max_retries=1, base_delay=0.01)
+    fn, calls = _flaky([TooManyRequests(), TooManyRequests()])
+    with pytest.raises(TooManyRequests):
+        limiter.call(fn)
+    assert len(calls) == 2
+
+    fn, calls = _flaky([BadRequest()])
+    with pytest.raises(BadRequest):
+        limiter.call(fn)
+    assert len(calls) == 1
+
+
+def test_concurrency_limit_halves_on_429_and_grows_back():
+    limiter = rate_limiter.RateLimiter(max_concurrency=8, max_retries=0)
+    assert limiter.concurrency_limit == 8
+
+    with pytest.raises(TooManyRequests):
+        limiter.call(_flaky([TooManyRequests()])[0])
+    assert limiter.concurrency_limit == 4
+
+    # Additive increase: about limit * limit / 2 successes to double
+    for _ in range(10):
+        limiter.call(lambda: None)
+    assert 4 < limiter.concurrency_limit < 8
+    for _ in range(30):
+        limiter.call(lambda: None)
+    assert limiter.concurrency_limit == 8
+
+
+def test_try_reserve_takes_quota_without_waiting():
+    limiter = rate_limiter.RateLimiter(requests_per_minute=2)
+
+    assert limiter.try_reserve(0)
+    assert limiter.try_reserve(0)
+    assert not limiter.try_reserve(0)
+
+
+def test_try_reserve_refuses_while_paused_after_a_429():
+    limiter = rate_limiter.RateLimiter()
+    limiter._paused_until = time.monotonic() + 60
+
+    assert not limiter.try_reserve(0)
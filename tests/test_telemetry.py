@@ -0,0 +1,40 @@
+# tests/test_telemetry.py
+import pytest
+
+from src import telemetry
+
+
+def _event(latency_s, cache="miss"):
+    return {"success": True, "attempts": 1, "rate_limited": 0, "hedged": 0, "cache": cache,
+            "prompt_tokens": 10, "completion_tokens": 5, "latency_s": latency_s, "service_s": latency_s}
+
+
+def test_percentiles_are_exact_below_the_reservoir_size():
+    metrics = telemetry.StageMetrics()
+    for ms in range(1, 101):
+        metrics.add(_event(ms / 1000))
+    metrics.add(_event(5.0, cache="hit"))
+
+    assert metrics.percentile(0.50) == 0.051
+    assert metrics.percentile(0.99) == 0.1
+    assert metrics.to_dict()["latency_mean_s"] == pytest.approx(0.0505)
+
+
+def test_latency_samples_stay_bounded():
+    metrics = telemetry.StageMetrics()
+    calls = telemetry.LATENCY_RESERVOIR_SIZE * 4
+    for i in range(calls):
+        metrics.add(_event(i / calls))
+
+    assert len(metrics.latencies) == telemetry.LATENCY_RESERVOIR_SIZE
+    assert metrics.api_calls == calls
+    assert sum(metrics.buckets) == calls
+    # A uniform sample of 0..1 puts the median near 0.5
+    assert 0.4 < metrics.percentile(0.50) < 0.6
+    assert f'_count{{stage="llm"}} {calls}' in _prometheus(metrics)
+
+
+def _prometheus(metrics):
+    recorder = telemetry.Recorder()
+    recorder.stages["llm"] = metrics
+    return recorder.to_prometheus()
@@ -0,0 +1,75 @@
+# tests/test_validate_test_cases.py
+import random
+from datetime import datetime
+
+import pytest
+
+from src import validate_test_cases
+
+FORMATS = validate_test_cases.DEFAULT_DATE_FORMATS + [
+    "%d/%m/%Y",
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "%I:%M %p",
+    "%d  %m %Y",
+]
+
+
+def _strptime_accepts(value, date_format):
+    try:
+        datetime.strptime(value, date_format)
+        return True
+    except ValueError:
+        return False
+
+
+def _candidates(date_format, rng, count=400):
+    """Values close to `date_format`: valid, padded, space-padded, out of range and malformed fields."""
+    fields = {
+        "Y": ["2024", "0000", "1999", "024", "20245"],
+        "m": ["01", "1", "12", "13", "00", " 1", "001"],
+        "d": ["05", "5", " 5", "31", "30", "29", "32", "00", "  5", " 0"],
+        "H": ["00", "0", "23", "24", "9", " 9"],
+        "I": ["12", "1", "01", "00", "13"],
+        "M": ["00", "5", "59", "60"],
+        "S": ["00", "7", "59", "60", "61"],
+        "f": ["1", "123456", "1234567", "١٢"],
+        "p": ["AM", "pm", "XM"],
+    }
+    separators = {" ": [" ", "  ", "\t", ""], "  ": [" ", "  "], "/": ["/", "-"], "-": ["-", "/"]}
+    for _ in range(count):
+        parts = []
+        i = 0
+        while i < len(date_format):
+            if date_format[i] == "%":
+                parts.append(rng.choice(fields[date_format[i + 1]]))
+                i += 2
+            else:
+                run = date_format[i]
+                while run == " " and date_format[i + 1:i + 2] == " ":
+                    run += " "
+                    i += 1
+                parts.append(rng.choice(separators.get(run, [run])))
+                i += 1
+        yield "".join(parts)
+
+
+@pytest.mark.parametrize("date_format", FORMATS)
+def test_compiled_date_format_matches_strptime(date_format):
+    rule = validate_test_cases.DataTypeRule("Date", date_formats=[date_format])
+    assert rule.date_patterns, "format should compile to a regex"
+    rng = random.Random(date_format)
+    for value in _candidates(date_format, rng):
+        assert rule.accepts(value) == _strptime_accepts(value, date_format), value
+
+
+def test_space_padded_day_is_accepted():
+    rule = validate_test_cases.DataTypeRule("Date", date_formats=["%Y-%m-%d %H:%M:%S"])
+    assert rule.accepts("2024-01- 5 10:00:00")
+    assert not rule.accepts("2024-02-30 10:00:00")
+
+
+def test_unsupported_directive_falls_back_to_strptime():
+    rule = validate_test_cases.DataTypeRule("Date", date_formats=["%b %d %Y"])
+    assert not rule.date_patterns
+    assert rule.accepts("Jan 05 2024")
+    assert not rule.accepts("Foo 05 2024")